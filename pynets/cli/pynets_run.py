@@ -6,6 +6,7 @@ Copyright (C) 2017
 @author: Derek Pisner (dPys)
 """
 import warnings
+import numpy as np
 warnings.filterwarnings("ignore")
 
 
@@ -1505,7 +1506,7 @@ def build_workflow(args, retval):
     from pynets.core.interfaces import CombineOutputs, NetworkAnalysis
     from nipype.pipeline import engine as pe
     from nipype.interfaces import utility as niu
-    from pynets.core.workflows import workflow_selector
+    from pynets.core.workflows import workflow_selector, threshold_iterlist
 
     def init_wf_single_subject(ID, func_file, atlas, network, node_size, roi, thr, uatlas,
                                multi_nets, conn_model, dens_thresh, conf, plot_switch, dwi_file,
@@ -1616,14 +1617,35 @@ def build_workflow(args, retval):
             wf.get_node(meta_wf.name).get_node(wf_selected).n_procs = procmem[0]
             wf.get_node(meta_wf.name).get_node(wf_selected).mem_gb = procmem[1]
 
-        # Fully-automated graph analysis
-        net_mets_node = pe.MapNode(interface=NetworkAnalysis(), name="NetworkAnalysis",
-                                   iterfield=['ID', 'network', 'thr', 'conn_model', 'est_path',
-                                              'roi', 'prune', 'norm', 'binary'], nested=True,
-                                   imports=import_list)
-        net_mets_node.synchronize = True
-        net_mets_node._n_procs = 1
-        net_mets_node._mem_gb = 4
+        # Fully-automated graph analysis. When many graphs share an atlas (i.e. across thresholds, models, RSNs and
+        # the other iterables of each modality's workflow, whose combinations are fully crossed), they are analyzed
+        # together in batch mode by a single node rather than mapped over one at a time.
+        from pynets.stats.netstats import BATCH_MIN_GRAPHS
+        n_graphs_shared = (len(threshold_iterlist(min_thr, max_thr, step_thr)) if multi_thr else 1) * \
+            (len(conn_model_list) if conn_model_list else 1) * (len(multi_nets) if multi_nets else 1) * \
+            (len(node_size_list) if node_size_list and parc is False else 1)
+        n_graphs_per_atlas = 0
+        if func_file:
+            func_iterlists = (smooth_list, hpass_list, extract_strategy_list)
+            n_graphs_per_atlas += n_graphs_shared * int(np.prod([len(i) for i in func_iterlists if i]))
+        if dwi_file:
+            dwi_iterlists = (min_length_list, multi_directget)
+            n_graphs_per_atlas += n_graphs_shared * int(np.prod([len(i) for i in dwi_iterlists if i]))
+        if n_graphs_per_atlas >= BATCH_MIN_GRAPHS and not (graph or multi_graph):
+            net_mets_node = pe.Node(interface=NetworkAnalysis(), name="NetworkAnalysis", imports=import_list)
+        else:
+            net_mets_node = pe.MapNode(interface=NetworkAnalysis(), name="NetworkAnalysis",
+                                       iterfield=['ID', 'network', 'thr', 'conn_model', 'est_path',
+                                                  'roi', 'prune', 'norm', 'binary'], nested=True,
+                                       imports=import_list)
+            net_mets_node.synchronize = True
+        if 'net_mets_node' in runtime_dict:
+            net_mets_node._n_procs = runtime_dict['net_mets_node'][0]
+            net_mets_node._mem_gb = runtime_dict['net_mets_node'][1]
+        else:
+            net_mets_node._n_procs = 1
+            net_mets_node._mem_gb = 4
+        net_mets_node.inputs.n_procs = net_mets_node._n_procs
 
         collect_pd_list_net_csv_node = pe.Node(niu.Function(input_names=['net_mets_csv'],
                                                             output_names=['net_mets_csv_out'],
@@ -227,26 +227,40 @@ class NetworkAnalysisInputSpec(BaseInterfaceInputSpec):
     ID = traits.Any(mandatory=True)
     network = traits.Any(mandatory=False)
     thr = traits.Any(mandatory=True)
-    conn_model = traits.Str(mandatory=True)
-    est_path = File(exists=True, mandatory=True)
+    conn_model = traits.Either(traits.Str(), traits.List(), mandatory=True)
+    # Graphs thresholded in batches are saved as a single stack, so their est_paths need not exist on disk
+    # (see utils.save_mat_stack)
+    est_path = traits.Either(traits.Str(), traits.List(), mandatory=True)
     roi = traits.Any(mandatory=False)
     prune = traits.Any(mandatory=False)
     norm = traits.Any(mandatory=False)
-    binary = traits.Bool(False, usedefault=True)
+    binary = traits.Either(traits.Bool(), traits.List(), default=False, usedefault=True)
+    n_procs = traits.Int(1, usedefault=True)
 
 
 class NetworkAnalysisOutputSpec(TraitedSpec):
     """Output interface wrapper for NetworkAnalysis"""
-    out_path_neat = File(exists=True, mandatory=True)
+    out_path_neat = traits.Either(File(exists=True), traits.List(File(exists=True)), mandatory=True)
 
 
 class NetworkAnalysis(BaseInterface):
-    """Interface wrapper for NetworkAnalysis"""
+    """Interface wrapper for NetworkAnalysis. Given lists of graphs (i.e. when run as a Node rather than a MapNode),
+    graphs that share an atlas are analyzed together in batch mode."""
     input_spec = NetworkAnalysisInputSpec
     output_spec = NetworkAnalysisOutputSpec
 
     def _run_interface(self, runtime):
-        from pynets.stats.netstats import extractnetstats
+        from pynets.stats.netstats import extractnetstats, extractnetstats_batch
+        if isinstance(self.inputs.est_path, list):
+            from pynets.core.utils import flatten
+            out = extractnetstats_batch(
+                *[list(flatten(i)) if isinstance(i, list) else i for i in
+                  (self.inputs.ID, self.inputs.network, self.inputs.thr, self.inputs.conn_model, self.inputs.est_path,
+                   self.inputs.roi, self.inputs.prune, self.inputs.norm, self.inputs.binary)],
+                n_procs=self.inputs.n_procs)
+            setattr(self, '_outpath', out)
+            return runtime
+
         out = extractnetstats(
             self.inputs.ID,
             self.inputs.network,
@@ -256,13 +270,17 @@ class NetworkAnalysis(BaseInterface):
             self.inputs.roi,
             self.inputs.prune,
             self.inputs.norm,
-            self.inputs.binary)
+            self.inputs.binary,
+            self.inputs.n_procs)
         setattr(self, '_outpath', out)
         return runtime
 
     def _list_outputs(self):
         import os.path as op
-        return {'out_path_neat': op.abspath(getattr(self, '_outpath'))}
+        out = getattr(self, '_outpath')
+        if isinstance(out, list):
+            return {'out_path_neat': [op.abspath(i) for i in out]}
+        return {'out_path_neat': op.abspath(out)}
 
 
 class CombineOutputsInputSpec(BaseInterfaceInputSpec):
@@ -1312,6 +1330,7 @@ class _TrackingInputSpec(BaseInterfaceInputSpec):
     t1w2dwi = File(exists=True, mandatory=True)
     roi_neighborhood_tol = traits.Any(6, mandatory=True, usedefault=True)
     sphere = traits.Str('repulsion724', mandatory=True, usedefault=True)
+    n_procs = traits.Int(1, usedefault=True)
 
 
 class _TrackingOutputSpec(TraitedSpec):
@@ -1360,7 +1379,7 @@ class Tracking(SimpleInterface):
         from colorama import Fore, Style
         from dipy.data import get_sphere
         from pynets.core import utils
-        from pynets.dmri.track import prep_tissues, reconstruction, create_density_map, track_ensemble
+        from pynets.dmri.track import prep_tissue_maps, reconstruction, create_density_map, track_ensemble
         from dipy.io.stateful_tractogram import Space, StatefulTractogram, Origin
         from dipy.io.streamline import save_tractogram
         from nipype.utils.filemanip import copyfile
@@ -1412,13 +1431,14 @@ class Tracking(SimpleInterface):
         # Commence Ensemble Tractography
         streamlines = track_ensemble(self.inputs.target_samples, atlas_data_wm_gm_int,
                                      parcels, model,
-                                     prep_tissues(self.inputs.t1w2dwi, self.inputs.gm_in_dwi,
-                                                  self.inputs.vent_csf_in_dwi, self.inputs.wm_in_dwi,
-                                                  self.inputs.tiss_class),
+                                     prep_tissue_maps(self.inputs.t1w2dwi, self.inputs.gm_in_dwi,
+                                                      self.inputs.vent_csf_in_dwi, self.inputs.wm_in_dwi,
+                                                      self.inputs.tiss_class),
                                      get_sphere(self.inputs.sphere), self.inputs.directget, self.inputs.curv_thr_list,
                                      self.inputs.step_list, self.inputs.track_type, self.inputs.maxcrossing,
                                      int(self.inputs.roi_neighborhood_tol), self.inputs.min_length,
-                                     self.inputs.waymask, self.inputs.B0_mask)
+                                     self.inputs.waymask, self.inputs.B0_mask, n_procs=self.inputs.n_procs,
+                                     tmp_dir=runtime.cwd)
 
         namer_dir = '{}/tractography'.format(dir_path)
         if not os.path.isdir(namer_dir):
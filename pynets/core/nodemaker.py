@@ -42,16 +42,37 @@ def get_sphere(coords, r, vox_dims, dims):
       human functional neuroimaging data. Frontiers in Neuroinformatics.
 
     """
-    r = float(r)
-    xx, yy, zz = [slice(-r / vox_dims[i], r / vox_dims[i] + 0.01, 1) for i in range(len(coords))]
-    cube = np.vstack([row.ravel() for row in np.mgrid[xx, yy, zz]])
-    sphere = cube[:, np.sum(np.dot(np.diag(vox_dims), cube) ** 2, 0) ** .5 <= r]
-    sphere = np.round(sphere.T + coords)
+    sphere = np.round(get_sphere_offsets(r, vox_dims) + coords)
     neighbors = sphere[(np.min(sphere, 1) >= 0) & (np.max(np.subtract(sphere, dims), 1) <= -1), :].astype(int)
 
     return neighbors
 
 
+def get_sphere_offsets(r, vox_dims):
+    """
+    Return the voxel offsets of all points within r mm of a point, as used by get_sphere.
+
+    Parameters
+    ----------
+    r : int
+        Radius for sphere.
+    vox_dims : array/tuple
+        1D vector (x, y, z) of mm voxel resolution for sphere.
+
+    Returns
+    -------
+    offsets : ndarray
+        K x 3 array of (generally non-integer) voxel offsets from the center of the sphere.
+
+    """
+    r = float(r)
+    xx, yy, zz = [slice(-r / vox_dims[i], r / vox_dims[i] + 0.01, 1) for i in range(3)]
+    cube = np.vstack([row.ravel() for row in np.mgrid[xx, yy, zz]])
+    offsets = cube[:, np.sum(np.dot(np.diag(vox_dims), cube) ** 2, 0) ** .5 <= r]
+
+    return offsets.T
+
+
 def create_parcel_atlas(parcel_list):
     """
     Create a 3D Nifti1Image atlas parcellation of consecutive integer intensities from an input list of ROI's.
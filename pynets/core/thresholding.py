@@ -161,9 +161,58 @@ def standardize(W):
     return W
 
 
-def density_thresholding(conn_matrix, thr, max_iters=10000, interval=0.01):
+def _density_candidates(W):
     """
-    Iteratively apply an absolute threshold to achieve a target density.
+    Row indices, column indices, and weights of the nonzero candidate edges of W, along with the number of possible
+    edges and whether W is undirected. Symmetric matrices are treated as undirected, so that only their upper
+    triangle is considered.
+    """
+    n = W.shape[0]
+    undirected = np.allclose(W, W.T)
+    if undirected:
+        rows, cols = np.triu_indices(n, 1)
+        n_possible = (n * n - n) // 2
+    else:
+        rows, cols = np.nonzero(~np.eye(n, dtype=bool))
+        n_possible = n * n - n
+    weights = W[rows, cols]
+    nonzero = np.flatnonzero(weights)
+    return rows[nonzero], cols[nonzero], weights[nonzero], n_possible, undirected
+
+
+def _density_edge_count(thr, n_possible):
+    """
+    Largest number of edges whose density does not exceed thr.
+    """
+    if float(thr) > 1 or float(thr) < 0:
+        raise ValueError('Density must be in range [0,1]')
+    # Rounding guards against float error (e.g. 0.7 * 10 = 6.999...)
+    return int(np.floor(np.round(float(thr) * n_possible, 6)))
+
+
+def _strongest_edges(weights, n_edges):
+    """
+    Mask of the n_edges largest weights, with ties broken in favor of the earliest edge (i.e. as by a stable sort
+    in order of descending weight).
+    """
+    keep = np.zeros(len(weights), dtype=bool)
+    if n_edges <= 0:
+        return keep
+    # Weight of the n_edges-th strongest edge, from a linear-time partition
+    kth = -np.partition(-weights, n_edges - 1)[n_edges - 1]
+    keep[weights > kth] = True
+    tied = np.flatnonzero(weights == kth)
+    keep[tied[:n_edges - np.count_nonzero(keep)]] = True
+    return keep
+
+
+def density_thresholding(conn_matrix, thr):
+    """
+    Retain the strongest edges of a connectivity matrix to achieve a target density.
+
+    The density is met exactly, by selecting the largest weights with a linear-time partition
+    rather than searching over absolute thresholds. Edges of tied weight are retained in
+    row-major order, as by density_thresholding_multi.
 
     Parameters
     ----------
@@ -171,10 +220,6 @@ def density_thresholding(conn_matrix, thr, max_iters=10000, interval=0.01):
         Weighted connectivity matrix
     thr : float
         Density value between 0-1.
-    max_iters : int
-        Maximum number of iterations for performing absolute thresholding. Default is 1000.
-    interval : float
-        Interval for increasing the absolute threshold for each iteration. Default is 0.01.
 
     Returns
     -------
@@ -191,28 +236,61 @@ def density_thresholding(conn_matrix, thr, max_iters=10000, interval=0.01):
       Rubinov M, Sporns O (2010) NeuroImage 52:1059-69.
 
     """
-    from pynets.core import thresholding
+    conn_matrix = conn_matrix.copy()
     np.fill_diagonal(conn_matrix, 0)
+    rows, cols, weights, n_possible, undirected = _density_candidates(conn_matrix)
+    n_edges = _density_edge_count(thr, n_possible)
 
-    work_thr = 0
-    i = 1
-    density = nx.density(nx.from_numpy_matrix(conn_matrix))
-    if float(thr) < float(density):
-        while float(i) < max_iters and float(work_thr) < float(1):
-            work_thr = float(work_thr) + float(interval)
-            density = nx.density(nx.from_numpy_matrix(thresholding.threshold_absolute(conn_matrix, work_thr)))
-            print("%s%d%s%.2f%s%.2f%s" % ('Iteration ', i, ' -- with Thresh: ', float(work_thr), ' and Density: ',
-                                          float(density), '...'))
-            if float(thr) >= float(density):
-                conn_matrix = thresholding.threshold_absolute(conn_matrix, work_thr)
-                break
-            i = i + 1
-    else:
-        print('Density of raw matrix is already greater than or equal to the target density requested')
+    if n_edges >= len(weights):
+        print('Density of raw matrix is already less than or equal to the target density requested')
+        return conn_matrix
+
+    # Edges outside of the n_edges strongest
+    drop = ~_strongest_edges(weights, n_edges)
+    conn_matrix[rows[drop], cols[drop]] = 0
+    if undirected:
+        conn_matrix[cols[drop], rows[drop]] = 0
+    print("%s%.2f%s%.2f%s" % ('Retained the strongest ', 100 * n_edges / n_possible, '% of edges (target density: ',
+                              float(thr), ')...'))
 
     return conn_matrix
 
 
+def density_thresholding_multi(conn_matrix, thrs):
+    """
+    Retain the strongest edges of a connectivity matrix to achieve each of several target densities.
+
+    Parameters
+    ----------
+    conn_matrix : np.ndarray
+        Weighted connectivity matrix
+    thrs : list
+        Density values between 0-1 (e.g. of a multi-threshold sweep).
+
+    Returns
+    -------
+    conn_matrices : np.ndarray
+        len(thrs) x N x N stack of thresholded connectivity matrices, ordered as thrs.
+
+    """
+    conn_matrix = conn_matrix.copy()
+    np.fill_diagonal(conn_matrix, 0)
+    rows, cols, weights, n_possible, undirected = _density_candidates(conn_matrix)
+    n_edges = np.array([min(_density_edge_count(thr, n_possible), len(weights)) for thr in thrs], dtype=np.int64)
+
+    # Rank of each edge by descending weight (ties in row-major order), from a single sort shared by all densities
+    rank = np.empty(len(weights), dtype=np.int64)
+    rank[np.argsort(-weights, kind='stable')] = np.arange(len(weights))
+    thr_idx, edge_idx = np.nonzero(rank[None, :] < n_edges[:, None])
+
+    conn_matrices = np.zeros((len(n_edges),) + conn_matrix.shape, dtype=conn_matrix.dtype)
+    conn_matrices[thr_idx, rows[edge_idx], cols[edge_idx]] = weights[edge_idx]
+    if undirected:
+        conn_matrices[thr_idx, cols[edge_idx], rows[edge_idx]] = conn_matrix[cols[edge_idx], rows[edge_idx]]
+
+    return conn_matrices
+
+
 # Calculate density
 def est_density(in_mat):
     """
@@ -322,6 +400,56 @@ def invert(W, copy=False):
     return W
 
 
+def length_matrix(W, transform='inverse'):
+    """
+    Convert a weighted connectivity matrix to a connection-length matrix for shortest-path measures.
+
+    The transform is applied to the data buffer of a CSR representation of W, so that lengths share the
+    sparsity pattern of the weights and can be passed directly to scipy.sparse.csgraph. Connections whose
+    length is zero (e.g. weights of 1 under `neglog` or `complement`) are kept as explicit zeros, which
+    scipy.sparse.csgraph treats as zero-length edges.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray or scipy.sparse matrix
+        Weighted connectivity matrix. Absolute weights are used.
+    transform : str
+        Weight-to-length transform:
+        'inverse' : 1 / w
+        'neglog' : -log(w), for weights in (0, 1]
+        'complement' : 1 - w, for weights in (0, 1]
+        Default is 'inverse'.
+
+    Returns
+    -------
+    L : scipy.sparse.csr_matrix
+        NxN connection-length matrix.
+
+    References
+    ----------
+    .. [1] Complex network measures of brain connectivity: Uses and interpretations.
+      Rubinov M, Sporns O (2010) NeuroImage 52:1059-69.
+
+    """
+    from scipy import sparse
+
+    W = sparse.csr_matrix(W, dtype=np.float64, copy=True)
+    W.eliminate_zeros()
+    weights = np.abs(W.data)
+    if transform == 'inverse':
+        lengths = 1. / weights
+    elif transform == 'neglog':
+        lengths = -np.log(weights)
+    elif transform == 'complement':
+        lengths = 1. - weights
+    else:
+        raise ValueError(f"Length transform must be 'inverse', 'neglog' or 'complement', not {transform}")
+    if transform != 'inverse' and np.any(weights > 1):
+        raise ValueError(f"Weights must be in the range (0, 1] for the {transform} length transform")
+
+    return sparse.csr_matrix((lengths, W.indices, W.indptr), shape=W.shape)
+
+
 def weight_conversion(W, wcm, copy=True):
     '''
     W_bin = weight_conversion(W, 'binarize');
@@ -386,14 +514,14 @@ def autofix(W, copy=True):
 
     Parameters
     ----------
-    W : np.ndarray
+    W : np.ndarray or scipy.sparse matrix
         weighted connectivity matrix.
     copy : bool
         if True, returns a copy of the matrix. Otherwise, modifies the matrix
         in place. Default value=True.
     Returns
     -------
-    W : np.ndarray
+    W : np.ndarray or csr_matrix
         connectivity matrix with fixes applied.
 
     References
@@ -402,6 +530,22 @@ def autofix(W, copy=True):
       Rubinov M, Sporns O (2010) NeuroImage 52:1059-69.
 
     '''
+    from scipy import sparse
+
+    if sparse.issparse(W):
+        W = W.tocsr(copy=copy)
+        if W.diagonal().any():
+            W.setdiag(0)
+        W.data[~np.isfinite(W.data)] = 0
+
+        # ensure exact binarity or symmetry, only explicitly stored weights need be checked
+        u = np.unique(W.data)
+        if np.all(np.logical_or(np.abs(u) < 1e-8, np.abs(u - 1) < 1e-8)) or \
+                (abs(W - W.T) - 1e-5 * abs(W.T)).max() <= 1e-8:
+            W.data = np.around(W.data, decimals=5)
+        W.eliminate_zeros()
+        return W
+
     if copy:
         W = W.copy()
     # zero diagonal
@@ -421,6 +565,112 @@ def autofix(W, copy=True):
     return np.nan_to_num(W)
 
 
+def disparity_alpha(W, directed=False):
+    """
+    Compute significance scores (alpha) for all edges of a weighted adjacency matrix as defined in Serrano et al.
+    2009, using the closed form alpha_ij = (1 - p_ij) ** (k_i - 1).
+
+    Parameters
+    ----------
+    W : np.ndarray or scipy.sparse matrix
+        NxN weighted adjacency matrix. Absolute weights are used and self-connections are ignored.
+    directed : bool
+        If False, W is treated as undirected (and symmetrized). If True, an edge that is the only out-edge of
+        its source and the only in-edge of its target is always retained (alpha of 0). Default is False.
+
+    Returns
+    -------
+    rows : np.ndarray
+        Source node index of each edge.
+    cols : np.ndarray
+        Target node index of each edge.
+    alpha_out : np.ndarray
+        Significance of each edge relative to the out-strength of its source, or NaN if the source has a single
+        edge.
+    alpha_in : np.ndarray
+        Significance of each edge relative to the in-strength of its target, or NaN if the target has a single
+        edge.
+
+    References
+    ----------
+    .. [1] M. A. Serrano et al. (2009) Extracting the Multiscale backbone of complex weighted networks.
+      PNAS, 106:16, pp. 6483-6488.
+
+    """
+    from scipy import sparse
+
+    A = abs(sparse.csr_matrix(W, dtype=np.float64))
+    if not directed:
+        A = A.maximum(A.T).tocsr()
+    A.setdiag(0)
+    A.eliminate_zeros()
+    A.sort_indices()
+
+    n = A.shape[0]
+    k_out = np.diff(A.indptr)
+    k_in = np.bincount(A.indices, minlength=n)
+    s_out = np.asarray(A.sum(axis=1)).ravel()
+    s_in = np.asarray(A.sum(axis=0)).ravel()
+    rows = np.repeat(np.arange(n), k_out)
+    cols = A.indices
+
+    with np.errstate(invalid='ignore'):
+        alpha_out = (1 - A.data / s_out[rows]) ** (k_out[rows] - 1)
+        alpha_in = (1 - A.data / s_in[cols]) ** (k_in[cols] - 1)
+    alpha_out[k_out[rows] < 2] = np.nan
+    alpha_in[k_in[cols] < 2] = np.nan
+
+    if directed:
+        # Keep the only connection between a source and target, since it maintains the connectivity of the network
+        only = (k_out[rows] == 1) & (k_in[cols] == 1)
+        alpha_out[only] = 0
+        alpha_in[only] = 0
+
+    return rows, cols, alpha_out, alpha_in
+
+
+def disparity_backbone(W, alpha_t=0.4, directed=False, cut_mode='or'):
+    """
+    Extract the multiscale backbone of a weighted adjacency matrix, as defined in Serrano et al. 2009.
+
+    Parameters
+    ----------
+    W : np.ndarray or scipy.sparse matrix
+        NxN weighted adjacency matrix.
+    alpha_t : float
+        The threshold, between 0 and 1, for the alpha parameter used to select the surviving edges.
+        Default is 0.4.
+    directed : bool
+        Whether W is directed. Default is False.
+    cut_mode : str
+        In the case of directed graphs, the logic operation ('or' or 'and') combining the alpha_in and alpha_out
+        tests that an edge must pass. Undirected edges survive if they are significant for either endpoint.
+        Default is 'or'.
+
+    Returns
+    -------
+    backbone : scipy.sparse.csr_matrix
+        NxN boolean mask of the surviving edges.
+
+    References
+    ----------
+    .. [1] M. A. Serrano et al. (2009) Extracting the Multiscale backbone of complex weighted networks.
+      PNAS, 106:16, pp. 6483-6488.
+
+    """
+    from scipy import sparse
+
+    rows, cols, alpha_out, alpha_in = disparity_alpha(W, directed=directed)
+    if not directed or cut_mode == 'or':
+        keep = (alpha_out < alpha_t) | (alpha_in < alpha_t)
+    elif cut_mode == 'and':
+        keep = (alpha_out < alpha_t) & (alpha_in < alpha_t)
+    else:
+        raise ValueError(f"cut_mode must be 'or' or 'and', not {cut_mode}")
+
+    return sparse.csr_matrix((np.ones(np.sum(keep), dtype=bool), (rows[keep], cols[keep])), shape=W.shape)
+
+
 def disparity_filter(G, weight='weight'):
     """
     Compute significance scores (alpha) for weighted edges in G as defined in Serrano et al. 2009.
@@ -436,7 +686,9 @@ def disparity_filter(G, weight='weight'):
     Returns
     -------
     B : Object
-        Weighted NetworkX graph with a significance score (alpha) assigned to each edge.
+        Weighted NetworkX graph with a significance score (alpha) assigned to each edge. Undirected edges are
+        scored by the more significant of their endpoints, and directed edges by `alpha_out` and/or `alpha_in`.
+        Edges that cannot be scored from either endpoint are omitted, as are self-loops.
 
     References
     ----------
@@ -444,52 +696,29 @@ def disparity_filter(G, weight='weight'):
       PNAS, 106:16, pp. 6483-6488.
 
     """
-    from scipy import integrate
+    nodelist = list(G)
+    W = nx.to_numpy_array(G, nodelist=nodelist, weight=weight)
+    rows, cols, alpha_out, alpha_in = disparity_alpha(W, directed=nx.is_directed(G))
+    alpha_out = np.round(alpha_out, 4)
+    alpha_in = np.round(alpha_in, 4)
 
     if nx.is_directed(G):  # directed case
         N = nx.DiGraph()
-        for u in G:
-
-            k_out = G.out_degree(u)
-            k_in = G.in_degree(u)
-
-            if k_out > 1:
-                sum_w_out = sum(np.absolute(G[u][v][weight]) for v in G.successors(u))
-                for v in G.successors(u):
-                    w = G[u][v][weight]
-                    p_ij_out = float(np.absolute(w)) / sum_w_out
-                    alpha_ij_out = 1 - (k_out - 1) * integrate.quad(lambda x: (1 - x) ** (k_out - 2), 0, p_ij_out)[0]
-                    N.add_edge(u, v, weight=w, alpha_out=float(f'{alpha_ij_out:.4f}'))
-
-            elif k_out == 1 and G.in_degree(list(G.successors(u))[0]) == 1:
-                # we need to keep the connection as it is the only way to maintain the connectivity of the network
-                v = list(G.successors(u))[0]
-                w = G[u][v][weight]
-                N.add_edge(u, v, weight=w, alpha_out=0., alpha_in=0.)
-                # there is no need to do the same for the k_in, since the link is built already from the tail
-
-            if k_in > 1:
-                sum_w_in = sum(np.absolute(G[v][u][weight]) for v in G.predecessors(u))
-                for v in G.predecessors(u):
-                    w = G[v][u][weight]
-                    p_ij_in = float(np.absolute(w)) / sum_w_in
-                    alpha_ij_in = 1 - (k_in - 1) * integrate.quad(lambda x: (1 - x) ** (k_in - 2), 0, p_ij_in)[0]
-                    N.add_edge(v, u, weight=w, alpha_in=float(f'{alpha_ij_in:.4f}'))
+        N.add_nodes_from(nodelist)
+        edges = np.flatnonzero(~(np.isnan(alpha_out) & np.isnan(alpha_in)))
+        N.add_edges_from((nodelist[rows[i]], nodelist[cols[i]],
+                          {'weight': W[rows[i], cols[i]],
+                           **{key: float(val) for key, val in (('alpha_out', alpha_out[i]), ('alpha_in', alpha_in[i]))
+                              if not np.isnan(val)}}) for i in edges)
         return N
 
     else:  # undirected case
         B = nx.Graph()
-        for u in G:
-            k = len(G[u])
-            if k > 1:
-                sum_w = sum(np.absolute(G[u][v][weight]) for v in G[u])
-                for v in G[u]:
-                    w = G[u][v][weight]
-                    p_ij = float(np.absolute(w)) / sum_w
-                    alpha_ij = 1 - (k - 1) * integrate.quad(lambda x: (1 - x) ** (k - 2), 0, p_ij)[0]
-                    B.add_edge(u, v, weight=w, alpha=float(f'{alpha_ij:.4f}'))
-            else:
-                B.add_node(u)
+        B.add_nodes_from(nodelist)
+        alpha = np.fmin(alpha_out, alpha_in)
+        edges = np.flatnonzero((rows < cols) & ~np.isnan(alpha))
+        B.add_edges_from((nodelist[rows[i]], nodelist[cols[i]],
+                          {'weight': W[rows[i], cols[i]], 'alpha': float(alpha[i])}) for i in edges)
         return B
 
 
@@ -579,11 +808,11 @@ def weight_to_distance(G):
         Inverted NetworkX graph equivalent to the distance measure.
 
     """
-    edge_list = [v[2]['weight'] for v in G.edges(data=True)]
+    edges = list(G.edges(data='weight'))
+    weights = np.array([w for _, _, w in edges], dtype=np.float64)
     # maximum edge value
-    emax = np.max(edge_list) + 1 / float(G.number_of_nodes())
-    for edge in G.edges():
-        G.edges[edge[0], edge[1]]['distance'] = emax - G.edges[edge[0], edge[1]]['weight']
+    emax = np.max(weights) + 1 / float(G.number_of_nodes())
+    nx.set_edge_attributes(G, dict(zip([(u, v) for u, v, _ in edges], emax - weights)), 'distance')
 
     return G
 
@@ -621,11 +850,61 @@ def knn(conn_matrix, k):
     return gra
 
 
+def _local_thresholding_order(conn_matrix):
+    """
+    Edges of the maximum spanning tree of the largest connected component of |conn_matrix|, followed by the
+    remaining edges in the order in which successive k-nearest neighbour graphs add them. That is, by the
+    smallest k for which either endpoint counts the other among its k nearest neighbours, and then by weight.
+    """
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
+
+    n = conn_matrix.shape[0]
+    A = np.abs(conn_matrix)
+    np.fill_diagonal(A, 0)
+    _, labels = connected_components(sparse.csr_matrix(A), directed=False)
+    largest = np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+
+    # Maximum spanning tree, as the minimum spanning tree of positive distances
+    A0 = A[np.ix_(largest, largest)]
+    D = np.where(A0 > 0, A0.max() + 1 / float(len(largest)) - A0, 0)
+    mst = minimum_spanning_tree(sparse.csr_matrix(D)).tocoo()
+    mst_rows = np.minimum(largest[mst.row], largest[mst.col])
+    mst_cols = np.maximum(largest[mst.row], largest[mst.col])
+
+    # Rank of each neighbour of each node, by descending weight
+    W = conn_matrix.copy()
+    np.fill_diagonal(W, -np.inf)
+    rank = np.empty((n, n), dtype=np.int64)
+    np.put_along_axis(rank, np.argsort(-W, axis=1, kind='stable'), np.arange(n)[None, :], axis=1)
+    level = np.minimum(rank, rank.T)
+
+    rows, cols = np.triu_indices(n, 1)
+    candidates = A[rows, cols] > 0
+    candidates[mst_rows * n + mst_cols - (mst_rows + 1) * (mst_rows + 2) // 2] = False
+    rows, cols = rows[candidates], cols[candidates]
+    order = np.lexsort((-conn_matrix[rows, cols], level[rows, cols]))
+
+    return np.concatenate([mst_rows, rows[order]]), np.concatenate([mst_cols, cols[order]]), len(mst_rows)
+
+
+def _local_thresholding_edge_count(conn_matrix, thr, n_mst):
+    n = conn_matrix.shape[0]
+    edgenum = int(float(thr) * float(n * (n - 1) // 2))
+    if n_mst > edgenum:
+        print(f"Warning: The minimum spanning tree already has: {n_mst} edges, select more edges. Local Threshold "
+              f"will be applied by just retaining the Minimum Spanning Tree")
+    return max(edgenum, n_mst)
+
+
 def local_thresholding_prop(conn_matrix, thr):
     """
     Threshold the adjacency matrix by building from the minimum spanning tree (MST) and adding
     successive N-nearest neighbour degree graphs to achieve target proportional threshold.
 
+    Neighbours are ranked once per node, so that the edges of all successive N-nearest neighbour
+    graphs are added onto the MST in a single sorted pass.
+
     Parameters
     ----------
     conn_matrix : array
@@ -649,73 +928,38 @@ def local_thresholding_prop(conn_matrix, thr):
       NeuroImage. https://doi.org/10.1016/j.neuroimage.2014.10.015
 
     """
-    from pynets.core import thresholding
+    return local_thresholding_prop_multi(conn_matrix, [thr])[0]
 
-    fail_tol = 100
-    conn_matrix = np.nan_to_num(conn_matrix)
-    G = nx.from_numpy_matrix(np.abs(conn_matrix))
 
-    maximum_edges = G.number_of_edges()
+def local_thresholding_prop_multi(conn_matrix, thrs):
+    """
+    Apply local thresholding using the minimum spanning tree (MST) at each of several proportional thresholds,
+    from a single ranking of the edges.
 
-    Gcc = sorted(nx.connected_components(G), key=len, reverse=True)
-    G0 = G.subgraph(Gcc[0])
+    Parameters
+    ----------
+    conn_matrix : array
+        Weighted NxN matrix.
+    thrs : list
+        Proportional thresholds, between 0 and 1, to achieve through local thresholding (e.g. of a
+        multi-threshold sweep).
 
-    min_t = nx.minimum_spanning_tree(thresholding.weight_to_distance(G0), weight="distance")
-    min_t.add_nodes_from(G.nodes())
-    len_edges = min_t.number_of_edges()
-    upper_values = np.triu_indices(np.shape(conn_matrix)[0], k=1)
-    weights = np.array(conn_matrix[upper_values])
-    edgenum = int(float(thr) * float(len(weights[~np.isnan(weights)])))
+    Returns
+    -------
+    conn_matrices : array
+        len(thrs) x N x N stack of weighted local-thresholding using MST matrices, ordered as thrs.
 
-    if len_edges > edgenum:
-        print(f"Warning: The minimum spanning tree already has: {len_edges} edges, select more edges. Local Threshold "
-              f"will be applied by just retaining the Minimum Spanning Tree")
-        conn_matrix_thr = nx.to_numpy_array(G)
-        return conn_matrix_thr
-
-    k = 1
-    len_edge_list = []
-    while len_edges < edgenum and k <= np.shape(conn_matrix)[0] and (len(len_edge_list[-fail_tol:]) -
-                                                                     len(set(len_edge_list[-fail_tol:]))) < (fail_tol -
-                                                                                                             1):
-        # print(k)
-        # print(len_edges)
-        len_edge_list.append(len_edges)
-        # Create nearest neighbour graph
-        nng = thresholding.knn(conn_matrix, k)
-
-        # Remove edges from the NNG that exist already in the new graph/MST
-        nng.remove_edges_from(min_t.edges())
-
-        number_before = nng.number_of_edges()
-        if nng.number_of_edges() == 0 and number_before >= maximum_edges:
-            break
-
-        # Add weights to NNG
-        for e in nng.edges():
-            nng.edges[e[0], e[1]]['weight'] = float(conn_matrix[e[0], e[1]])
-
-        # Obtain list of edges from the NNG in order of weight
-        edge_list = sorted(nng.edges(data=True), key=lambda t: t[2]['weight'], reverse=True)
-
-        # Add edges in order of connectivity strength
-        for edge in edge_list:
-            # print(f"Adding edge to mst: {edge}")
-            min_t.add_edges_from([edge])
-            len_edges = min_t.number_of_edges()
-            if len_edges >= edgenum:
-                #print(len_edges)
-                break
-        k += 1
-
-    conn_matrix_bin = thresholding.binarize(nx.to_numpy_array(min_t, nodelist=sorted(G.nodes()), dtype=np.float64))
-
-    try:
-        conn_matrix_thr = np.multiply(conn_matrix, conn_matrix_bin)
-        return conn_matrix_thr
-
-    except ValueError:
-        print('MST thresholding failed. Check raw graph output manually for debugging.')
+    """
+    conn_matrix = np.nan_to_num(np.asarray(conn_matrix, dtype=np.float64))
+    rows, cols, n_mst = _local_thresholding_order(conn_matrix)
+
+    conn_matrices = np.zeros((len(thrs),) + conn_matrix.shape)
+    for conn_matrix_thr, thr in zip(conn_matrices, thrs):
+        n_edges = _local_thresholding_edge_count(conn_matrix, thr, n_mst)
+        conn_matrix_thr[rows[:n_edges], cols[:n_edges]] = conn_matrix[rows[:n_edges], cols[:n_edges]]
+        conn_matrix_thr[cols[:n_edges], rows[:n_edges]] = conn_matrix[cols[:n_edges], rows[:n_edges]]
+
+    return conn_matrices
 
 
 def perform_thresholding(conn_matrix, thr, min_span_tree, dens_thresh, disp_filt):
@@ -778,6 +1022,93 @@ def perform_thresholding(conn_matrix, thr, min_span_tree, dens_thresh, disp_filt
     return thr_type, edge_threshold, conn_matrix_thr
 
 
+def _threshold_proportional_multi(W, ps):
+    """
+    Apply threshold_proportional at each of several proportions, from a single sort of the weights.
+    """
+    for p in ps:
+        if p > 1 or p < 0:
+            raise ValueError('Threshold must be in range [0,1]')
+    W = W.copy()
+    n = len(W)
+    np.fill_diagonal(W, 0)
+    if np.allclose(W, W.T):
+        W[np.tril_indices(n)] = 0
+        ud = 2
+    else:
+        ud = 1
+    ind = np.where(W)
+    weights = W[ind]
+    order = np.argsort(weights)[::-1]
+
+    conn_matrices = np.zeros((len(ps),) + W.shape, dtype=W.dtype)
+    for conn_matrix_thr, p in zip(conn_matrices, ps):
+        keep = order[:int(round((n * n - n) * p / ud))]
+        conn_matrix_thr[ind[0][keep], ind[1][keep]] = weights[keep]
+        if ud == 2:
+            conn_matrix_thr[:, :] = conn_matrix_thr + conn_matrix_thr.T
+    return conn_matrices
+
+
+def perform_thresholding_multi(conn_matrix, thrs, min_span_tree, dens_thresh, disp_filt):
+    """
+    Threshold a connectivity matrix at each of several thresholds, as with `perform_thresholding`, sharing a
+    single sort (or MST) across thresholds.
+
+    Parameters
+    ----------
+    conn_matrix : array
+        Adjacency matrix stored as an m x n array of nodes and edges.
+    thrs : list
+        Values, between 0 and 1, to threshold the graph using any variety of methods triggered through other
+        options.
+    min_span_tree : bool
+        Indicates whether local thresholding from the Minimum Spanning Tree should be used.
+    dens_thresh : bool
+        Indicates whether a target graph density is to be used as the basis for thresholding.
+    disp_filt : bool
+        Indicates whether local thresholding using a disparity filter and 'backbone network' should be used.
+
+    Returns
+    -------
+    thr_type : str
+        Type of thresholding performed.
+    edge_thresholds : list
+        The string percentage representation of each of thrs.
+    conn_matrices : array
+        len(thrs) x N x N stack of thresholded matrices, ordered as thrs.
+
+    """
+    from pynets.core import thresholding
+
+    thrs = [float(thr) for thr in thrs]
+    thr_percs = [100 - np.abs(100 * thr) for thr in thrs]
+
+    edge_thresholds = [f"{str(thr_perc)}%" for thr_perc in thr_percs]
+
+    if min_span_tree is True:
+        print('Using local thresholding option with the Minimum Spanning Tree (MST)...\n')
+        if dens_thresh is True:
+            print('Ignoring -dt flag since local density thresholding is not currently supported.')
+        thr_type = 'MST'
+        conn_matrices = thresholding.local_thresholding_prop_multi(conn_matrix, thrs)
+    elif disp_filt is True:
+        # The disparity-filtered graph does not depend on the threshold
+        thr_type, _, conn_matrix_thr = thresholding.perform_thresholding(conn_matrix, thrs[0], min_span_tree,
+                                                                         dens_thresh, disp_filt)
+        conn_matrices = np.repeat(conn_matrix_thr[None], len(thrs), axis=0)
+    elif dens_thresh is False:
+        thr_type = 'PROP'
+        print(f"\nThresholding proportionally at: {thr_percs}% ...\n")
+        conn_matrices = _threshold_proportional_multi(conn_matrix, thrs)
+    else:
+        thr_type = 'DENS'
+        edge_thresholds = [None] * len(thrs)
+        print(f"\nThresholding to achieve densities of: {thr_percs}% ...\n")
+        conn_matrices = thresholding.density_thresholding_multi(conn_matrix, thrs)
+    return thr_type, edge_thresholds, conn_matrices
+
+
 def thresh_func(dens_thresh, thr, conn_matrix, conn_model, network, ID, dir_path, roi, node_size, min_span_tree,
                 smooth, disp_filt, parc, prune, atlas, uatlas, labels, coords, norm, binary,
                 hpass, extract_strategy):
@@ -1090,6 +1421,99 @@ def thresh_struct(dens_thresh, thr, conn_matrix, conn_model, network, ID, dir_pa
             min_length)
 
 
+def thresh_func_batch(dens_thresh, thrs, conn_matrix, conn_model, network, ID, dir_path, roi, node_size,
+                      min_span_tree, smooth, disp_filt, parc, prune, atlas, uatlas, labels, coords, norm, binary,
+                      hpass, extract_strategy):
+    """
+    Threshold a functional connectivity matrix at each of several thresholds at once, as with `thresh_func`, saving
+    the resulting graphs as a single stack rather than one file per threshold.
+
+    Parameters are those of `thresh_func`, except for thrs, a list of values between 0 and 1 that replaces thr.
+
+    Returns
+    -------
+    The returns of `thresh_func`, each as a list with one entry per threshold of thrs (i.e. per thresholded graph),
+    such that a single node can replace thresh_func nodes iterated over thresholds. Each est_path identifies its
+    slice of the stack, loadable with `utils.load_mat_sparse`, and each conn_matrix_thr is that slice, memory-mapped.
+
+    """
+    import gc
+    from pynets.core import utils, thresholding
+
+    if parc is True:
+        node_size = 'parc'
+
+    if np.count_nonzero(conn_matrix) == 0:
+        raise ValueError('ERROR: Raw connectivity matrix contains only zeros.')
+
+    # Save unthresholded
+    utils.save_mat(conn_matrix, utils.create_raw_path_func(ID, network, conn_model, roi, dir_path, node_size, smooth,
+                                                           hpass, parc, extract_strategy))
+
+    [thr_type, edge_thresholds, conn_matrices] = thresholding.perform_thresholding_multi(conn_matrix, thrs,
+                                                                                         min_span_tree, dens_thresh,
+                                                                                         disp_filt)
+
+    # Save thresholded mats
+    est_paths = [utils.create_est_path_func(ID, network, conn_model, thr, roi, dir_path, node_size, smooth, thr_type,
+                                            hpass, parc, extract_strategy) for thr in thrs]
+    utils.save_mat_stack(conn_matrices, est_paths)
+    del conn_matrices
+    gc.collect()
+
+    T = len(est_paths)
+    return ([utils.load_mat_stack(est_path) for est_path in est_paths], edge_thresholds, est_paths, list(thrs),
+            *[[i] * T for i in (node_size, network, conn_model, roi, smooth, prune, ID, dir_path, atlas, uatlas,
+                                labels, coords, norm, binary, hpass, extract_strategy)])
+
+
+def thresh_struct_batch(dens_thresh, thrs, conn_matrix, conn_model, network, ID, dir_path, roi, node_size,
+                        min_span_tree, disp_filt, parc, prune, atlas, uatlas, labels, coords, norm, binary,
+                        target_samples, track_type, atlas_mni, streams, directget, min_length):
+    """
+    Threshold a structural connectivity matrix at each of several thresholds at once, as with `thresh_struct`,
+    saving the resulting graphs as a single stack rather than one file per threshold.
+
+    Parameters are those of `thresh_struct`, except for thrs, a list of values between 0 and 1 that replaces thr.
+
+    Returns
+    -------
+    The returns of `thresh_struct`, each as a list with one entry per threshold of thrs (i.e. per thresholded graph),
+    such that a single node can replace thresh_struct nodes iterated over thresholds. Each est_path identifies its
+    slice of the stack, loadable with `utils.load_mat_sparse`, and each conn_matrix_thr is that slice, memory-mapped.
+
+    """
+    import gc
+    from pynets.core import utils, thresholding
+
+    if parc is True:
+        node_size = 'parc'
+
+    if np.count_nonzero(conn_matrix) == 0:
+        raise ValueError('ERROR: Raw connectivity matrix contains only zeros.')
+
+    # Save unthresholded
+    utils.save_mat(conn_matrix, utils.create_raw_path_diff(ID, network, conn_model, roi, dir_path, node_size,
+                                                           target_samples, track_type, parc, directget, min_length))
+
+    [thr_type, edge_thresholds, conn_matrices] = thresholding.perform_thresholding_multi(conn_matrix, thrs,
+                                                                                         min_span_tree, dens_thresh,
+                                                                                         disp_filt)
+
+    # Save thresholded mats
+    est_paths = [utils.create_est_path_diff(ID, network, conn_model, thr, roi, dir_path, node_size, target_samples,
+                                            track_type, thr_type, parc, directget, min_length) for thr in thrs]
+    utils.save_mat_stack(conn_matrices, est_paths)
+    del conn_matrices
+    gc.collect()
+
+    T = len(est_paths)
+    return ([utils.load_mat_stack(est_path) for est_path in est_paths], edge_thresholds, est_paths, list(thrs),
+            *[[i] * T for i in (node_size, network, conn_model, roi, prune, ID, dir_path, atlas, uatlas, labels,
+                                coords, norm, binary, target_samples, track_type, atlas_mni, streams, directget,
+                                min_length)])
+
+
 def thresh_raw_graph(conn_matrix, thr, min_span_tree, dens_thresh, disp_filt, est_path):
     from pynets.core import thresholding
     [thr_type, edge_threshold, conn_matrix_thr] = thresholding.perform_thresholding(conn_matrix, thr, min_span_tree,
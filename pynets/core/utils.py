@@ -461,7 +461,7 @@ def load_mat(est_path):
     elif fmt == '.txt':
         G = nx.from_numpy_array(np.genfromtxt(est_path))
     elif fmt == '.npy':
-        G = nx.from_numpy_array(np.load(est_path))
+        G = nx.from_numpy_array(load_mat_npy(est_path))
     else:
         raise ValueError('\nERROR: File format not supported!')
 
@@ -471,6 +471,185 @@ def load_mat(est_path):
     return nx.to_numpy_matrix(G, weight='weight')
 
 
+def load_mat_sparse(est_path):
+    """
+    Load an adjacency matrix as a scipy.sparse CSR matrix, without constructing an intermediate NetworkX graph
+    for dense (.npy and .txt) formats.
+
+    Parameters
+    ----------
+    est_path : str
+        File path to .npy file containing graph with thresholding applied.
+
+    Returns
+    -------
+    conn_matrix : csr_matrix
+        Undirected adjacency matrix, identical to that returned by load_mat.
+    """
+    import numpy as np
+    import os.path as op
+    from scipy import sparse
+
+    fmt = op.splitext(est_path)[1]
+
+    if fmt == '.npy':
+        A = np.load(est_path, mmap_mode='r') if op.isfile(est_path) else load_mat_stack(est_path)
+    elif fmt == '.txt':
+        A = np.genfromtxt(est_path)
+    else:
+        return sparse.csr_matrix(load_mat(est_path))
+
+    return undirected_mat_sparse(A)
+
+
+def undirected_mat_sparse(A):
+    """
+    Convert an adjacency matrix to the undirected scipy.sparse CSR matrix that load_mat_sparse returns for it
+    once saved.
+
+    Parameters
+    ----------
+    A : NxN np.ndarray or scipy.sparse matrix
+        Adjacency matrix.
+
+    Returns
+    -------
+    conn_matrix : csr_matrix
+        Undirected adjacency matrix.
+    """
+    from scipy import sparse
+
+    A = sparse.csr_matrix(A)
+
+    # As with an undirected NetworkX graph, the (j, i) weight takes precedence over the (i, j) weight for i < j,
+    # unless it is absent.
+    upper = sparse.triu(A, k=1).tocsr()
+    lower = sparse.tril(A, k=-1).T.tocsr()
+    upper = upper - upper.multiply(lower.astype(bool)) + lower
+    conn_matrix = (upper + upper.T + sparse.diags(A.diagonal())).tocsr()
+    conn_matrix.eliminate_zeros()
+
+    return conn_matrix
+
+
+def stack_path(est_path):
+    """
+    Name the file of stacked thresholded graphs to which a thresholded graph belongs.
+
+    Parameters
+    ----------
+    est_path : str
+        File path to .npy file containing graph with thresholding applied.
+
+    Returns
+    -------
+    stack_path : str
+        File path to .npy file containing the graphs of all thresholds, with the threshold replaced by `stack`.
+
+    """
+    return re.sub(r'_thr-[^_/]+\.npy$', '_thr-stack.npy', est_path)
+
+
+def save_mat_stack(conn_matrices, est_paths):
+    """
+    Save thresholded graphs of the same raw graph as a single stack, one contiguous chunk per graph, along with
+    an index of the est_path of each graph. Each graph can then be loaded by its est_path with `load_mat_stack`,
+    `load_mat` or `load_mat_sparse`.
+
+    Parameters
+    ----------
+    conn_matrices : array
+        T x N x N stack of thresholded adjacency matrices.
+    est_paths : list
+        File paths identifying each of the T thresholded graphs, which differ only by threshold.
+
+    Returns
+    -------
+    stack_path : str
+        File path to .npy file containing the stack.
+
+    """
+    import json
+
+    out_path = stack_path(est_paths[0])
+    if any(stack_path(est_path) != out_path for est_path in est_paths):
+        raise ValueError('ERROR: Only graphs that differ by threshold can be stacked.')
+    stack = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float64, shape=np.shape(conn_matrices))
+    for i, conn_matrix in enumerate(conn_matrices):
+        stack[i] = conn_matrix
+    stack.flush()
+    del stack
+    with open(f"{out_path.split('.npy')[0]}.json", 'w') as index_file:
+        json.dump({op.basename(est_path): i for i, est_path in enumerate(est_paths)}, index_file)
+
+    return out_path
+
+
+def load_mat_stack(est_path):
+    """
+    Memory-map a thresholded graph saved with `save_mat_stack`.
+
+    Parameters
+    ----------
+    est_path : str
+        File path identifying the thresholded graph.
+
+    Returns
+    -------
+    conn_matrix : np.memmap
+        Read-only NxN adjacency matrix.
+
+    """
+    import json
+
+    in_path = stack_path(est_path)
+    with open(f"{in_path.split('.npy')[0]}.json", 'r') as index_file:
+        index = json.load(index_file)
+
+    return np.load(in_path, mmap_mode='r')[index[op.basename(est_path)]]
+
+
+def load_mat_npy(est_path):
+    """
+    Load an adjacency matrix saved in .npy format, either on its own or as a graph of a stack saved with
+    `save_mat_stack`, whose est_path does not exist on disk.
+
+    Parameters
+    ----------
+    est_path : str
+        File path to .npy file containing graph with thresholding applied.
+
+    Returns
+    -------
+    conn_matrix : array
+        NxN adjacency matrix.
+
+    """
+    return np.load(est_path) if op.isfile(est_path) else np.array(load_mat_stack(est_path))
+
+
+def mat_exists(est_path):
+    """
+    Whether an adjacency matrix exists on disk, either on its own or as a graph of a stack saved with
+    `save_mat_stack`.
+
+    Parameters
+    ----------
+    est_path : str
+        File path to .npy file containing graph with thresholding applied.
+
+    """
+    import json
+
+    if op.isfile(est_path):
+        return True
+    index_path = f"{stack_path(est_path).split('.npy')[0]}.json"
+    if not op.isfile(stack_path(est_path)) or not op.isfile(index_path):
+        return False
+    with open(index_path, 'r') as index_file:
+        return op.basename(est_path) in json.load(index_file)
+
+
 def load_mat_ext(est_path, ID, network, conn_model, roi, prune, norm, binary, min_span_tree, dens_thresh, disp_filt):
     from pynets.core.utils import load_mat
 
@@ -486,7 +665,7 @@ def save_mat(conn_matrix, est_path, fmt='npy'):
     Parameters
     ----------
     conn_matrix : array
-        Adjacency matrix stored as an m x n array of nodes and edges.
+        Adjacency matrix stored as an m x n array (or scipy.sparse matrix) of nodes and edges.
     est_path : str
         File path to .npy file containing graph.
     fmt : str
@@ -495,8 +674,15 @@ def save_mat(conn_matrix, est_path, fmt='npy'):
     """
     import numpy as np
     import networkx as nx
+    from scipy import sparse
 
-    G = nx.from_numpy_array(conn_matrix)
+    if sparse.issparse(conn_matrix):
+        try:
+            G = nx.from_scipy_sparse_array(conn_matrix)
+        except AttributeError:
+            G = nx.from_scipy_sparse_matrix(conn_matrix)
+    else:
+        G = nx.from_numpy_array(conn_matrix)
     G.graph['ecount'] = nx.number_of_edges(G)
     G = nx.convert_node_labels_to_integers(G, first_label=1)
     if fmt == 'edgelist_csv':
@@ -930,7 +1116,7 @@ def check_est_path_existence(est_path_list):
 
     for est_path in est_path_list:
         i = i + 1
-        if op.isfile(est_path) is True:
+        if mat_exists(est_path) is True:
             est_path_list_ex.append(est_path)
         else:
             print(f"\n\nWarning: Missing {est_path}...\n\n")
@@ -1142,11 +1328,16 @@ def merge_dicts(x, y):
 def timeout(seconds):
     """
     Timeout function for hung calculations.
+
+    SIGALRM can only be handled on the main thread, so the timeout is not enforced when the
+    decorated function is called from any other thread (see netstats.run_metric_schedule for
+    process-level timeouts).
     """
     from functools import wraps
     import errno
     import os
     import signal
+    import threading
 
     class TimeoutError(Exception):
         pass
@@ -1157,6 +1348,8 @@ def timeout(seconds):
             raise TimeoutError(error_message)
 
         def wrapper(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                return func(*args, **kwargs)
             signal.signal(signal.SIGALRM, _handle_timeout)
             signal.alarm(seconds)
             try:
@@ -10,6 +10,29 @@ import numpy as np
 warnings.filterwarnings("ignore")
 
 
+def threshold_iterlist(min_thr, max_thr, step_thr):
+    """
+    Thresholds iterated over by multi-threshold workflows, spanning min_thr to max_thr (inclusive) by step_thr.
+
+    Parameters
+    ----------
+    min_thr : float
+        Minimum threshold for multi-thresholding.
+    max_thr : float
+        Maximum threshold for multi-thresholding.
+    step_thr : float
+        Threshold step value for multi-thresholding.
+
+    Returns
+    -------
+    iter_thresh : list
+        Sorted, unique thresholds, as strings.
+
+    """
+    return sorted(list(set([str(i) for i in np.round(np.arange(float(min_thr), float(max_thr), float(step_thr)),
+                                                     decimals=2).tolist()] + [str(float(max_thr))])))
+
+
 def workflow_selector(func_file, ID, atlas, network, node_size, roi, thr, uatlas, multi_nets,
                       conn_model, dens_thresh, conf, plot_switch, dwi_file, anat_file, parc,
                       ref_txt, procmem, multi_thr, multi_atlas, max_thr, min_thr, step_thr, k,
@@ -954,6 +977,7 @@ def dmri_connectometry(ID, atlas, network, node_size, roi, uatlas, plot_switch,
     run_tracking_node.synchronize = True
     run_tracking_node._n_procs = runtime_dict['run_tracking_node'][0]
     run_tracking_node._mem_gb = runtime_dict['run_tracking_node'][1]
+    run_tracking_node.inputs.n_procs = run_tracking_node._n_procs
 
     # Set tracking iterable combinations
     if conn_model_list or multi_directget or min_length_list:
@@ -1255,13 +1279,11 @@ def dmri_connectometry(ID, atlas, network, node_size, roi, uatlas, plot_switch,
     # Create a "thr_info" node for iterating iterfields across thresholds
     thr_info_node = pe.Node(niu.IdentityInterface(fields=map_fields), name='thr_info_node')
 
-    # Set iterables for thr on thresh_func, else set thr to singular input
+    # Set iterables for thr on thresh_struct, else apply every threshold at once to each graph with
+    # thresh_struct_batch
     if multi_thr is True:
-        iter_thresh = sorted(list(set([str(i) for i in np.round(np.arange(float(min_thr), float(max_thr),
-                                                                          float(step_thr)), decimals=2).tolist()] +
-                                      [str(float(max_thr))])))
-        thr_info_node.iterables = ("thr", iter_thresh)
-        thr_info_node.synchronize = True
+        iter_thresh = threshold_iterlist(min_thr, max_thr, step_thr)
+        thr_info_node.inputs.thr = None
     else:
         thr_info_node.iterables = ("thr", [thr])
 
@@ -1342,7 +1364,18 @@ def dmri_connectometry(ID, atlas, network, node_size, roi, uatlas, plot_switch,
                               'norm', 'binary', 'target_samples', 'track_type', 'atlas_mni', 'streams', 'directget',
                               'min_length']
 
-    if no_iters is True:
+    if multi_thr is True:
+        # Each graph is thresholded at every threshold at once, with its thresholded graphs saved as a single stack.
+        # Every output has one entry per thresholded graph, as when joined across thr_info_node iterables.
+        thr_struct_batch_fields = ['thrs' if i == 'thr' else i for i in thr_struct_fields]
+        thresh_diff_node = pe.MapNode(niu.Function(input_names=thr_struct_batch_fields,
+                                                   output_names=thr_struct_iter_fields,
+                                                   function=thresholding.thresh_struct_batch, imports=import_list),
+                                      name="thresh_diff_node",
+                                      iterfield=[i for i in thr_struct_batch_fields if i != 'thrs'], nested=True)
+        thresh_diff_node.inputs.thrs = iter_thresh
+        thresh_diff_node.synchronize = True
+    elif no_iters is True:
         thresh_diff_node = pe.Node(niu.Function(input_names=thr_struct_fields,
                                                 output_names=['conn_matrix_thr', 'edge_threshold', 'est_path', 'thr',
                                                               'node_size', 'network', 'conn_model', 'roi', 'prune',
@@ -1365,56 +1398,35 @@ def dmri_connectometry(ID, atlas, network, node_size, roi, uatlas, plot_switch,
         thresh_diff_node.synchronize = True
 
     dmri_connectometry_wf.connect([
-        (join_iters_node, thresh_diff_node, [('dens_thresh', 'dens_thresh'),
-                                             ('thr', 'thr'),
-                                             ('conn_matrix', 'conn_matrix'),
-                                             ('conn_model', 'conn_model'),
-                                             ('network', 'network'),
-                                             ('ID', 'ID'),
-                                             ('dir_path', 'dir_path'),
-                                             ('roi', 'roi'),
-                                             ('node_size', 'node_size'),
-                                             ('min_span_tree', 'min_span_tree'),
-                                             ('disp_filt', 'disp_filt'),
-                                             ('parc', 'parc'),
-                                             ('prune', 'prune'),
-                                             ('atlas', 'atlas'),
-                                             ('uatlas', 'uatlas'),
-                                             ('labels', 'labels'),
-                                             ('coords', 'coords'),
-                                             ('norm', 'norm'),
-                                             ('binary', 'binary'),
-                                             ('target_samples', 'target_samples'),
-                                             ('track_type', 'track_type'),
-                                             ('atlas_mni', 'atlas_mni'),
-                                             ('streams', 'streams'),
-                                             ('directget', 'directget'),
-                                             ('min_length', 'min_length')])
+        (join_iters_node, thresh_diff_node, [x for x in [('dens_thresh', 'dens_thresh'),
+                                                         ('thr', 'thr'),
+                                                         ('conn_matrix', 'conn_matrix'),
+                                                         ('conn_model', 'conn_model'),
+                                                         ('network', 'network'),
+                                                         ('ID', 'ID'),
+                                                         ('dir_path', 'dir_path'),
+                                                         ('roi', 'roi'),
+                                                         ('node_size', 'node_size'),
+                                                         ('min_span_tree', 'min_span_tree'),
+                                                         ('disp_filt', 'disp_filt'),
+                                                         ('parc', 'parc'),
+                                                         ('prune', 'prune'),
+                                                         ('atlas', 'atlas'),
+                                                         ('uatlas', 'uatlas'),
+                                                         ('labels', 'labels'),
+                                                         ('coords', 'coords'),
+                                                         ('norm', 'norm'),
+                                                         ('binary', 'binary'),
+                                                         ('target_samples', 'target_samples'),
+                                                         ('track_type', 'track_type'),
+                                                         ('atlas_mni', 'atlas_mni'),
+                                                         ('streams', 'streams'),
+                                                         ('directget', 'directget'),
+                                                         ('min_length', 'min_length')] if
+                                             not (multi_thr is True and x == ('thr', 'thr'))])
     ])
 
-    if multi_thr is True:
-        join_iters_node_thr = pe.JoinNode(niu.IdentityInterface(fields=thr_struct_iter_fields),
-                                          name='join_iters_node_thr',
-                                          joinsource=thr_info_node,
-                                          joinfield=thr_struct_iter_fields)
-        dmri_connectometry_wf.connect([
-            (thresh_diff_node, join_iters_node_thr, [('conn_matrix_thr', 'conn_matrix_thr'),
-                                                     ('edge_threshold', 'edge_threshold'),
-                                                     ('est_path', 'est_path'), ('thr', 'thr'),
-                                                     ('node_size', 'node_size'), ('network', 'network'),
-                                                     ('conn_model', 'conn_model'), ('roi', 'roi'),
-                                                     ('prune', 'prune'), ('ID', 'ID'),
-                                                     ('dir_path', 'dir_path'), ('atlas', 'atlas'),
-                                                     ('uatlas', 'uatlas'), ('labels', 'labels'),
-                                                     ('coords', 'coords'), ('norm', 'norm'),
-                                                     ('binary', 'binary'), ('target_samples', 'target_samples'),
-                                                     ('track_type', 'track_type'), ('atlas_mni', 'atlas_mni'),
-                                                     ('streams', 'streams'), ('directget', 'directget'),
-                                                     ('min_length', 'min_length')])
-        ])
-        thr_out_node = join_iters_node_thr
-    else:
-        thr_out_node = thresh_diff_node
+    thr_out_node = thresh_diff_node
 
     # Plotting
     if plot_switch is True:
@@ -2469,13 +2481,10 @@ def fmri_connectometry(func_file, ID, atlas, network, node_size, roi, thr, uatla
     # Create a "thr_info" node for iterating iterfields across thresholds
     thr_info_node = pe.Node(niu.IdentityInterface(fields=map_fields), name='thr_info_node')
 
-    # Set iterables for thr on thresh_func, else set thr to singular input
+    # Set iterables for thr on thresh_func, else apply every threshold at once to each graph with thresh_func_batch
     if multi_thr is True:
-        iter_thresh = sorted(list(set([str(i) for i in np.round(np.arange(float(min_thr), float(max_thr),
-                                                                          float(step_thr)), decimals=2).tolist()] +
-                                      [str(float(max_thr))])))
-        thr_info_node.iterables = ("thr", iter_thresh)
-        thr_info_node.synchronize = True
+        iter_thresh = threshold_iterlist(min_thr, max_thr, step_thr)
+        thr_info_node.inputs.thr = None
     else:
         thr_info_node.iterables = ("thr", [thr])
 
@@ -2558,7 +2567,18 @@ def fmri_connectometry(func_file, ID, atlas, network, node_size, roi, thr, uatla
                             'conn_model', 'roi', 'smooth', 'prune', 'ID', 'dir_path', 'atlas', 'uatlas', 'labels',
                             'coords', 'norm', 'binary', 'hpass', 'extract_strategy']
 
-    if no_iters is True:
+    if multi_thr is True:
+        # Each graph is thresholded at every threshold at once, with its thresholded graphs saved as a single stack.
+        # Every output has one entry per thresholded graph, as when joined across thr_info_node iterables.
+        thr_func_batch_fields = ['thrs' if i == 'thr' else i for i in thr_func_fields]
+        thresh_func_node = pe.MapNode(niu.Function(input_names=thr_func_batch_fields,
+                                                   output_names=thr_func_iter_fields,
+                                                   function=thresholding.thresh_func_batch,
+                                                   imports=import_list), name="thresh_func_node",
+                                      iterfield=[i for i in thr_func_batch_fields if i != 'thrs'], nested=True)
+        thresh_func_node.inputs.thrs = iter_thresh
+        thresh_func_node.synchronize = True
+    elif no_iters is True:
         thresh_func_node = pe.Node(niu.Function(input_names=thr_func_fields,
                                                 output_names=['conn_matrix_thr', 'edge_threshold', 'est_path', 'thr',
                                                               'node_size', 'network', 'conn_model', 'roi', 'smooth',
@@ -2580,51 +2600,32 @@ def fmri_connectometry(func_file, ID, atlas, network, node_size, roi, thr, uatla
         thresh_func_node.synchronize = True
 
     fmri_connectometry_wf.connect([
-        (join_iters_node, thresh_func_node, [('dens_thresh', 'dens_thresh'),
-                                             ('thr', 'thr'),
-                                             ('conn_matrix', 'conn_matrix'),
-                                             ('conn_model', 'conn_model'),
-                                             ('network', 'network'),
-                                             ('ID', 'ID'),
-                                             ('dir_path', 'dir_path'),
-                                             ('roi', 'roi'),
-                                             ('node_size', 'node_size'),
-                                             ('min_span_tree', 'min_span_tree'),
-                                             ('smooth', 'smooth'),
-                                             ('disp_filt', 'disp_filt'),
-                                             ('parc', 'parc'),
-                                             ('prune', 'prune'),
-                                             ('atlas', 'atlas'),
-                                             ('uatlas', 'uatlas'),
-                                             ('labels', 'labels'),
-                                             ('coords', 'coords'),
-                                             ('norm', 'norm'),
-                                             ('binary', 'binary'),
-                                             ('hpass', 'hpass'),
-                                             ('extract_strategy', 'extract_strategy')])
+        (join_iters_node, thresh_func_node, [x for x in [('dens_thresh', 'dens_thresh'),
+                                                         ('thr', 'thr'),
+                                                         ('conn_matrix', 'conn_matrix'),
+                                                         ('conn_model', 'conn_model'),
+                                                         ('network', 'network'),
+                                                         ('ID', 'ID'),
+                                                         ('dir_path', 'dir_path'),
+                                                         ('roi', 'roi'),
+                                                         ('node_size', 'node_size'),
+                                                         ('min_span_tree', 'min_span_tree'),
+                                                         ('smooth', 'smooth'),
+                                                         ('disp_filt', 'disp_filt'),
+                                                         ('parc', 'parc'),
+                                                         ('prune', 'prune'),
+                                                         ('atlas', 'atlas'),
+                                                         ('uatlas', 'uatlas'),
+                                                         ('labels', 'labels'),
+                                                         ('coords', 'coords'),
+                                                         ('norm', 'norm'),
+                                                         ('binary', 'binary'),
+                                                         ('hpass', 'hpass'),
+                                                         ('extract_strategy', 'extract_strategy')] if
+                                             not (multi_thr is True and x == ('thr', 'thr'))])
     ])
 
-    if multi_thr is True:
-        join_iters_node_thr = pe.JoinNode(niu.IdentityInterface(fields=thr_func_iter_fields),
-                                          name='join_iters_node_thr',
-                                          joinsource=thr_info_node,
-                                          joinfield=thr_func_iter_fields)
-        fmri_connectometry_wf.connect([
-            (thresh_func_node, join_iters_node_thr, [('conn_matrix_thr', 'conn_matrix_thr'),
-                                                     ('edge_threshold', 'edge_threshold'),
-                                                     ('est_path', 'est_path'), ('thr', 'thr'),
-                                                     ('node_size', 'node_size'), ('network', 'network'),
-                                                     ('conn_model', 'conn_model'), ('roi', 'roi'),
-                                                     ('smooth', 'smooth'), ('prune', 'prune'), ('ID', 'ID'),
-                                                     ('dir_path', 'dir_path'), ('atlas', 'atlas'),
-                                                     ('uatlas', 'uatlas'), ('labels', 'labels'),
-                                                     ('coords', 'coords'), ('norm', 'norm'),
-                                                     ('binary', 'binary'), ('hpass', 'hpass'),
-                                                     ('extract_strategy', 'extract_strategy')])
-        ])
-        thr_out_node = join_iters_node_thr
-    else:
-        thr_out_node = thresh_func_node
+    thr_out_node = thresh_func_node
 
     # Plotting
     if plot_switch is True:
@@ -2826,7 +2827,6 @@ def fmri_connectometry(func_file, ID, atlas, network, node_size, roi, thr, uatla
 
 def raw_graph_workflow(multi_thr, thr, multi_graph, graph, ID, network, conn_model, roi, prune, norm, binary,
                        min_span_tree, dens_thresh, disp_filt, min_thr, max_thr, step_thr, wf, net_mets_node):
-    import numpy as np
     from pynets.core.utils import load_mat, load_mat_ext, save_mat_thresholded
     from pynets.core.thresholding import thresh_raw_graph
     from nipype.pipeline import engine as pe
@@ -2949,10 +2949,7 @@ def raw_graph_workflow(multi_thr, thr, multi_graph, graph, ID, network, conn_mod
                         ])
 
     if multi_thr is True:
-        iter_thresh = sorted(list(set([str(i) for i in np.round(np.arange(float(min_thr), float(max_thr),
-                                                                          float(step_thr)),
-                                                                decimals=2).tolist()] +
-                                      [str(float(max_thr))])))
+        iter_thresh = threshold_iterlist(min_thr, max_thr, step_thr)
 
         join_iters_node_thr = pe.JoinNode(niu.IdentityInterface(fields=['ID', 'network', 'thr', 'conn_model',
                                                                         'est_path', 'roi', 'prune', 'norm',
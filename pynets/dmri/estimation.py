@@ -309,6 +309,68 @@ def sfm_mod_est(gtab, data, B0_mask):
     return sf_odf, model
 
 
+def streamline_label_counts(vox_coords, lengths, atlas_data, offsets):
+    '''
+    Count the atlas voxels of each label within the error margin of the points of every streamline.
+
+    The voxel coordinates of the points of all streamlines are mapped to labels in one pass, through
+    a sparse lookup from each traversed voxel to the labels within its error margin (i.e. a dilated
+    label volume, restricted to the voxels that the streamlines traverse) that is built once per atlas.
+    Each point contributes every voxel within its error margin, as with nodemaker.get_sphere.
+
+    Parameters
+    ----------
+    vox_coords : array
+        P x 3 integer voxel coordinates of the points of all streamlines, concatenated.
+    lengths : array
+        Number of points of each streamline.
+    atlas_data : array
+        3D atlas parcellation of integer labels.
+    offsets : array
+        K x 3 voxel offsets within the error margin of a point (see nodemaker.get_sphere_offsets).
+
+    Returns
+    -------
+    label_counts : scipy.sparse.csr_matrix
+        Number of streamlines x number of atlas labels matrix of voxel counts, with atlas labels in
+        ascending order.
+
+    '''
+    from scipy import sparse
+
+    shape = np.array(atlas_data.shape[:3])
+    atlas_labels = np.unique(atlas_data.astype('uint16'))[1:]
+    node_lookup = np.full(int(np.max(atlas_data)) + 1, -1, dtype=np.int64)
+    node_lookup[atlas_labels] = np.arange(len(atlas_labels))
+    if len(offsets) == 0:
+        # An error margin too small to reach any voxel
+        return sparse.csr_matrix((len(lengths), len(atlas_labels)))
+
+    # Points beyond the image, but within the error margin of it, still reach voxels inside of it
+    grid = shape + np.ceil(np.max(np.abs(offsets), axis=0)).astype(np.int64) + 1
+    sl_ids = np.repeat(np.arange(len(lengths)), lengths)
+    inside = np.all(vox_coords < grid, axis=1)
+    vox, points_vox = np.unique(np.ravel_multi_index(vox_coords[inside].T, grid), return_inverse=True)
+    vox_coords = np.array(np.unravel_index(vox, grid)).T
+
+    rows = []
+    cols = []
+    for off in offsets:
+        # Rounded after the offset is added to each voxel, as by nodemaker.get_sphere, since halves are rounded to even
+        neighbors = np.round(vox_coords + off).astype(np.int64)
+        valid = np.flatnonzero(np.all((neighbors >= 0) & (neighbors < shape), axis=1))
+        labs = node_lookup[atlas_data[tuple(neighbors[valid].T)].astype(np.int64)]
+        rows.append(valid[labs >= 0])
+        cols.append(labs[labs >= 0])
+    rows = np.concatenate(rows)
+    lookup = sparse.csr_matrix((np.ones(len(rows)), (rows, np.concatenate(cols))),
+                               shape=(len(vox), len(atlas_labels)))
+    points = sparse.csr_matrix((np.ones(len(points_vox)), (sl_ids[inside], points_vox.ravel())),
+                               shape=(len(lengths), len(vox)))
+
+    return (points @ lookup).tocsr()
+
+
 def streams2graph(atlas_mni, streams, overlap_thr, dir_path, track_type, target_samples, conn_model, network, node_size,
                   dens_thresh, ID, roi, min_span_tree, disp_filt, parc, prune, atlas, uatlas, labels, coords, norm,
                   binary, directget, warped_fa, error_margin, min_length, fa_wei=True):
@@ -379,7 +441,9 @@ def streams2graph(atlas_mni, streams, overlap_thr, dir_path, track_type, target_
     min_length : int
         Minimum fiber length threshold in mm to restrict tracking.
     fa_wei :  bool
-        Scale streamline count edges by fractional anistropy (FA). Default is False.
+        Scale streamline count edges by fractional anistropy (FA), such that each streamline contributes its
+        mean FA (normalized by the global range of FA) to its edges, rather than 1. Each edge weight is then its
+        streamline count times the mean normalized FA of its streamlines. Default is True.
 
     Returns
     -------
@@ -458,11 +522,8 @@ def streams2graph(atlas_mni, streams, overlap_thr, dir_path, track_type, target_
     import time
     from dipy.tracking.streamline import Streamlines, values_from_volume
     from dipy.tracking._utils import (_mapping_to_voxel, _to_voxel_coordinates)
-    import networkx as nx
-    from itertools import combinations
-    from collections import defaultdict
-    from pynets.core import utils, nodemaker
-    from pynets.dmri.dmri_utils import generate_sl
+    from pynets.core import nodemaker
+    from pynets.dmri.estimation import streamline_label_counts
     from dipy.io.streamline import load_tractogram
     from dipy.io.stateful_tractogram import Space, Origin
 
@@ -472,109 +533,46 @@ def streams2graph(atlas_mni, streams, overlap_thr, dir_path, track_type, target_
     roi_img = nib.load(atlas_mni)
     atlas_data = np.around(np.asarray(roi_img.dataobj))
     roi_zooms = roi_img.header.get_zooms()
-    roi_shape = roi_img.shape
 
     # Read Streamlines
-    streamlines = [i.astype(np.float32) for i in Streamlines(load_tractogram(streams, roi_img, to_space=Space.RASMM,
-                                                                             to_origin=Origin.TRACKVIS,
-                                                                             bbox_valid_check=False).streamlines)]
+    streamlines = Streamlines(load_tractogram(streams, roi_img, to_space=Space.RASMM, to_origin=Origin.TRACKVIS,
+                                              bbox_valid_check=False).streamlines)
     roi_img.uncache()
 
-    if fa_wei is True:
-        fa_weights = values_from_volume(np.asarray(nib.load(warped_fa).dataobj), streamlines, np.eye(4))
-        global_fa_weights = list(utils.flatten(fa_weights))
-        min_global_fa_wei = min(i for i in global_fa_weights if i > 0)
-        max_global_fa_wei = max(global_fa_weights)
-        fa_weights_norm = []
-        # Here we normalize by global FA
-        for val_list in fa_weights:
-            fa_weights_norm.append(np.nanmean((val_list - min_global_fa_wei) /
-                                              (max_global_fa_wei - min_global_fa_wei)))
-
-    # Make streamlines into generators to keep memory at a minimum
-    sl = [generate_sl(i) for i in streamlines]
+    # Points of all streamlines, as one contiguous buffer
+    points = streamlines.get_data().astype(np.float32)
+    lengths = np.array([len(s) for s in streamlines], dtype=np.int64)
     del streamlines
 
-    # Instantiate empty networkX graph object & dictionary and create voxel-affine mapping
+    if fa_wei is True:
+        fa_weights = values_from_volume(np.asarray(nib.load(warped_fa).dataobj), points[None], np.eye(4))[0]
+        min_global_fa_wei = np.min(fa_weights[fa_weights > 0])
+        max_global_fa_wei = np.nanmax(fa_weights)
+        # Here we normalize by global FA, and average across the points of each streamline
+        fa_weights = (fa_weights - min_global_fa_wei) / (max_global_fa_wei - min_global_fa_wei)
+        sl_ids = np.repeat(np.arange(len(lengths)), lengths)[~np.isnan(fa_weights)]
+        fa_weights_norm = np.bincount(sl_ids, fa_weights[~np.isnan(fa_weights)], minlength=len(lengths)) / \
+            np.bincount(sl_ids, minlength=len(lengths))
+        del fa_weights, sl_ids
+
+    # Map the streamlines coordinates to voxel coordinates and count the voxels of each label within error_margin
     lin_T, offset = _mapping_to_voxel(np.eye(4))
-    mx = len(np.unique(atlas_data.astype('uint16'))) - 1
-    g = nx.Graph(ecount=0, vcount=mx)
-    edge_dict = defaultdict(int)
-    node_dict = dict(zip(np.unique(atlas_data.astype('uint16'))[1:], np.arange(mx) + 1))
-
-    # Add empty vertices
-    for node in range(1, mx + 1):
-        g.add_node(node)
-
-    # Build graph
-    ix = 0
-    bad_idxs = []
-    for s in sl:
-        # Map the streamlines coordinates to voxel coordinates and get labels for label_volume
-        vox_coords = _to_voxel_coordinates(Streamlines(s), lin_T, offset)
-        lab_coords = [nodemaker.get_sphere(coord, error_margin, roi_zooms, roi_shape) for coord in vox_coords]
-        [i, j, k] = np.vstack(np.array(lab_coords)).T
-
-        # get labels for label_volume
-        lab_arr = atlas_data[i, j, k]
-        endlabels = []
-        for ix, lab in enumerate(np.unique(lab_arr).astype('uint32')):
-            if (lab > 0) and (np.sum(lab_arr == lab) >= overlap_thr):
-                try:
-                    endlabels.append(node_dict[lab])
-                except:
-                    bad_idxs.append(ix)
-                    print(f"Label {lab} missing from parcellation. Check registration and ensure valid input "
-                          f"parcellation file.")
-
-        edges = combinations(endlabels, 2)
-        for edge in edges:
-            lst = tuple([int(node) for node in edge])
-            edge_dict[tuple(sorted(lst))] += 1
-
-        edge_list = [(k[0], k[1], v) for k, v in edge_dict.items()]
-
-        if fa_wei is True:
-            # Add edgelist to g, weighted by average fa of the streamline
-            g.add_weighted_edges_from(edge_list, weight=fa_weights_norm[ix])
-        else:
-            g.add_weighted_edges_from(edge_list)
-        ix = ix + 1
-
-        del lab_coords, lab_arr, endlabels, edges, edge_list
-
-    gc.collect()
+    label_counts = streamline_label_counts(_to_voxel_coordinates(points, lin_T, offset), lengths, atlas_data,
+                                           nodemaker.get_sphere_offsets(error_margin, roi_zooms))
+    del points
 
+    # End labels of each streamline, from which every pair of end labels is an edge
+    endlabels = (label_counts >= overlap_thr).astype(np.float64)
     if fa_wei is True:
-        # Add average fa weights to streamline counts
-        for u, v in list(g.edges):
-            h = g.get_edge_data(u, v)
-            edge_att_dict = {}
-            for e, w in h.items():
-                if w not in edge_att_dict.keys():
-                    edge_att_dict[w] = []
-                else:
-                    edge_att_dict[w].append(e)
-            for key in edge_att_dict.keys():
-                edge_att_dict[key] = np.nanmean(edge_att_dict[key])
-            vals = []
-            for e2, w2 in edge_att_dict.items():
-                vals.append(float(e2) * float(w2))
-            g.edges[u, v].update({'weight': np.nanmean(vals)})
-
-    # Convert to numpy matrix
-    conn_matrix_raw = nx.to_numpy_array(g)
-
-    # Impose symmetry
-    conn_matrix = np.maximum(conn_matrix_raw, conn_matrix_raw.T)
+        # Streamline counts scaled by the average fa of the streamlines of each edge
+        conn_matrix = (endlabels.T @ endlabels.multiply(np.nan_to_num(fa_weights_norm)[:, None])).toarray()
+    else:
+        conn_matrix = (endlabels.T @ endlabels).toarray()
+    np.fill_diagonal(conn_matrix, 0)
+    gc.collect()
 
     print('Graph Building Complete:\n', str(time.time() - start))
 
-    if len(bad_idxs) > 0:
-        bad_idxs = sorted(list(set(bad_idxs)), reverse=True)
-        for j in bad_idxs:
-            del labels[j], coords[j]
-
     coords = np.array(coords)
     labels = np.array(labels)
 
@@ -62,9 +62,9 @@ def reconstruction(conn_model, gtab, dwi_data, B0_mask):
     return mod_fit, mod
 
 
-def prep_tissues(t1_mask, gm_in_dwi, vent_csf_in_dwi, wm_in_dwi, tiss_class, cmc_step_size=0.2):
+def prep_tissue_maps(t1_mask, gm_in_dwi, vent_csf_in_dwi, wm_in_dwi, tiss_class):
     """
-    Estimate a tissue classifier for tractography.
+    Load the tissue maps from which a tractography tissue classifier is built.
 
     Parameters
     ----------
@@ -78,67 +78,125 @@ def prep_tissues(t1_mask, gm_in_dwi, vent_csf_in_dwi, wm_in_dwi, tiss_class, cmc
         File path to white-matter tissue segmentation Nifti1Image.
     tiss_class : str
         Tissue classification method.
-    cmc_step_size : float
-        Step size from CMC tissue classification method.
 
     Returns
     -------
-    tiss_classifier : obj
-        Tissue classifier object.
-
-    References
-    ----------
-    .. [1] Zhang, Y., Brady, M. and Smith, S. Segmentation of Brain MR Images
-      Through a Hidden Markov Random Field Model and the Expectation-Maximization
-      Algorithm IEEE Transactions on Medical Imaging, 20(1): 45-56, 2001
-    .. [2] Avants, B. B., Tustison, N. J., Wu, J., Cook, P. A. and Gee, J. C.
-      An open source multivariate framework for n-tissue segmentation with
-      evaluation on public data. Neuroinformatics, 9(4): 381-400, 2011.
+    tissue_maps : dict
+        Tissue classification method keyed by `tiss_class`, along with the 3D numpy arrays (and, for `cmc`, the
+        average voxel size) that its classifier is built from. Unlike the classifier itself, these can be shared
+        with worker processes.
 
     """
-    try:
-        import cPickle as pickle
-    except ImportError:
-        import _pickle as pickle
-    from dipy.tracking.stopping_criterion import ActStoppingCriterion, CmcStoppingCriterion, BinaryStoppingCriterion
     from nilearn.masking import intersect_masks
     from nilearn.image import math_img
 
     # Loads mask
     mask_img = nib.load(t1_mask)
-    # Load tissue maps and prepare tissue classifier
+    # Load tissue maps
     wm_img = nib.load(wm_in_dwi)
     gm_img = nib.load(gm_in_dwi)
-    gm_mask_data = np.asarray(gm_img.dataobj)
-    wm_mask_data = np.asarray(wm_img.dataobj)
-    vent_csf_in_dwi_data = np.asarray(nib.load(vent_csf_in_dwi).dataobj)
+    gm_mask_data = np.asarray(gm_img.dataobj, dtype=np.float64)
+    wm_mask_data = np.asarray(wm_img.dataobj, dtype=np.float64)
+    vent_csf_in_dwi_data = np.asarray(nib.load(vent_csf_in_dwi).dataobj, dtype=np.float64)
     if tiss_class == 'act':
         background = np.ones(mask_img.shape)
         background[(gm_mask_data + wm_mask_data + vent_csf_in_dwi_data) > 0] = 0
         gm_mask_data[background > 0] = 1
-        tiss_classifier = ActStoppingCriterion(gm_mask_data, vent_csf_in_dwi_data)
+        tissue_maps = {'include_map': gm_mask_data, 'exclude_map': vent_csf_in_dwi_data}
         del background
     elif tiss_class == 'bin':
-        tiss_classifier = BinaryStoppingCriterion(np.asarray(intersect_masks([math_img('img > 0.0', img=mask_img),
-                                                                              math_img('img > 0.0', img=wm_img)],
-                                                                             threshold=1, connected=False).dataobj))
+        tissue_maps = {'mask': np.asarray(intersect_masks([math_img('img > 0.0', img=mask_img),
+                                                           math_img('img > 0.0', img=wm_img)],
+                                                          threshold=1, connected=False).dataobj).astype('uint8')}
     elif tiss_class == 'cmc':
-        voxel_size = np.average(mask_img.header['pixdim'][1:4])
-        tiss_classifier = CmcStoppingCriterion.from_pve(wm_mask_data, gm_mask_data, vent_csf_in_dwi_data,
-                                                        step_size=cmc_step_size, average_voxel_size=voxel_size)
+        tissue_maps = {'wm_map': wm_mask_data, 'gm_map': gm_mask_data, 'csf_map': vent_csf_in_dwi_data,
+                       'average_voxel_size': float(np.average(mask_img.header['pixdim'][1:4]))}
     elif tiss_class == 'wb':
-        tiss_classifier = BinaryStoppingCriterion(np.asarray(mask_img.dataobj).astype('bool'))
+        tissue_maps = {'mask': np.asarray(mask_img.dataobj).astype('bool').astype('uint8')}
     else:
         raise ValueError('Tissue classifier cannot be none.')
+    tissue_maps['tiss_class'] = tiss_class
 
     del gm_mask_data, wm_mask_data, vent_csf_in_dwi_data
     mask_img.uncache()
     gm_img.uncache()
     wm_img.uncache()
 
+    return tissue_maps
+
+
+def tissue_classifier(tissue_maps, cmc_step_size=0.2):
+    """
+    Build a tissue classifier for tractography from tissue maps.
+
+    Parameters
+    ----------
+    tissue_maps : dict
+        Tissue classification method and tissue maps, as returned by `prep_tissue_maps`.
+    cmc_step_size : float
+        Step size from CMC tissue classification method.
+
+    Returns
+    -------
+    tiss_classifier : obj
+        Tissue classifier object.
+
+    """
+    from dipy.tracking.stopping_criterion import ActStoppingCriterion, CmcStoppingCriterion, BinaryStoppingCriterion
+
+    tiss_class = tissue_maps['tiss_class']
+    if tiss_class == 'act':
+        tiss_classifier = ActStoppingCriterion(tissue_maps['include_map'], tissue_maps['exclude_map'])
+    elif tiss_class in ('bin', 'wb'):
+        tiss_classifier = BinaryStoppingCriterion(tissue_maps['mask'])
+    elif tiss_class == 'cmc':
+        tiss_classifier = CmcStoppingCriterion.from_pve(tissue_maps['wm_map'], tissue_maps['gm_map'],
+                                                        tissue_maps['csf_map'], step_size=cmc_step_size,
+                                                        average_voxel_size=tissue_maps['average_voxel_size'])
+    else:
+        raise ValueError('Tissue classifier cannot be none.')
+
     return tiss_classifier
 
 
+def prep_tissues(t1_mask, gm_in_dwi, vent_csf_in_dwi, wm_in_dwi, tiss_class, cmc_step_size=0.2):
+    """
+    Estimate a tissue classifier for tractography.
+
+    Parameters
+    ----------
+    t1_mask : str
+        File path to a T1w mask.
+    gm_in_dwi : str
+        File path to grey-matter tissue segmentation Nifti1Image.
+    vent_csf_in_dwi : str
+        File path to ventricular CSF tissue segmentation Nifti1Image.
+    wm_in_dwi : str
+        File path to white-matter tissue segmentation Nifti1Image.
+    tiss_class : str
+        Tissue classification method.
+    cmc_step_size : float
+        Step size from CMC tissue classification method.
+
+    Returns
+    -------
+    tiss_classifier : obj
+        Tissue classifier object.
+
+    References
+    ----------
+    .. [1] Zhang, Y., Brady, M. and Smith, S. Segmentation of Brain MR Images
+      Through a Hidden Markov Random Field Model and the Expectation-Maximization
+      Algorithm IEEE Transactions on Medical Imaging, 20(1): 45-56, 2001
+    .. [2] Avants, B. B., Tustison, N. J., Wu, J., Cook, P. A. and Gee, J. C.
+      An open source multivariate framework for n-tissue segmentation with
+      evaluation on public data. Neuroinformatics, 9(4): 381-400, 2011.
+
+    """
+    return tissue_classifier(prep_tissue_maps(t1_mask, gm_in_dwi, vent_csf_in_dwi, wm_in_dwi, tiss_class),
+                             cmc_step_size=cmc_step_size)
+
+
 def create_density_map(dwi_img, dir_path, streamlines, conn_model, target_samples, node_size, curv_thr_list, step_list,
                        network, roi, directget, min_length, namer_dir):
     """
@@ -211,13 +269,115 @@ def create_density_map(dwi_img, dir_path, streamlines, conn_model, target_sample
     return dir_path, dm_path
 
 
+_track_task = None
+_track_dgs = {}
+
+
+def _init_track_worker(arrays, params):
+    global _track_task, _track_dgs
+    # In pool workers, shared volumes arrive as paths to .npy files and are memory-mapped rather than unpickled
+    arrays = {key: np.load(val, mmap_mode='c') if isinstance(val, str) else val for key, val in arrays.items()}
+    if params['tiss_classifier'] is None:
+        tiss_classifier = tissue_classifier({**params['tissue_maps'], **arrays})
+    else:
+        tiss_classifier = params['tiss_classifier']
+    _track_dgs = {}
+    _track_task = (arrays, tiss_classifier, params)
+
+
+def _track_unit(k):
+    """
+    Track and filter the streamlines of the k-th (curvature, step, seed-batch) ensemble work unit.
+    """
+    from dipy.tracking import utils
+    from dipy.tracking.streamline import select_by_rois
+    from dipy.tracking.local_tracking import LocalTracking, ParticleFilteringTracking
+    from dipy.direction import (ProbabilisticDirectionGetter, ClosestPeakDirectionGetter,
+                                DeterministicMaximumDirectionGetter)
+
+    arrays, tiss_classifier, params = _track_task
+    curv_thr, step = params['combos'][k % len(params['combos'])]
+    seed = params['seed'] + k
+
+    # Instantiate DirectionGetter, once per curvature threshold
+    if curv_thr not in _track_dgs:
+        if params['directget'] == 'prob':
+            dg_class = ProbabilisticDirectionGetter
+        elif params['directget'] == 'clos':
+            dg_class = ClosestPeakDirectionGetter
+        elif params['directget'] == 'det':
+            dg_class = DeterministicMaximumDirectionGetter
+        else:
+            raise ValueError('ERROR: No valid direction getter(s) specified.')
+        _track_dgs[curv_thr] = dg_class.from_shcoeff(arrays['mod_fit'], max_angle=float(curv_thr),
+                                                     sphere=params['sphere'],
+                                                     min_separation_angle=params['min_separation_angle'])
+    dg = _track_dgs[curv_thr]
+
+    # Perform wm-gm interface seeding, using n_seeds at a time
+    seeds = utils.random_seeds_from_mask(arrays['seed_mask'], np.eye(4), seeds_count=params['n_seeds_per_iter'],
+                                         seed_count_per_voxel=False, random_seed=seed)
+    if len(seeds) == 0:
+        raise RuntimeWarning('Warning: No valid seed points found in wm-gm interface...')
+
+    # Perform tracking
+    if params['track_type'] == 'local':
+        streamline_generator = LocalTracking(dg, tiss_classifier, seeds, np.eye(4),
+                                             max_cross=int(params['maxcrossing']), maxlen=int(params['max_length']),
+                                             step_size=float(step), fixedstep=False, return_all=True,
+                                             random_seed=seed)
+    elif params['track_type'] == 'particle':
+        streamline_generator = ParticleFilteringTracking(dg, tiss_classifier, seeds, np.eye(4),
+                                                         max_cross=int(params['maxcrossing']),
+                                                         step_size=float(step),
+                                                         maxlen=int(params['max_length']),
+                                                         pft_back_tracking_dist=params['pft_back_tracking_dist'],
+                                                         pft_front_tracking_dist=params['pft_front_tracking_dist'],
+                                                         particle_count=params['particle_count'],
+                                                         return_all=True, random_seed=seed)
+    else:
+        raise ValueError('ERROR: No valid tracking method(s) specified.')
+
+    # Filter resulting streamlines by those that stay entirely inside the brain
+    roi_proximal_streamlines = utils.target(streamline_generator, np.eye(4), arrays['B0_mask'], include=True)
+
+    # Filter resulting streamlines by roi-intersection characteristics. Both ends must lie near some parcel,
+    # which is equivalent to both ends lying near the union of all parcels.
+    roi_proximal_streamlines = nib.streamlines.array_sequence.ArraySequence(
+        select_by_rois(roi_proximal_streamlines, affine=np.eye(4), rois=[arrays['roi_mask']], include=[True],
+                       mode='both_end', tol=params['roi_neighborhood_tol']))
+
+    if str(params['min_length']) != '0':
+        roi_proximal_streamlines = nib.streamlines.array_sequence.ArraySequence(
+            [s for s in roi_proximal_streamlines if len(s) >= float(params['min_length'])])
+
+    if 'waymask' in arrays:
+        roi_proximal_streamlines = roi_proximal_streamlines[utils.near_roi(roi_proximal_streamlines, np.eye(4),
+                                                                           arrays['waymask'],
+                                                                           tol=params['roi_neighborhood_tol'],
+                                                                           mode='any')]
+
+    out_streams = nib.streamlines.array_sequence.ArraySequence()
+    out_streams.extend(s.astype('float32') for s in roi_proximal_streamlines)
+    print("%s%s%s%s%s%s%s%s" % ('Curvature: ', curv_thr, '\nStep: ', step, '\nSeed: ', seed,
+                                '\nFiltered streamline count: ', len(out_streams)))
+
+    return out_streams
+
+
 def track_ensemble(target_samples, atlas_data_wm_gm_int, parcels, mod_fit, tiss_classifier, sphere, directget,
                    curv_thr_list, step_list, track_type, maxcrossing, roi_neighborhood_tol, min_length, waymask,
                    B0_mask, max_length=1000, n_seeds_per_iter=500, pft_back_tracking_dist=2, pft_front_tracking_dist=1,
-                   particle_count=15, min_separation_angle=20):
+                   particle_count=15, min_separation_angle=20, n_procs=None, seed=0, tmp_dir=None):
     """
     Perform native-space ensemble tractography, restricted to a vector of ROI masks.
 
+    Tracking is divided into work units, each of which tracks n_seeds_per_iter seeds at one
+    (curvature, step) combination, cycling through combinations in order. Unit k is seeded with
+    seed + k and units are consumed in order until target_samples is met, so that results are
+    identical regardless of n_procs. Across a process pool, the fitted model, tissue maps, and
+    masks are shared with workers as memory-mapped arrays.
+
     target_samples : int
         Total number of streamline samples specified to generate streams.
     atlas_data_wm_gm_int : array
@@ -226,10 +386,11 @@ def track_ensemble(target_samples, atlas_data_wm_gm_int, parcels, mod_fit, tiss_
     parcels : list
         List of 3D boolean numpy arrays of atlas parcellation ROI masks from a Nifti1Image in T1w-warped native
         diffusion space.
-    mod : obj
-        Connectivity reconstruction model.
-    tiss_classifier : str
-        Tissue classification method.
+    mod_fit : ndarray
+        Fitted connectivity reconstruction model.
+    tiss_classifier : dict or obj
+        Tissue maps, as returned by `prep_tissue_maps`, or a tissue classifier object. Since the latter
+        cannot be shared with worker processes, tracking with a tissue classifier object is always serial.
     sphere : obj
         DiPy object for modeling diffusion directions on a sphere.
     directget : str
@@ -258,8 +419,8 @@ def track_ensemble(target_samples, atlas_data_wm_gm_int, parcels, mod_fit, tiss_
     max_length : int
         Maximum number of steps to restrict tracking.
     n_seeds_per_iter : int
-        Number of seeds from which to initiate tracking for each unique ensemble combination.
-        By default this is set to 200.
+        Number of seeds from which to initiate tracking for each work unit.
+        By default this is set to 500.
     particle_count
         pft_back_tracking_dist : float
         Distance in mm to back track before starting the particle filtering
@@ -274,6 +435,13 @@ def track_ensemble(target_samples, atlas_data_wm_gm_int, parcels, mod_fit, tiss_
         Number of particles to use in the particle filter.
     min_separation_angle : float
         The minimum angle between directions [0, 90].
+    n_procs : int
+        Number of processes to use. Default is None, which uses all available cores.
+    seed : int
+        Random seed of the first work unit. Default is 0.
+    tmp_dir : str
+        Directory (e.g. the working directory of the calling node) in which arrays shared with worker
+        processes are memory-mapped. Default is None, which uses the system's temporary directory.
 
     Returns
     -------
@@ -289,112 +457,79 @@ def track_ensemble(target_samples, atlas_data_wm_gm_int, parcels, mod_fit, tiss_
     """
     import gc
     import time
+    import shutil
+    import tempfile
+    import multiprocessing as mp
+    from collections import deque
+    from functools import reduce
+    from itertools import product
     from colorama import Fore, Style
-    from dipy.tracking import utils
-    from dipy.tracking.streamline import Streamlines, select_by_rois
-    from dipy.tracking.local_tracking import LocalTracking, ParticleFilteringTracking
-    from dipy.direction import (ProbabilisticDirectionGetter, ClosestPeakDirectionGetter,
-                                DeterministicMaximumDirectionGetter)
 
     start = time.time()
 
-    B0_mask_data = nib.load(B0_mask).get_fdata()
-
+    arrays = {'mod_fit': np.asarray(mod_fit), 'seed_mask': np.asarray(atlas_data_wm_gm_int) > 0,
+              'roi_mask': reduce(np.logical_or, parcels), 'B0_mask': nib.load(B0_mask).get_fdata()}
     if waymask:
-        waymask_data = np.asarray(nib.load(waymask).dataobj).astype('bool')
+        arrays['waymask'] = np.asarray(nib.load(waymask).dataobj).astype('bool')
+
+    if isinstance(tiss_classifier, dict):
+        tissue_maps = {key: val for key, val in tiss_classifier.items() if not isinstance(val, np.ndarray)}
+        arrays.update({key: val for key, val in tiss_classifier.items() if isinstance(val, np.ndarray)})
+        tiss_classifier = None
+    else:
+        tissue_maps = None
+
+    params = {'combos': list(product(curv_thr_list, step_list)), 'seed': int(seed), 'directget': directget,
+              'sphere': sphere, 'track_type': track_type, 'maxcrossing': maxcrossing, 'max_length': max_length,
+              'n_seeds_per_iter': n_seeds_per_iter, 'pft_back_tracking_dist': pft_back_tracking_dist,
+              'pft_front_tracking_dist': pft_front_tracking_dist, 'particle_count': particle_count,
+              'min_separation_angle': min_separation_angle, 'roi_neighborhood_tol': roi_neighborhood_tol,
+              'min_length': min_length, 'tissue_maps': tissue_maps, 'tiss_classifier': tiss_classifier}
+
+    if n_procs is None:
+        n_procs = mp.cpu_count()
+    n_procs = max(1, int(n_procs))
 
     # Commence Ensemble Tractography
-    parcel_vec = list(np.ones(len(parcels)).astype('bool'))
     streamlines = nib.streamlines.array_sequence.ArraySequence()
-
-    circuit_ix = 0
     stream_counter = 0
-    while int(stream_counter) < int(target_samples):
-        for curv_thr in curv_thr_list:
-            print("%s%s" % ('Curvature: ', curv_thr))
-
-            # Instantiate DirectionGetter
-            if directget == 'prob':
-                dg = ProbabilisticDirectionGetter.from_shcoeff(mod_fit, max_angle=float(curv_thr), sphere=sphere,
-                                                               min_separation_angle=min_separation_angle)
-            elif directget == 'clos':
-                dg = ClosestPeakDirectionGetter.from_shcoeff(mod_fit, max_angle=float(curv_thr), sphere=sphere,
-                                                             min_separation_angle=min_separation_angle)
-            elif directget == 'det':
-                dg = DeterministicMaximumDirectionGetter.from_shcoeff(mod_fit, max_angle=float(curv_thr), sphere=sphere,
-                                                                      min_separation_angle=min_separation_angle)
-            else:
-                raise ValueError('ERROR: No valid direction getter(s) specified.')
-
-            for step in step_list:
-                print("%s%s" % ('Step: ', step))
-
-                # Perform wm-gm interface seeding, using n_seeds at a time
-                seeds = utils.random_seeds_from_mask(atlas_data_wm_gm_int > 0, seeds_count=n_seeds_per_iter,
-                                                     seed_count_per_voxel=False, affine=np.eye(4))
-                if len(seeds) == 0:
-                    raise RuntimeWarning('Warning: No valid seed points found in wm-gm interface...')
-
-                # print(seeds)
-
-                # Perform tracking
-                if track_type == 'local':
-                    streamline_generator = LocalTracking(dg, tiss_classifier, seeds, np.eye(4),
-                                                         max_cross=int(maxcrossing), maxlen=int(max_length),
-                                                         step_size=float(step), fixedstep=False, return_all=True)
-                elif track_type == 'particle':
-                    streamline_generator = ParticleFilteringTracking(dg, tiss_classifier, seeds, np.eye(4),
-                                                                     max_cross=int(maxcrossing),
-                                                                     step_size=float(step),
-                                                                     maxlen=int(max_length),
-                                                                     pft_back_tracking_dist=pft_back_tracking_dist,
-                                                                     pft_front_tracking_dist=pft_front_tracking_dist,
-                                                                     particle_count=particle_count,
-                                                                     return_all=True)
-                else:
-                    raise ValueError('ERROR: No valid tracking method(s) specified.')
-
-                # Filter resulting streamlines by those that stay entirely inside the brain
-                roi_proximal_streamlines = utils.target(streamline_generator, np.eye(4), B0_mask_data,
-                                                        include=True)
-
-                # Filter resulting streamlines by roi-intersection characteristics
-                roi_proximal_streamlines = Streamlines(select_by_rois(roi_proximal_streamlines, affine=np.eye(4),
-                                                                      rois=parcels, include=parcel_vec,
-                                                                      mode='both_end',
-                                                                      tol=roi_neighborhood_tol))
-
-                print("%s%s" % ('Filtering by: \nnode intersection: ', len(roi_proximal_streamlines)))
-
-                if str(min_length) != '0':
-                    roi_proximal_streamlines = nib.streamlines.array_sequence.ArraySequence([s for s in
-                                                                                             roi_proximal_streamlines
-                                                                                             if len(s) >=
-                                                                                             float(min_length)])
-
-                    print("%s%s" % ('Minimum length criterion: ', len(roi_proximal_streamlines)))
-
-                if waymask:
-                    roi_proximal_streamlines = roi_proximal_streamlines[utils.near_roi(roi_proximal_streamlines,
-                                                                                       np.eye(4),
-                                                                                       waymask_data,
-                                                                                       tol=roi_neighborhood_tol,
-                                                                                       mode='any')]
-                    print("%s%s" % ('Waymask proximity: ', len(roi_proximal_streamlines)))
-
-                out_streams = [s.astype('float32') for s in roi_proximal_streamlines]
-                streamlines.extend(out_streams)
-                stream_counter = stream_counter + len(out_streams)
-
-                # Cleanup memory
-                del seeds, roi_proximal_streamlines, streamline_generator, out_streams
-                gc.collect()
-            del dg
-
-        circuit_ix = circuit_ix + 1
-        print("%s%s%s%s%s%s" % ('Completed Hyperparameter Circuit: ', circuit_ix,
-                                '\nCumulative Streamline Count: ', Fore.CYAN, stream_counter, "\n"))
-        print(Style.RESET_ALL)
+    unit = 0
+
+    # Daemonic processes (e.g. pool workers) are not allowed to spawn children of their own
+    if n_procs > 1 and tiss_classifier is None and not mp.current_process().daemon:
+        tmp_dir = tempfile.mkdtemp(dir=tmp_dir)
+        try:
+            paths = {}
+            for key, val in arrays.items():
+                paths[key] = f"{tmp_dir}/{key}.npy"
+                np.save(paths[key], val)
+            del arrays
+            with mp.Pool(n_procs, initializer=_init_track_worker, initargs=(paths, params)) as pool:
+                # Keep a bounded window of units in flight, consuming them in order until the target is met
+                pending = deque(pool.apply_async(_track_unit, (k,)) for k in range(2 * n_procs))
+                while int(stream_counter) < int(target_samples):
+                    out_streams = pending.popleft().get()
+                    pending.append(pool.apply_async(_track_unit, (unit + 2 * n_procs,)))
+                    streamlines.extend(out_streams)
+                    stream_counter = stream_counter + len(out_streams)
+                    unit = unit + 1
+                    print("%s%s%s%s%s" % ('Cumulative Streamline Count: ', Fore.CYAN, stream_counter, "\n",
+                                          Style.RESET_ALL))
+                    del out_streams
+                    gc.collect()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    else:
+        _init_track_worker(arrays, params)
+        while int(stream_counter) < int(target_samples):
+            out_streams = _track_unit(unit)
+            streamlines.extend(out_streams)
+            stream_counter = stream_counter + len(out_streams)
+            unit = unit + 1
+            print("%s%s%s%s%s" % ('Cumulative Streamline Count: ', Fore.CYAN, stream_counter, "\n",
+                                  Style.RESET_ALL))
+            del out_streams
+            gc.collect()
 
     print('Tracking Complete:\n', str(time.time() - start))
 
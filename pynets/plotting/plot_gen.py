@@ -19,7 +19,7 @@ matplotlib.use('agg')
 
 
 def plot_connectogram(conn_matrix, conn_model, atlas, dir_path, ID, network, labels, comm='nodes',
-                      color_scheme='interpolateBlues', prune=False):
+                      color_scheme='interpolateBlues', prune=False, communities=None):
     """
     Plot a connectogram for a given connectivity matrix.
 
@@ -47,6 +47,9 @@ def plot_connectogram(conn_matrix, conn_model, atlas, dir_path, ID, network, lab
         Color scheme in json.
     prune : bool
         Indicates whether to prune final graph of disconnected nodes/isolates.
+    communities : array
+        Optional community affiliation vector of the nodes of conn_matrix, as found by graph analysis (see
+        netstats.graph_communities). By default, communities are detected in the plotted graph.
 
     """
     import json
@@ -62,15 +65,20 @@ def plot_connectogram(conn_matrix, conn_model, atlas, dir_path, ID, network, lab
     if prune is True:
         [G, pruned_nodes] = most_important(G)
         conn_matrix = nx.to_numpy_array(G)
+        if communities is not None:
+            communities = np.asarray(communities)[list(G.nodes())]
 
         pruned_nodes.sort(reverse=True)
         for j in pruned_nodes:
             del labels[labels.index(labels[j])]
 
     if comm == 'nodes' and len(conn_matrix) > 40:
-        from pynets.stats.netstats import community_resolution_selection
-        G = nx.from_numpy_matrix(np.abs(conn_matrix))
-        _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
+        if communities is not None:
+            node_comm_aff_mat = np.asarray(communities)
+        else:
+            from pynets.stats.netstats import community_resolution_selection
+            G = nx.from_numpy_matrix(np.abs(conn_matrix))
+            _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
         clust_levels = len(node_comm_aff_mat)
         clust_levels_tmp = int(clust_levels) - 1
         mask_mat = np.squeeze(np.array([node_comm_aff_mat == 0]).astype('int'))
@@ -342,7 +350,8 @@ def plot_network_clusters(graph, communities, out_path, figsize=(8, 8), node_siz
     return
 
 
-def create_gb_palette(mat, edge_cmap, coords, labels, node_size='auto', node_cmap=None, prune=True):
+def create_gb_palette(mat, edge_cmap, coords, labels, node_size='auto', node_cmap=None, prune=True,
+                      communities=None):
     """
     Create conectome color palatte based on topography.
 
@@ -363,6 +372,11 @@ def create_gb_palette(mat, edge_cmap, coords, labels, node_size='auto', node_cma
         size(s) of the nodes in points^2.
     node_cmap: colormap
         colormap used for representing the community assignment of the nodes.
+    prune : bool
+        Indicates whether to prune final graph of disconnected nodes/isolates.
+    communities : array
+        Optional community affiliation vector of the nodes of mat, as found by graph analysis (see
+        netstats.graph_communities). By default, communities are detected in the plotted graph.
 
     """
     import random
@@ -377,6 +391,8 @@ def create_gb_palette(mat, edge_cmap, coords, labels, node_size='auto', node_cma
     if prune is True:
         [G, pruned_nodes] = prune_disconnected(nx.from_numpy_matrix(np.abs(mat)))
         pruned_nodes.sort(reverse=True)
+        if communities is not None:
+            communities = np.asarray(communities)[list(G.nodes())]
         coords_pre = list(coords)
         labels_pre = list(labels)
         if len(pruned_nodes) > 0:
@@ -399,7 +415,10 @@ def create_gb_palette(mat, edge_cmap, coords, labels, node_size='auto', node_cma
     node_sizes = np.array(minmax_scale(node_centralities, feature_range=(1, max_node_size)))
 
     # Node communities
-    _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
+    if communities is not None:
+        node_comm_aff_mat = np.asarray(communities)
+    else:
+        _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
 
     # Path lengths
     edge_lengths = []
@@ -518,6 +537,7 @@ def plot_all_func(conn_matrix, conn_model, atlas, dir_path, ID, network, labels,
     import networkx as nx
     from pynets.plotting import plot_gen, plot_graphs
     from pynets.plotting.plot_gen import create_gb_palette
+    from pynets.stats.netstats import graph_communities, community_options
     try:
         import cPickle as pickle
     except ImportError:
@@ -558,11 +578,21 @@ def plot_all_func(conn_matrix, conn_model, atlas, dir_path, ID, network, labels,
         if not os.path.isdir(namer_dir):
             os.makedirs(namer_dir, exist_ok=True)
 
+        # Communities are those of the graph as analyzed, persisted by (or for) graph analysis
+        try:
+            communities = graph_communities(conn_matrix, conn_model, prune, norm, binary, **community_options(),
+                                            cache_dir=f"{dir_path}/graphs")
+        except Exception as e:
+            print(f"{'WARNING: '}Failed to find the communities of the analyzed graph ({e}). Detecting communities "
+                  f"of the plotted graph instead...")
+            communities = None
+
         # Plot connectogram
         if connectogram is True:
             if len(conn_matrix) > 20:
                 try:
-                    plot_gen.plot_connectogram(conn_matrix, conn_model, atlas, namer_dir, ID, network, labels)
+                    plot_gen.plot_connectogram(conn_matrix, conn_model, atlas, namer_dir, ID, network, labels,
+                                               communities=communities)
                 except RuntimeWarning:
                     print('\n\n\nWarning: Connectogram plotting failed!')
             else:
@@ -574,7 +604,7 @@ def plot_all_func(conn_matrix, conn_model, atlas, dir_path, ID, network, labels,
 
         if adjacency is True:
             plot_graphs.plot_conn_mat_func(conn_matrix, conn_model, atlas, namer_dir, ID, network, labels, roi, thr,
-                                           node_size, smooth, hpass, extract_strategy)
+                                           node_size, smooth, hpass, extract_strategy, communities=communities)
 
         if glassbrain is True:
             views = ['x', 'y', 'z']
@@ -602,8 +632,8 @@ def plot_all_func(conn_matrix, conn_model, atlas, dir_path, ID, network, labels,
             connectome = niplot.plot_connectome(np.zeros(shape=(1, 1)), [(0, 0, 0)], node_size=0.0001, black_bg=True)
             connectome.add_overlay(ch2better_loc, alpha=0.45, cmap=plt.cm.gray)
             [conn_matrix, clust_pal_edges, clust_pal_nodes,
-             node_sizes, edge_sizes, z_min, z_max, coords, labels] = create_gb_palette(conn_matrix, color_theme,
-                                                                                       coords, labels)
+             node_sizes, edge_sizes, z_min, z_max, coords,
+             labels] = create_gb_palette(conn_matrix, color_theme, coords, labels, communities=communities)
 
             if roi:
                 # Save coords to pickle
@@ -715,6 +745,7 @@ def plot_all_struct(conn_matrix, conn_model, atlas, dir_path, ID, network, label
     import networkx as nx
     from pynets.plotting import plot_gen, plot_graphs
     from pynets.plotting.plot_gen import create_gb_palette
+    from pynets.stats.netstats import graph_communities, community_options
     try:
         import cPickle as pickle
     except ImportError:
@@ -749,11 +780,21 @@ def plot_all_struct(conn_matrix, conn_model, atlas, dir_path, ID, network, label
         if not os.path.isdir(namer_dir):
             os.makedirs(namer_dir, exist_ok=True)
 
+        # Communities are those of the graph as analyzed, persisted by (or for) graph analysis
+        try:
+            communities = graph_communities(conn_matrix, conn_model, prune, norm, binary, **community_options(),
+                                            cache_dir=f"{dir_path}/graphs")
+        except Exception as e:
+            print(f"{'WARNING: '}Failed to find the communities of the analyzed graph ({e}). Detecting communities "
+                  f"of the plotted graph instead...")
+            communities = None
+
         # Plot connectogram
         if connectogram is True:
             if len(conn_matrix) > 20:
                 try:
-                    plot_gen.plot_connectogram(conn_matrix, conn_model, atlas, namer_dir, ID, network, labels)
+                    plot_gen.plot_connectogram(conn_matrix, conn_model, atlas, namer_dir, ID, network, labels,
+                                               communities=communities)
                 except RuntimeWarning:
                     print('\n\n\nWarning: Connectogram plotting failed!')
             else:
@@ -765,7 +806,8 @@ def plot_all_struct(conn_matrix, conn_model, atlas, dir_path, ID, network, label
 
         if adjacency is True:
             plot_graphs.plot_conn_mat_struct(conn_matrix, conn_model, atlas, namer_dir, ID, network, labels, roi, thr,
-                                             node_size, target_samples, track_type, directget, min_length)
+                                             node_size, target_samples, track_type, directget, min_length,
+                                             communities=communities)
 
         if glassbrain is True:
             views = ['x', 'y', 'z']
@@ -798,7 +840,7 @@ def plot_all_struct(conn_matrix, conn_model, atlas, dir_path, ID, network, label
 
             [conn_matrix, clust_pal_edges, clust_pal_nodes,
              node_sizes, edge_sizes, _, _, coords, labels] = create_gb_palette(conn_matrix, color_theme, coords,
-                                                                               labels)
+                                                                               labels, communities=communities)
             if roi:
                 # Save coords to pickle
                 coord_path = f"{namer_dir}{'/coords_'}{op.basename(roi).split('.')[0]}{'_plotting.pkl'}"
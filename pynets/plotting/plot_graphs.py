@@ -115,7 +115,7 @@ def plot_community_conn_mat(conn_matrix, labels, out_path_fig_comm, community_af
 
 
 def plot_conn_mat_func(conn_matrix, conn_model, atlas, dir_path, ID, network, labels, roi, thr, node_size, smooth,
-                       hpass, extract_strategy):
+                       hpass, extract_strategy, communities=None):
     """
     API for selecting among various functional connectivity matrix plotting approaches.
 
@@ -151,6 +151,9 @@ def plot_conn_mat_func(conn_matrix, conn_model, atlas, dir_path, ID, network, la
         High-pass filter values (Hz) to apply to node-extracted time-series.
     extract_strategy : str
         The name of a valid function used to reduce the time-series region extraction.
+    communities : array
+        Optional community affiliation vector of the nodes of conn_matrix, as found by graph analysis (see
+        netstats.graph_communities). By default, communities are detected in the plotted graph.
     """
     import matplotlib.pyplot as plt
     import pkg_resources
@@ -195,9 +198,12 @@ def plot_conn_mat_func(conn_matrix, conn_model, atlas, dir_path, ID, network, la
 
     # Plot community adj. matrix
     try:
-        from pynets.stats.netstats import community_resolution_selection
-        G = nx.from_numpy_matrix(np.abs(conn_matrix))
-        _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
+        if communities is not None:
+            node_comm_aff_mat = np.asarray(communities)
+        else:
+            from pynets.stats.netstats import community_resolution_selection
+            G = nx.from_numpy_matrix(np.abs(conn_matrix))
+            _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
         out_path_fig_comm = "%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s" % (dir_path, '/', ID, '_modality-func_',
                                                                   '%s' % ("%s%s%s" % ('rsn-', network, '_') if
                                                                           network is not None else ''),
@@ -227,7 +233,7 @@ def plot_conn_mat_func(conn_matrix, conn_model, atlas, dir_path, ID, network, la
 
 
 def plot_conn_mat_struct(conn_matrix, conn_model, atlas, dir_path, ID, network, labels, roi, thr, node_size,
-                         target_samples, track_type, directget, min_length):
+                         target_samples, track_type, directget, min_length, communities=None):
     """
     API for selecting among various structural connectivity matrix plotting approaches.
 
@@ -266,6 +272,9 @@ def plot_conn_mat_struct(conn_matrix, conn_model, atlas, dir_path, ID, network,
         and prob (probabilistic).
     min_length : int
         Minimum fiber length threshold in mm to restrict tracking.
+    communities : array
+        Optional community affiliation vector of the nodes of conn_matrix, as found by graph analysis (see
+        netstats.graph_communities). By default, communities are detected in the plotted graph.
     """
     import matplotlib.pyplot as plt
     import pkg_resources
@@ -307,9 +316,12 @@ def plot_conn_mat_struct(conn_matrix, conn_model, atlas, dir_path, ID, network,
 
     # Plot community adj. matrix
     try:
-        from pynets.stats.netstats import community_resolution_selection
-        G = nx.from_numpy_matrix(np.abs(conn_matrix))
-        _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
+        if communities is not None:
+            node_comm_aff_mat = np.asarray(communities)
+        else:
+            from pynets.stats.netstats import community_resolution_selection
+            G = nx.from_numpy_matrix(np.abs(conn_matrix))
+            _, node_comm_aff_mat, resolution, num_comms = community_resolution_selection(G)
         out_path_fig_comm = "%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s" % (dir_path, '/', ID, '_modality-dwi_',
                                                                           '%s' % ("%s%s%s" % ('rsn-', network, '_') if
                                                                                   network is not None else ''),
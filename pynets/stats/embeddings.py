@@ -243,13 +243,12 @@ def build_asetomes(est_path_iterlist, ID):
         A subject id or other unique identifier.
 
     """
-    import numpy as np
-    from pynets.core.utils import prune_suffices, flatten
+    from pynets.core.utils import prune_suffices, flatten, load_mat_npy
     from pynets.stats.embeddings import _ase_embed
 
     out_paths = []
     for file_ in list(flatten(est_path_iterlist)):
-        mat = np.load(file_)
+        mat = load_mat_npy(file_)
         atlas = prune_suffices(file_.split('/')[-3])
         res = prune_suffices('_'.join(file_.split('/')[-1].split('modality')[1].split('_')[1:]).split('_est')[0])
         if 'rsn' in res:
@@ -282,15 +281,14 @@ def build_masetome(est_path_iterlist, ID):
       Nature Communications. https://doi.org/10.1038/s41467-018-04614-w
 
     """
-    import numpy as np
-    from pynets.core.utils import prune_suffices
+    from pynets.core.utils import prune_suffices, load_mat_npy
     from pynets.stats.embeddings import _mase_embed
 
     out_paths = []
     for pairs in est_path_iterlist:
         pop_list = []
         for _file in pairs:
-            pop_list.append(np.load(_file))
+            pop_list.append(load_mat_npy(_file))
         atlas = prune_suffices(pairs[0].split('/')[-3])
         res = prune_suffices('_'.join(pairs[0].split('/')[-1].split('modality')[1].split('_')[1:]).split('_est')[0])
         if 'rsn' in res:
@@ -325,9 +323,8 @@ def build_omnetome(est_path_iterlist, ID):
       Conference on (pp. 964-967). IEEE.
 
     """
-    import numpy as np
     import yaml
-    from pynets.core.utils import flatten
+    from pynets.core.utils import flatten, load_mat_npy
     import pkg_resources
     from pynets.stats.embeddings import _omni_embed
 
@@ -404,7 +401,7 @@ def build_omnetome(est_path_iterlist, ID):
                     for rsn in rsns:
                         pop_rsn_list = []
                         for graph in pop_ref[rsn]:
-                            pop_list.append(np.load(graph))
+                            pop_list.append(load_mat_npy(graph))
                         if len(pop_rsn_list) > 1:
                             if len(list(set([i.shape for i in pop_rsn_list]))) > 1:
                                 raise RuntimeWarning('ERROR: Inconsistent number of vertices in graph population '
@@ -416,7 +413,7 @@ def build_omnetome(est_path_iterlist, ID):
                             pass
                         i = i + 1
                 else:
-                    pop_list.append(np.load(pop_ref))
+                    pop_list.append(load_mat_npy(pop_ref))
             if len(pop_list) > 1:
                 if len(list(set([i.shape for i in pop_list]))) > 1:
                     raise RuntimeWarning('ERROR: Inconsistent number of vertices in graph population that '
@@ -436,7 +433,7 @@ def build_omnetome(est_path_iterlist, ID):
                     for rsn in rsns:
                         pop_rsn_list = []
                         for graph in pop_ref[rsn]:
-                            pop_list.append(np.load(graph))
+                            pop_list.append(load_mat_npy(graph))
                         if len(pop_rsn_list) > 1:
                             if len(list(set([i.shape for i in pop_rsn_list]))) > 1:
                                 raise RuntimeWarning('ERROR: Inconsistent number of vertices in graph population '
@@ -448,7 +445,7 @@ def build_omnetome(est_path_iterlist, ID):
                             pass
                         i = i + 1
                 else:
-                    pop_list.append(np.load(pop_ref))
+                    pop_list.append(load_mat_npy(pop_ref))
             if len(pop_list) > 1:
                 if len(list(set([i.shape for i in pop_list]))) > 1:
                     raise RuntimeWarning('ERROR: Inconsistent number of vertices in graph population that '
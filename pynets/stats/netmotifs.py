@@ -9,12 +9,161 @@ import numpy as np
 import warnings
 import os
 import networkx as nx
-from copy import copy
 from pathlib import Path
 from collections import Counter
 warnings.filterwarnings("ignore")
 
 
+# Motif classes of connected undirected graphs with 3 or 4 nodes, labeled by their sorted degree sequence.
+# Their position in each tuple is the integer motif-class code used by motif_census.
+MOTIF_CLASSES = {3: ('112', '222'),
+                 4: ('1113', '1122', '1223', '2222', '2233', '3333')}
+
+_MOTIF_LOOKUP = {}
+_motif_task = None
+
+
+def _motif_class_lookup(N):
+    '''
+    Lookup table from the edge bit-pattern of an induced N-node subgraph to its motif-class code.
+
+    Bit p of a pattern marks the presence of the edge between the subgraph nodes
+    np.triu_indices(N, 1)[0][p] and np.triu_indices(N, 1)[1][p]. Disconnected patterns are
+    coded -1 (for N <= 4, the degree sequence of every disconnected graph contains a 0 or is
+    all 1s, and so never matches a connected motif class).
+    '''
+    if N not in _MOTIF_LOOKUP:
+        rows, cols = np.triu_indices(N, 1)
+        bits = (np.arange(2 ** len(rows))[:, None] >> np.arange(len(rows))) & 1
+        B = np.zeros((len(bits), N, N), dtype=int)
+        B[:, rows, cols] = bits
+        B[:, cols, rows] = bits
+        codes = {label: code for code, label in enumerate(MOTIF_CLASSES[N])}
+        _MOTIF_LOOKUP[N] = np.array([codes.get(''.join(map(str, d)), -1) for d in np.sort(B.sum(axis=2), axis=1)])
+    return _MOTIF_LOOKUP[N]
+
+
+def _esu_subgraphs(nbrs, v, N):
+    '''
+    Enumerate the node sets of all connected N-node subgraphs whose smallest node is v (ESU).
+
+    Each subgraph is reached exactly once, by only ever extending with nodes larger than v
+    that neighbor the newest node but none of the nodes already in (or adjacent to) the subgraph.
+    '''
+    out = []
+
+    def extend(sub, ext, excl):
+        if len(sub) == N - 1:
+            out.extend(sub + (w,) for w in ext)
+            return
+        ext = list(ext)
+        while ext:
+            w = ext.pop()
+            extend(sub + (w,), ext + [u for u in nbrs[w] if u > v and u not in excl], excl | nbrs[w])
+
+    extend((v,), [u for u in nbrs[v] if u > v], nbrs[v] | {v})
+    return out
+
+
+def _init_motif_worker(W, thresholds, N):
+    global _motif_task
+    from scipy import sparse
+    # Neighbor sets of the densest graph, which contains the graphs of all other thresholds
+    A = sparse.csr_matrix(W > thresholds[0])
+    A.setdiag(False)
+    A.eliminate_zeros()
+    nbrs = [set(A.indices[A.indptr[u]:A.indptr[u + 1]].tolist()) for u in range(A.shape[0])]
+    _motif_task = (W, thresholds, N, nbrs)
+
+
+def _motif_census_roots(roots):
+    '''
+    Motif-class counts at every threshold of the subgraphs rooted at each of roots.
+    '''
+    W, thresholds, N, nbrs = _motif_task
+    rows, cols = np.triu_indices(N, 1)
+    lookup = _motif_class_lookup(N)
+    n_classes = len(MOTIF_CLASSES[N])
+    counts = np.zeros((len(thresholds), n_classes), dtype=np.int64)
+    for v in roots:
+        subs = _esu_subgraphs(nbrs, v, N)
+        if len(subs) == 0:
+            continue
+        subs = np.array(subs)
+        # Edge weights of every induced subgraph, compared against every threshold at once
+        w = W[subs[:, rows], subs[:, cols]]
+        patterns = np.sum((w[:, :, None] > thresholds[None, None, :]) << np.arange(len(rows))[None, :, None], axis=1)
+        codes = lookup[patterns]
+        for t in range(len(thresholds)):
+            counts[t] += np.bincount(codes[:, t][codes[:, t] >= 0], minlength=n_classes)
+    return counts
+
+
+def motif_census(W, N=4, thresholds=None, n_procs=None):
+    '''
+    Census of the connected N-node motifs (i.e. induced subgraphs) of an undirected graph.
+
+    Subgraphs are enumerated once with the ESU algorithm over a sparse adjacency, in parallel
+    over root nodes. Given several absolute thresholds, only the densest graph (W > min(thresholds))
+    is enumerated, since every connected subgraph at a higher threshold is a node set already
+    enumerated there, and each node set is reclassified at every threshold from its edge weights.
+
+    Parameters
+    ----------
+    W : ndarray
+        M x M symmetric connectivity matrix. Self-loops are ignored.
+    N : int
+        Size of motif type. Default is N=4, only 3 or 4 supported.
+    thresholds : array
+        Absolute thresholds, each defining the graph W > thr. Default is None, which counts the
+        motifs of the graph of the nonzero entries of W.
+    n_procs : int
+        Number of processes across which to distribute root nodes. Default is None, which uses
+        all available cores.
+
+    Returns
+    -------
+    counts : ndarray
+        Counts of each class of MOTIF_CLASSES[N], of shape (len(MOTIF_CLASSES[N]),), or
+        (len(thresholds), len(MOTIF_CLASSES[N])) if thresholds were given.
+
+    References
+    ----------
+    .. [1] Wernicke, S. (2006). Efficient Detection of Network Motifs.
+      IEEE/ACM Transactions on Computational Biology and Bioinformatics.
+      https://doi.org/10.1109/TCBB.2006.51
+
+    '''
+    import multiprocessing as mp
+    assert N in [3, 4], "Only motifs of size N=3,4 currently supported"
+
+    W = np.asarray(W, dtype=np.float64)
+    if thresholds is None:
+        counts = motif_census((W != 0).astype(np.float64), N=N, thresholds=[0.0], n_procs=n_procs)
+        return counts[0]
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    order = np.argsort(thresholds, kind='stable')
+
+    if n_procs is None:
+        n_procs = mp.cpu_count()
+    n_procs = max(1, min(int(n_procs), W.shape[0]))
+
+    # Interleaved root chunks, since the number of subgraphs rooted at v decreases with v
+    chunks = [np.arange(W.shape[0])[i::4 * n_procs] for i in range(min(4 * n_procs, W.shape[0]))]
+    initargs = (W, thresholds[order], N)
+    # Daemonic processes (e.g. pool workers) are not allowed to spawn children of their own
+    if n_procs > 1 and not mp.current_process().daemon:
+        with mp.Pool(n_procs, initializer=_init_motif_worker, initargs=initargs) as pool:
+            census = pool.map(_motif_census_roots, chunks)
+    else:
+        _init_motif_worker(*initargs)
+        census = [_motif_census_roots(chunk) for chunk in chunks]
+
+    counts = np.zeros((len(thresholds), len(MOTIF_CLASSES[N])), dtype=np.int64)
+    counts[order] = np.sum(census, axis=0)
+    return counts
+
+
 def countmotifs(A, N=4):
     '''
     Counts number of motifs with size N from A.
@@ -28,8 +177,8 @@ def countmotifs(A, N=4):
 
     Returns
     -------
-    umotifs : int
-        Total count of size N motifs for graph A.
+    umotifs : Counter
+        Count of size N motifs for graph A, keyed by motif class (see MOTIF_CLASSES).
 
     References
     ----------
@@ -37,34 +186,9 @@ def countmotifs(A, N=4):
       PLoS Biology. https://doi.org/10.1371/journal.pbio.0020369
 
     '''
-    import gc
     assert N in [3, 4], "Only motifs of size N=3,4 currently supported"
-    X2 = np.array([[k] for k in range(A.shape[0]-1)])
-    for n in range(N-1):
-        X = copy(X2)
-        X2 = []
-        for vsub in X:
-            # in_matind list of nodes neighboring vsub with a larger index than root v
-            idx=np.where(np.any(A[(vsub[0]+1):, vsub], 1))[0]+vsub[0]+1
-            # Only keep node indices not in vsub
-            idx=idx[[k not in vsub for k in idx]]
-            if len(idx)>0:
-                # If new neighbors found, add all new vsubs to list
-                X2.append([np.append(vsub,ik) for ik in idx])
-        if len(X2)>0:
-            X2 = np.vstack(X2)
-        else:
-            umotifs = 0
-            return umotifs
-
-    X2 = np.sort(X2,1)
-    X2 = X2[np.unique(np.ascontiguousarray(X2).view(np.dtype((np.void,
-                                                              X2.dtype.itemsize * X2.shape[1]))),
-                      return_index=True)[1]]
-    umotifs = Counter([''.join(np.sort(np.sum(A[x, :][:, x],
-                                              1)).astype(int).astype(str)) for x in X2])
-    del X2
-    gc.collect()
+    counts = motif_census(A, N=N, n_procs=1)
+    umotifs = Counter({label: int(count) for label, count in zip(MOTIF_CLASSES[N], counts) if count > 0})
     return umotifs
 
 
@@ -94,16 +218,13 @@ def adaptivethresh(in_mat, thr, mlib, N):
       https://doi.org/10.1063/1.4979282
 
     '''
-    from pynets.stats.netmotifs import countmotifs
-    mf = countmotifs((in_mat > thr).astype(int), N=N)
-    try:
-        mf = np.array([mf[k] for k in mlib])
-    except:
-        mf = np.zeros(len(mlib))
+    from pynets.stats.netmotifs import motif_census
+    census = dict(zip(MOTIF_CLASSES[N], motif_census(in_mat, N=N, thresholds=[thr], n_procs=1)[0]))
+    mf = np.array([census.get(k, 0) for k in mlib])
     return mf
 
 
-def compare_motifs(struct_mat, func_mat, name, namer_dir, bins=20, N=4):
+def compare_motifs(struct_mat, func_mat, name, namer_dir, bins=20, N=4, n_procs=None):
     '''
     Compare motif structure and population across structural and functional
     graphs to achieve a homeostatic absolute threshold of each that optimizes
@@ -111,18 +232,28 @@ def compare_motifs(struct_mat, func_mat, name, namer_dir, bins=20, N=4):
 
     Parameters
     ----------
-    in_mat : ndarray
-        M x M Connectivity matrix
-    thr : float
-        Absolute threshold [0, 1].
-    mlib : list
-        List of motif classes.
+    struct_mat : ndarray
+        M x M structural connectivity matrix.
+    func_mat : ndarray
+        M x M functional connectivity matrix.
+    name : str
+        Intended name of the multiplex objects.
+    namer_dir : str
+        Path to output directory.
+    bins : int
+        Number of absolute thresholds of the functional graph to compare. Default is 20.
+    N : int
+        Size of motif type. Default is N=4, only 3 or 4 supported.
+    n_procs : int
+        Number of processes across which to count motifs. Default is None, which uses
+        all available cores.
 
     Returns
     -------
-    mf : ndarray
-        1D vector listing the total motifs of size N for each
-        class of mlib.
+    mg_dict : dict
+        Filepaths to gpickled MultilayerGraph objects, keyed by the best thresholds.
+    g_dict : dict
+        Tuples of thresholded functional and structural matrices, keyed by the best thresholds.
 
     References
     ----------
@@ -131,13 +262,12 @@ def compare_motifs(struct_mat, func_mat, name, namer_dir, bins=20, N=4):
       https://doi.org/10.1063/1.4979282
 
     '''
-    from pynets.stats.netmotifs import adaptivethresh
+    from pynets.stats.netmotifs import adaptivethresh, motif_census
     from pynets.core.thresholding import threshold_absolute
     from pynets.core.thresholding import standardize
-    from scipy import spatial
-    from nilearn.connectome import sym_matrix_to_vec
     import pandas as pd
-    import gc
+    import hashlib
+    import time
 
     mlib = ['1113', '1122', '1223', '2222', '2233', '3333']
 
@@ -161,122 +291,91 @@ def compare_motifs(struct_mat, func_mat, name, namer_dir, bins=20, N=4):
 
     # Count motifs
     print("%s%s%s%s" % ('Mining ', N, '-node motifs: ', mlib))
-    motif_dict = {}
-    motif_dict['struct'] = {}
-    motif_dict['func'] = {}
-
-    mat_dict = {}
-    mat_dict['struct'] = sym_matrix_to_vec(struct_mat, discard_diagonal=True)
-    mat_dict['funcs'] = {}
-    for thr_func in threshes_func:
-        # Count
-        at_func = adaptivethresh(func_mat, float(thr_func), mlib, N)
-        motif_dict['struct']["%s%s" % ('thr-', np.round(thr_func, 4))] = at_struct
-        motif_dict['func']["%s%s" % ('thr-', np.round(thr_func, 4))] = at_func
-        mat_dict['funcs']["%s%s" % ('thr-', np.round(thr_func, 4))] = sym_matrix_to_vec(threshold_absolute(func_mat,
-                                                                                                           thr_func),
-                                                                                        discard_diagonal=True)
-
+    start_time = time.time()
+    # Count, enumerating the subgraphs of the densest functional graph once for all thresholds
+    census_func = motif_census(func_mat, N=N, thresholds=threshes_func, n_procs=n_procs)
+    census_func = census_func[:, [MOTIF_CLASSES[N].index(k) for k in mlib]]
+    for thr_func, at_func in zip(threshes_func, census_func):
         print("%s%s%s%s%s" % ('Layer 2 (functional) with absolute threshold of: ',
                               np.round(thr_func, 2), ' yields ',
                               np.sum(at_func), ' total motifs'))
-        gc.collect()
-
-    df = pd.DataFrame(motif_dict)
 
-    for idx in range(len(df)):
-        df.set_value(df.index[idx], 'motif_dist', spatial.distance.cosine(df['struct'][idx], df['func'][idx]))
+    # Motif and graph distances of every threshold, computed at once
+    triu = np.triu_indices(dims_struct, 1)
+    [graph_dist_cosine, graph_dist_correlation] = _threshold_distances(struct_mat[triu], func_mat[triu],
+                                                                       threshes_func)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        motif_dist = 1 - (census_func @ at_struct) / (np.linalg.norm(census_func, axis=1) *
+                                                      np.linalg.norm(at_struct))
+    motif_dist = np.clip(motif_dist, 0, 2)
+
+    at_struct = np.broadcast_to(at_struct, census_func.shape)
+    columns = {'motif_dist': motif_dist, 'graph_dist_cosine': graph_dist_cosine,
+               'graph_dist_correlation': graph_dist_correlation}
+    columns.update({f"struct_func_{k}": np.abs(at_struct[:, j] - census_func[:, j]) for j, k in enumerate(mlib)})
+    columns.update({f"{layer}_{k}": counts[:, j] for j, k in enumerate(mlib)
+                    for layer, counts in (('struct', at_struct), ('func', census_func))})
+    df = pd.DataFrame(columns, index=[f"thr-{np.round(thr_func, 4)}" for thr_func in threshes_func])
 
     df = df[pd.notnull(df['motif_dist'])]
-
-    for idx in range(len(df)):
-        df.set_value(df.index[idx], 'graph_dist_cosine',
-                     spatial.distance.cosine(mat_dict['struct'].reshape(-1, 1),
-                                             mat_dict['funcs'][df.index[idx]].reshape(-1, 1)))
-        df.set_value(df.index[idx], 'graph_dist_correlation',
-                     spatial.distance.correlation(mat_dict['struct'].reshape(-1, 1),
-                                                  mat_dict['funcs'][df.index[idx]].reshape(-1, 1)))
-
-    df['struct_func_3333'] = np.zeros(len(df))
-    df['struct_func_2233'] = np.zeros(len(df))
-    df['struct_func_2222'] = np.zeros(len(df))
-    df['struct_func_1223'] = np.zeros(len(df))
-    df['struct_func_1122'] = np.zeros(len(df))
-    df['struct_func_1113'] = np.zeros(len(df))
-    df['struct_3333'] = np.zeros(len(df))
-    df['func_3333'] = np.zeros(len(df))
-    df['struct_2233'] = np.zeros(len(df))
-    df['func_2233'] = np.zeros(len(df))
-    df['struct_2222'] = np.zeros(len(df))
-    df['func_2222'] = np.zeros(len(df))
-    df['struct_1223'] = np.zeros(len(df))
-    df['func_1223'] = np.zeros(len(df))
-    df['struct_1122'] = np.zeros(len(df))
-    df['func_1122'] = np.zeros(len(df))
-    df['struct_1113'] = np.zeros(len(df))
-    df['func_1113'] = np.zeros(len(df))
-
-    for idx in range(len(df)):
-        df.set_value(df.index[idx], 'struct_3333', df['struct'][idx][-1])
-        df.set_value(df.index[idx], 'func_3333', df['func'][idx][-1])
-
-        df.set_value(df.index[idx], 'struct_2233', df['struct'][idx][-2])
-        df.set_value(df.index[idx], 'func_2233', df['func'][idx][-2])
-
-        df.set_value(df.index[idx], 'struct_2222', df['struct'][idx][-3])
-        df.set_value(df.index[idx], 'func_2222', df['func'][idx][-3])
-
-        df.set_value(df.index[idx], 'struct_1223', df['struct'][idx][-4])
-        df.set_value(df.index[idx], 'func_1223', df['func'][idx][-4])
-
-        df.set_value(df.index[idx], 'struct_1122', df['struct'][idx][-5])
-        df.set_value(df.index[idx], 'func_1122', df['func'][idx][-5])
-
-        df.set_value(df.index[idx], 'struct_1113', df['struct'][idx][-6])
-        df.set_value(df.index[idx], 'func_1113', df['func'][idx][-6])
-
-    df['struct_func_3333'] = np.abs(df['struct_3333'] - df['func_3333'])
-    df['struct_func_2233'] = np.abs(df['struct_2233'] - df['func_2233'])
-    df['struct_func_2222'] = np.abs(df['struct_2222'] - df['func_2222'])
-    df['struct_func_1223'] = np.abs(df['struct_1223'] - df['func_1223'])
-    df['struct_func_1122'] = np.abs(df['struct_1122'] - df['func_1122'])
-    df['struct_func_1113'] = np.abs(df['struct_1113'] - df['func_1113'])
-
-    df = df.drop(columns=['struct', 'func'])
-
     df = df.loc[~(df == 0).all(axis=1)]
 
-    df = df.sort_values(by=['motif_dist', 'graph_dist_cosine', 'graph_dist_correlation', 'struct_func_3333',
-                            'struct_func_2233', 'struct_func_2222',
-                            'struct_func_1223', 'struct_func_1122', 'struct_func_1113', 'struct_3333', 'func_3333',
-                            'struct_2233', 'func_2233', 'struct_2222', 'func_2222', 'struct_1223', 'func_1223',
-                            'struct_1122', 'func_1122', 'struct_1113', 'func_1113'],
-                        ascending=[True, True, False, False, False, False, False, False, False, False, False, False,
-                                   False, False, False, False, False, False, False, False, False])
+    sort_by = ['motif_dist', 'graph_dist_cosine', 'graph_dist_correlation'] + \
+              [f"struct_func_{k}" for k in mlib[::-1]] + \
+              [f"{layer}_{k}" for k in mlib[::-1] for layer in ('struct', 'func')]
+    df = df.sort_values(by=sort_by, ascending=[True, True] + [False] * (len(sort_by) - 2))
 
     # Take the top 25th percentile
     df = df.head(int(0.25*len(df)))
-    best_threshes = []
-    best_mats = []
-    best_multigraphs = []
+    print("%s%s%s%s%s" % ('Compared ', len(threshes_func), ' thresholds in ',
+                          np.round(time.time() - start_time, 1), 's'))
+
+    # Thresholds yielding identical thresholded matrices share a single multigraph
+    mg_dict = {}
+    g_dict = {}
+    built = {}
     for key in list(df.index):
-        func_mat_tmp = func_mat.copy()
-        struct_mat_tmp = struct_mat.copy()
-        struct_thr = float(key.split('-')[-1])
         func_thr = float(key.split('-')[-1])
-        best_threshes.append(str(func_thr))
-
-        func_mat_tmp[func_mat_tmp < func_thr] = 0
-        struct_mat_tmp[struct_mat_tmp < struct_thr] = 0
-        best_mats.append((func_mat_tmp, struct_mat_tmp))
+        struct_thr = func_thr
+        mats = (threshold_absolute(func_mat, func_thr), threshold_absolute(struct_mat, struct_thr))
+        mats_hash = hashlib.sha1(mats[0].tobytes() + mats[1].tobytes()).hexdigest()
+        if mats_hash not in built:
+            built[mats_hash] = build_mx_multigraph(mats[0], mats[1], f"{name}_{key}", namer_dir)
+        mg_dict[str(func_thr)] = built[mats_hash]
+        g_dict[str(func_thr)] = mats
+    print("%s%s%s%s%s" % ('Built ', len(built), ' multigraph(s) for ', len(mg_dict), ' selected thresholds'))
 
-        mG = build_mx_multigraph(func_mat, struct_mat, f"{name}_{key}", namer_dir)
-        best_multigraphs.append(mG)
+    return mg_dict, g_dict
 
-    mg_dict = dict(zip(best_threshes, best_multigraphs))
-    g_dict = dict(zip(best_threshes, best_mats))
 
-    return mg_dict, g_dict
+def _threshold_distances(struct_vec, func_vec, thresholds):
+    '''
+    Cosine and correlation distances between struct_vec and func_vec absolutely thresholded at each
+    of thresholds (as with threshold_absolute), from suffix sums over the sorted entries of func_vec
+    rather than one thresholded copy of func_vec per threshold.
+    '''
+    order = np.argsort(func_vec, kind='stable')
+    f = func_vec[order]
+    s = struct_vec[order]
+    E = len(f)
+
+    def suffix_sums(x):
+        return np.append(np.cumsum(x[::-1])[::-1], 0)
+
+    # Entries at or above each threshold are those from its insertion point onward
+    start = np.searchsorted(f, thresholds, side='left')
+    sf = suffix_sums(s * f)[start]
+    ff = suffix_sums(f * f)[start]
+    f1 = suffix_sums(f)[start]
+    ss = np.sum(s * s)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine = 1 - sf / np.sqrt(ss * ff)
+        s_mean = np.mean(s)
+        f_mean = f1 / E
+        correlation = 1 - (sf - E * s_mean * f_mean) / np.sqrt((ss - E * s_mean ** 2) * (ff - E * f_mean ** 2))
+
+    return np.clip(cosine, 0, 2), np.clip(correlation, 0, 2)
 
 
 def build_mx_multigraph(func_mat, struct_mat, name, namer_dir):
@@ -14,17 +14,53 @@ from pynets.core.utils import timeout
 warnings.filterwarnings("ignore")
 
 
+def connected_component_indices(G, min_size=2):
+    """
+    Decompose a graph into its connected components in a single pass over its sparse adjacency.
+
+    Parameters
+    ----------
+    G : Obj
+        NetworkX graph, or NxN np.ndarray/scipy.sparse connectivity matrix.
+    min_size : int
+        Components with fewer nodes (e.g. isolates, by default) are omitted. Default is 2.
+
+    Returns
+    -------
+    components : list
+        Arrays of node indices (positions in the node order of G) of each component, largest first.
+
+    """
+    from scipy.sparse import csgraph, csr_matrix
+
+    if isinstance(G, nx.Graph):
+        A = nx.to_scipy_sparse_array(G, weight=None, format='csr')
+    else:
+        A = csr_matrix(G)
+    _, labels = csgraph.connected_components(A, directed=False)
+    order = np.argsort(labels, kind='stable')
+    sizes = np.bincount(labels)
+    components = np.split(order, np.cumsum(sizes)[:-1])
+
+    return sorted([c for c in components if len(c) >= min_size], key=len, reverse=True)
+
+
 @timeout(720)
-def average_shortest_path_length_for_all(G):
+def average_shortest_path_length_for_all(G, weight='weight', components=None):
     """
     Helper function, in the case of graph disconnectedness,
     that returns the average shortest path length, calculated
-    iteratively for each distinct subgraph of the G.
+    for each distinct connected component of the G and weighted
+    by its number of node pairs.
 
     Parameters
     ----------
     G : Obj
         NetworkX graph.
+    weight : str
+        Edge attribute used as path length. If None, path lengths are hop counts. Default is 'weight'.
+    components : list
+        Optional precomputed output of connected_component_indices for G.
 
     Returns
     -------
@@ -32,24 +68,35 @@ def average_shortest_path_length_for_all(G):
         The length of the average shortest path for G.
 
     """
-    import math
-    connected_component_subgraphs = [G.subgraph(c) for c in nx.connected_components(G)]
-    subgraphs = [sbg for sbg in connected_component_subgraphs if len(sbg) > 1]
+    if components is None:
+        components = connected_component_indices(G)
+    if len(components) == 0:
+        raise nx.NetworkXPointlessConcept('Path length is undefined for fewer than two connected nodes.')
+    W = nx.to_numpy_array(G, weight=weight)
+
+    total = 0
+    pairs = 0
+    for c in components:
+        total += np.sum(shortest_path_lengths(W[np.ix_(c, c)], weighted=weight is not None))
+        pairs += len(c) * (len(c) - 1)
 
-    return math.fsum(nx.average_shortest_path_length(sg, weight='weight') for sg in subgraphs) / len(subgraphs)
+    return total / pairs
 
 
 @timeout(720)
-def subgraph_number_of_cliques_for_all(G):
+def subgraph_number_of_cliques_for_all(G, components=None):
     """
     Helper function, in the case of graph disconnectedness,
-    that returns the number of cliques, calculated
-    iteratively for each distinct subgraph of the G.
+    that returns the number of maximal cliques, calculated
+    for each distinct connected component of the G and weighted
+    by its number of nodes.
 
     Parameters
     ----------
     G : Obj
         NetworkX graph.
+    components : list
+        Optional precomputed output of connected_component_indices for G.
 
     Returns
     -------
@@ -77,11 +124,127 @@ def subgraph_number_of_cliques_for_all(G):
       <https://doi.org/10.1016/j.tcs.2008.05.010>
 
     """
-    import math
-    connected_component_subgraphs = [G.subgraph(c) for c in nx.connected_components(G)]
-    subgraphs = [sbg for sbg in connected_component_subgraphs if len(sbg) > 1]
+    if components is None:
+        components = connected_component_indices(G)
+    A = nx.to_numpy_array(G, weight=None)
+    cliques = [sum(1 for _ in nx.find_cliques(nx.from_numpy_array(A[np.ix_(c, c)]))) for c in components]
+
+    return np.rint(np.average(cliques, weights=[len(c) for c in components]))
+
+
+def shortest_path_lengths(L, weighted=True, directed=False, indices=None):
+    """
+    Batched shortest path lengths computed directly from a connection-length matrix.
+
+    Parameters
+    ----------
+    L : NxN np.ndarray
+        Connection-length matrix. Zero entries are treated as absent edges.
+    weighted : bool
+        If False, every edge is assigned unit length. Default is True.
+    directed : bool
+        If True, L[i, j] is treated as the length of the edge i -> j. Default is False.
+    indices : array
+        Optional subset of source nodes. Default is all nodes.
+
+    Returns
+    -------
+    D : np.ndarray
+        Matrix of shortest path lengths, with np.inf for unreachable node pairs.
+
+    Raises
+    ------
+    ValueError
+        If weighted and L contains negative lengths, for which Dijkstra's algorithm is undefined.
+
+    """
+    from scipy.sparse import csgraph, csr_matrix
+
+    L = csr_matrix(L)
+    if weighted is True and L.nnz > 0 and np.min(L.data) < 0:
+        raise ValueError('Contradictory paths found: negative weights?')
+
+    return csgraph.shortest_path(L, method='D', directed=directed, unweighted=not weighted, indices=indices)
+
+
+def global_efficiency_mat(L, weighted=True, directed=False):
+    """
+    Return the global efficiency of a connection-length matrix.
+
+    Parameters
+    ----------
+    L : NxN np.ndarray or scipy.sparse matrix
+        Connection-length matrix (e.g. the output of CleanGraphs.create_length_matrix), in which explicitly
+        stored zeros of sparse input are zero-length edges.
+    weighted : bool
+        If False, path lengths are hop counts. Default is True.
+    directed : bool
+        Indicates whether L should be treated as directed. Default is False.
+
+    Returns
+    -------
+    global_efficiency : float
+
+    References
+    ----------
+    .. [1] Latora, V., and Marchiori, M. (2001). Efficient behavior of
+       small-world networks. Physical Review Letters 87.
+
+    """
+    N = L.shape[0]
+    if N < 2:
+        return 0
+
+    D = shortest_path_lengths(L, weighted=weighted, directed=directed)
+    with np.errstate(divide='ignore'):
+        inv = 1 / D
+    # Self-distances (1/0) and unreachable pairs (1/inf) do not contribute
+    inv[~np.isfinite(inv)] = 0
+    np.fill_diagonal(inv, 0)
+
+    return np.sum(inv) / (N * (N - 1))
+
+
+def local_efficiency_mat(L, weighted=True, directed=False):
+    """
+    Return the local efficiency of each node of a connection-length matrix.
+
+    The efficiency of each node's neighbourhood is computed on the submatrix
+    of L that is masked to that neighbourhood, so that no intermediate graph
+    objects are constructed.
+
+    Parameters
+    ----------
+    L : NxN np.ndarray
+        Connection-length matrix.
+    weighted : bool
+        If False, path lengths are hop counts. Default is True.
+    directed : bool
+        Indicates whether L should be treated as directed, in which case the
+        neighbourhood of a node consists of its successors. Default is False.
+
+    Returns
+    -------
+    local_efficiency : Nx1 np.ndarray
+        Local efficiency of each node.
+
+    References
+    ----------
+    .. [1] Latora, V., and Marchiori, M. (2001). Efficient behavior of
+      small-world networks. Physical Review Letters 87.
+
+    """
+    L = np.asarray(L)
+    N = L.shape[0]
+    A = L != 0
+    np.fill_diagonal(A, False)
+
+    efficiencies = np.zeros(N)
+    for node in np.flatnonzero(A.sum(axis=1) > 1):
+        nbrs = np.flatnonzero(A[node])
+        efficiencies[node] = global_efficiency_mat(L[np.ix_(nbrs, nbrs)], weighted=weighted, directed=directed)
 
-    return np.rint(math.fsum(nx.graph_number_of_cliques(sg) for sg in subgraphs) / len(subgraphs))
+    return efficiencies
 
 
 @timeout(720)
@@ -125,17 +288,9 @@ def global_efficiency(G, weight='weight'):
     if N < 2:
         return 0
 
-    inv_lengths = []
-    for node in G:
-        if weight is None:
-            lengths = nx.single_source_shortest_path_length(G, node)
-        else:
-            lengths = nx.single_source_dijkstra_path_length(G, node, weight=weight)
-
-        inv = [1 / x for x in lengths.values() if x is not 0]
-        inv_lengths.extend(inv)
+    L = nx.to_numpy_array(G, weight=weight)
 
-    return sum(inv_lengths) / (N * (N - 1))
+    return global_efficiency_mat(L, weighted=weight is not None, directed=G.is_directed())
 
 
 @timeout(720)
@@ -174,27 +329,10 @@ def local_efficiency(G, weight='weight'):
       in weighted networks. Eur Phys J B 32, 249-263.
 
     """
-    if G.is_directed():
-        new_graph = nx.DiGraph
-    else:
-        new_graph = nx.Graph
-
-    efficiencies = dict()
-    for node in G:
-        temp_G = new_graph()
-        temp_G.add_nodes_from(G.neighbors(node))
-        for neighbor in G.neighbors(node):
-            for (n1, n2) in G.edges(neighbor):
-                if (n1 in temp_G) and (n2 in temp_G):
-                    temp_G.add_edge(n1, n2)
-
-        if weight is not None:
-            for (n1, n2) in temp_G.edges():
-                temp_G[n1][n2][weight] = G[n1][n2][weight]
+    L = nx.to_numpy_array(G, weight=weight)
+    le_vector = local_efficiency_mat(L, weighted=weight is not None, directed=G.is_directed())
 
-        efficiencies[node] = global_efficiency(temp_G, weight)
-
-    return efficiencies
+    return dict(zip(list(G), le_vector))
 
 
 @timeout(720)
@@ -230,8 +368,297 @@ def average_local_efficiency(G, weight='weight'):
     return total / N
 
 
+def average_clustering_mat(W):
+    """
+    Return the average (geometric mean) weighted clustering coefficient of a matrix.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray
+        Undirected weighted connectivity matrix.
+
+    Returns
+    -------
+    average_clustering : float
+        Mean of the nodal clustering coefficients, equivalent to
+        nx.average_clustering(G, weight='weight').
+
+    References
+    ----------
+    .. [1] Onnela, J.-P., Saramaki, J., Kertesz, J., & Kaski, K. (2005).
+      Intensity and coherence of motifs in weighted complex networks.
+      Physical Review E, 71(6), 065103.
+
+    """
+    W = np.abs(np.asarray(W, dtype=np.float64))
+    if W.shape[0] == 0:
+        return 0
+    max_w = np.max(W)
+    Wc = np.cbrt(W / max_w) if max_w > 0 else W
+    tri = np.einsum('ij,jk,ki->i', Wc, Wc, Wc)
+    deg = np.sum(W != 0, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cc = np.where(deg > 1, tri / (deg * (deg - 1)), 0)
+    return np.mean(cc)
+
+
+def weighted_transitivity_mat(W):
+    """
+    Return the weighted transitivity of a matrix, equivalent to weighted_transitivity(G).
+
+    Parameters
+    ----------
+    W : NxN np.ndarray
+        Undirected weighted connectivity matrix.
+
+    Returns
+    -------
+    out : float
+       Transitivity
+
+    """
+    W = np.abs(np.asarray(W, dtype=np.float64))
+    max_w = np.max(W) if W.size > 0 else 0
+    if max_w == 0:
+        return 0
+    Wc = np.cbrt(W / max_w)
+    triangles = np.einsum('ij,jk,ki->', Wc, Wc, Wc)
+    deg = np.sum(W != 0, axis=1)
+    contri = np.sum(deg * (deg - 1))
+
+    return 0 if triangles == 0 else triangles / contri
+
+
+def average_shortest_path_length_mat(L, weighted=True):
+    """
+    Return the average shortest path length of a connection-length matrix.
+
+    Parameters
+    ----------
+    L : NxN np.ndarray
+        Undirected connection-length matrix.
+    weighted : bool
+        If False, path lengths are hop counts. Default is True.
+
+    Returns
+    -------
+    average_shortest_path_length : float
+
+    """
+    N = L.shape[0]
+    if N < 2:
+        return 0
+    D = shortest_path_lengths(L, weighted=weighted)
+    if not np.all(np.isfinite(D)):
+        raise nx.NetworkXError('Graph is not connected.')
+    return np.sum(D) / (N * (N - 1))
+
+
+def _ring_distances(n):
+    """
+    Distance of each matrix entry from the main diagonal of a ring lattice.
+    """
+    idx = np.arange(n)
+    D = np.abs(idx[:, None] - idx[None, :])
+    return np.minimum(D, n - D)
+
+
+def rewire_degree_preserving(W, niter=10, seed=None, reference='random', connected=True):
+    """
+    Degree-preserving randomization (or latticization) of an undirected matrix.
+
+    Double-edge swaps are proposed in vectorized batches over the edge array.
+    Each batch pairs every edge with another edge at most once, so that all
+    accepted swaps in a batch can be applied simultaneously. Edge weights move
+    with their edges, such that the weight distribution is also preserved.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray
+        Undirected weighted/binary connectivity matrix.
+    niter : int
+        Approximate number of rewirings per edge. Default is 10.
+    seed : int
+        Seed of the random number generator. Default is None.
+    reference : str
+        Either `random` for a random reference, or `lattice` for a ring-lattice
+        reference in which swaps are only accepted if they move edges closer to
+        the main diagonal. Default is `random`.
+    connected : bool
+        If True and W is connected, batches that would disconnect the graph are
+        rolled back. Default is True.
+
+    Returns
+    -------
+    W_rewired : NxN np.ndarray
+        Rewired connectivity matrix.
+
+    References
+    ----------
+    .. [1] Maslov, S., & Sneppen, K. (2002). Specificity and stability in
+      topology of protein networks. Science, 296(5569), 910-913.
+    .. [2] Sporns, O., & Zwi, J. D. (2004). The small world of the cerebral
+      cortex. Neuroinformatics, 2(2), 145-162.
+
+    """
+    from scipy.sparse import csgraph, csr_matrix
+
+    if reference not in ('random', 'lattice'):
+        raise ValueError(f"{reference}' graph type not recognized!")
+
+    rng = np.random.RandomState(seed)
+    W = np.asarray(W, dtype=np.float64)
+    n = W.shape[0]
+    rows, cols = np.nonzero(np.triu(W, 1))
+    weights = W[rows, cols]
+    n_edges = len(rows)
+    if n_edges < 2 or n < 4:
+        return W.copy()
+
+    A = W != 0
+    np.fill_diagonal(A, False)
+    D = _ring_distances(n) if reference == 'lattice' else None
+    if connected is True:
+        connected = csgraph.connected_components(csr_matrix(A), directed=False)[0] == 1
+
+    target = niter * n_edges
+    max_rounds = 100 * niter
+    window = n_edges // 2
+    swaps = 0
+    rounds = 0
+    while swaps < target and rounds < max_rounds:
+        rounds += 1
+        perm = rng.permutation(n_edges)[:2 * window].reshape(-1, 2)
+        e1, e2 = perm[:, 0], perm[:, 1]
+        a, b = rows[e1], cols[e1]
+        # Flip the orientation of the second edge at random to allow both possible swaps
+        flip = rng.rand(len(e2)) < 0.5
+        c = np.where(flip, cols[e2], rows[e2])
+        d = np.where(flip, rows[e2], cols[e2])
+
+        # Swap (a, b), (c, d) -> (a, d), (c, b) without creating loops or parallel edges
+        valid = (a != c) & (a != d) & (b != c) & (b != d) & ~A[a, d] & ~A[c, b]
+        if D is not None:
+            valid &= D[a, b] + D[c, d] >= D[a, d] + D[c, b]
+
+        # New edges proposed by more than one swap in the same batch are rejected
+        key_ad = np.minimum(a, d) * n + np.maximum(a, d)
+        key_cb = np.minimum(c, b) * n + np.maximum(c, b)
+        keys = np.concatenate([key_ad[valid], key_cb[valid]])
+        uniq, counts = np.unique(keys, return_counts=True)
+        dup = uniq[counts > 1]
+        valid[valid] = ~(np.isin(key_ad[valid], dup) | np.isin(key_cb[valid], dup))
+        if not np.any(valid):
+            continue
+
+        e1, e2, a, b, c, d = e1[valid], e2[valid], a[valid], b[valid], c[valid], d[valid]
+        A[a, b] = A[b, a] = A[c, d] = A[d, c] = False
+        A[a, d] = A[d, a] = A[c, b] = A[b, c] = True
+
+        if connected and csgraph.connected_components(csr_matrix(A), directed=False)[0] > 1:
+            # Roll back the batch and retry with a smaller window
+            A[a, d] = A[d, a] = A[c, b] = A[b, c] = False
+            A[a, b] = A[b, a] = A[c, d] = A[d, c] = True
+            window = max(1, window // 2)
+            continue
+
+        rows[e1], cols[e1] = np.minimum(a, d), np.maximum(a, d)
+        rows[e2], cols[e2] = np.minimum(c, b), np.maximum(c, b)
+        swaps += len(e1)
+        window = min(n_edges // 2, window * 2)
+
+    W_rewired = np.zeros_like(W)
+    W_rewired[rows, cols] = weights
+    W_rewired[cols, rows] = weights
+    return W_rewired
+
+
+_NULL_MODEL_CACHE = {}
+_null_model_W = None
+
+
+def _init_null_model_worker(W):
+    global _null_model_W
+    _null_model_W = W
+
+
+def _null_model_stats(args):
+    """
+    Generate a single seeded reference graph and return its clustering, transitivity, and path length.
+    """
+    niter, reference, seed = args
+    Gr = rewire_degree_preserving(_null_model_W, niter=niter, seed=seed, reference='random')
+    if reference == 'random':
+        Gl = Gr
+    else:
+        Gl = rewire_degree_preserving(_null_model_W, niter=niter, seed=seed, reference='lattice')
+
+    return average_clustering_mat(Gl), weighted_transitivity_mat(Gl), average_shortest_path_length_mat(Gr)
+
+
+def null_model_distribution(W, niter=10, nrand=100, reference='random', seed=0, n_procs=None):
+    """
+    Clustering, transitivity, and path length distributions across degree-preserving null models of W.
+
+    Reference graphs are generated with deterministic per-graph seeds (seed, seed + 1, ...)
+    across a process pool, so that results are identical regardless of n_procs. The resulting
+    distributions are cached by degree sequence (and edge weights), so that repeated evaluations
+    of the same graph reuse them.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray
+        Undirected weighted connectivity matrix.
+    niter : int
+        Approximate number of rewirings per edge. Default is 10.
+    nrand : int
+        Number of reference graphs. Default is 100.
+    reference : str
+        Either `random` or `lattice`, the reference used for clustering/transitivity.
+        Path lengths are always derived from random references. Default is `random`.
+    seed : int
+        Seed of the first reference graph. Default is 0.
+    n_procs : int
+        Number of processes to use. Default is None, which uses all available cores.
+
+    Returns
+    -------
+    null_dist : dict
+        Arrays of length nrand keyed by `clustering`, `transitivity`, and `path_length`.
+
+    """
+    import hashlib
+    import multiprocessing as mp
+
+    W = np.abs(np.asarray(W, dtype=np.float64))
+    np.fill_diagonal(W, 0)
+    degrees = np.sum(W != 0, axis=1)
+    key = (hashlib.sha1(degrees.tobytes() + np.sort(W[np.triu_indices_from(W, 1)]).tobytes()).hexdigest(),
+           niter, nrand, reference, seed)
+    if key in _NULL_MODEL_CACHE:
+        return _NULL_MODEL_CACHE[key]
+
+    if n_procs is None:
+        n_procs = mp.cpu_count()
+    n_procs = max(1, min(int(n_procs), nrand))
+
+    tasks = [(niter, reference, seed + i) for i in range(nrand)]
+    # Daemonic processes (e.g. pool workers) are not allowed to spawn children of their own
+    if n_procs > 1 and not mp.current_process().daemon:
+        with mp.Pool(n_procs, initializer=_init_null_model_worker, initargs=(W,)) as pool:
+            stats = pool.map(_null_model_stats, tasks)
+    else:
+        _init_null_model_worker(W)
+        stats = [_null_model_stats(task) for task in tasks]
+
+    stats = np.array(stats, dtype=np.float64).reshape(-1, 3)
+    null_dist = {'clustering': stats[:, 0], 'transitivity': stats[:, 1], 'path_length': stats[:, 2]}
+    _NULL_MODEL_CACHE[key] = null_dist
+    return null_dist
+
+
 @timeout(720)
-def smallworldness(G, niter=10, nrand=100, approach='clustering', reference='random'):
+def smallworldness(G, niter=10, nrand=100, approach='clustering', reference='random', n_procs=None):
     """
     Returns the small-world coefficient of a graph
 
@@ -262,6 +689,9 @@ def smallworldness(G, niter=10, nrand=100, approach='clustering', reference='ran
     reference : str
         Specifies whether to use a random `random` or lattice
         `lattice` reference for clustering/transitivity. Default is `random`.
+    n_procs : int
+        Number of processes across which to generate reference graphs.
+        Default is None, which uses all available cores.
 
     Returns
     -------
@@ -276,194 +706,520 @@ def smallworldness(G, niter=10, nrand=100, approach='clustering', reference='ran
       doi:10.1089/brain.2011.0038.
 
     """
+    if reference not in ('random', 'lattice'):
+        raise ValueError(f"{reference}' graph type not recognized!")
 
-    from networkx.algorithms.smallworld import random_reference, lattice_reference
-
-    # Compute the mean clustering coefficient and average shortest path length
-    # for an equivalent random graph
-    randMetrics = {"C": [], "L": []}
-    for i in range(nrand):
-        Gr = random_reference(G, niter=niter, seed=i)
-        if reference == 'random':
-            Gl = random_reference(G, niter=niter, seed=i)
-        elif reference == 'lattice':
-            Gl = lattice_reference(G, niter=niter, seed=i)
-        else:
-            raise ValueError(f"{reference}' graph type not recognized!")
-
-        if approach == 'clustering':
-            randMetrics["C"].append(nx.average_clustering(Gl, weight='weight'))
-        elif approach == 'transitivity':
-            randMetrics["C"].append(weighted_transitivity(Gl))
-        else:
-            raise ValueError(f"{approach}' approach not recognized!")
-
-        randMetrics["L"].append(nx.average_shortest_path_length(Gr, weight='weight'))
-        del Gr, Gl
+    W = nx.to_numpy_array(G, weight='weight')
 
     if approach == 'clustering':
-        C = weighted_transitivity(G)
+        C = average_clustering_mat(W)
     elif approach == 'transitivity':
-        C = nx.average_clustering(G, weight='weight')
+        C = weighted_transitivity_mat(W)
     else:
         raise ValueError(f"{approach}' approach not recognized!")
 
-    L = nx.average_shortest_path_length(G)
-    Cl = np.mean(randMetrics["C"])
-    Lr = np.mean(randMetrics["L"])
+    L = average_shortest_path_length_mat(W)
+
+    # Compute the mean clustering coefficient and average shortest path length
+    # for equivalent degree-preserving reference graphs
+    null_dist = null_model_distribution(W, niter=niter, nrand=nrand, reference=reference, n_procs=n_procs)
+    Cl = np.mean(null_dist[approach])
+    Lr = np.mean(null_dist['path_length'])
 
     return (Lr / L) - (C / Cl)
 
 
-def create_communities(node_comm_aff_mat, node_num):
+_RICH_CLUB_CACHE = {}
+
+
+def rich_club_coefficient_mat(W):
     """
-    Create a 1D vector of community assignments from a community affiliation matrix.
+    Rich-club coefficient of an undirected graph for every degree, equivalent to
+    nx.rich_club_coefficient(G, normalized=False).
+
+    Counts of the nodes with degree greater than k, and of the edges whose endpoints both have degree
+    greater than k, are read off for all k at once from cumulative histograms of node degrees and of
+    the lower degree of each edge's endpoints.
 
     Parameters
     ----------
-    node_comm_aff_mat : array
-        Community affiliation matrix produced from modularity estimation (e.g. Louvain).
-    node_num : int
-        Number of total connected nodes in the graph used to estimate node_comm_aff_mat.
+    W : NxN np.ndarray or scipy.sparse matrix
+        Undirected connectivity matrix (edge weights are ignored).
 
     Returns
     -------
-    com_assign : array
-        1D numpy vector of community assignments.
+    rc : np.ndarray
+        Rich-club coefficient of each degree k, from 0 up to the last degree for which more than
+        one node has a greater degree.
 
     References
     ----------
-    .. [1] Newman, M.E.J. & Girvan, M. Finding and evaluating community
-      structure in networks. Physical Review E 69, 26113(2004).
-    .. [2] Blondel, V.D. et al. Fast unfolding of communities in large
-      networks. J. Stat. Mech 10008, 1-12(2008).
+    .. [1] Colizza, V., Flammini, A., Serrano, M. A., & Vespignani, A. (2006).
+      Detecting rich-club ordering in complex networks. Nature Physics, 2(2), 110-115.
 
     """
-    com_assign = np.zeros((node_num, 1))
-    for i in range(len(node_comm_aff_mat)):
-        community = node_comm_aff_mat[i, :]
-        for j in range(len(community)):
-            if community[j] == 1:
-                com_assign[j, 0] = i
-    return com_assign
+    from scipy import sparse
 
+    A = sparse.csr_matrix(W, dtype=np.float64)
+    A.setdiag(0)
+    A.eliminate_zeros()
+    degrees = np.diff(A.indptr)
+    rows, cols = sparse.triu(A, 1).nonzero()
+    n_bins = np.max(degrees, initial=0) + 1
+    nk = len(degrees) - np.cumsum(np.bincount(degrees, minlength=n_bins))
+    ek = len(rows) - np.cumsum(np.bincount(np.minimum(degrees[rows], degrees[cols]), minlength=n_bins))
+    nk, ek = nk[nk > 1], ek[nk > 1]
+    return 2 * ek / (nk * (nk - 1))
 
-@timeout(720)
-def participation_coef(W, ci, degree='undirected'):
+
+def _rich_club_null(args):
     """
-    Participation coefficient is a measure of diversity of intermodular
-    connections of individual nodes.
+    Generate a single seeded random reference graph and return its rich-club coefficients.
+    """
+    Q, seed = args
+    return rich_club_coefficient_mat(rewire_degree_preserving(_null_model_W, niter=Q, seed=seed, connected=False))
+
+
+def rich_club_null_distribution(W, Q=100, nrand=10, seed=42, n_procs=None):
+    """
+    Rich-club coefficients of degree-preserving random reference graphs of W.
+
+    Reference graphs are generated with deterministic per-graph seeds (seed, seed + 1, ...)
+    across a process pool, and the resulting coefficients are cached by degree sequence, which
+    fully determines the reference distribution.
 
     Parameters
     ----------
     W : NxN np.ndarray
-        binary/weighted directed/undirected connection matrix
-    ci : Nx1 np.ndarray
-        community affiliation vector
-    degree : str
-        Flag to describe nature of graph 'undirected': For undirected graphs
-                                         'in': Uses the in-degree
-                                         'out': Uses the out-degree
+        Undirected connectivity matrix.
+    Q : int
+        Approximate number of double-edge swaps per edge. Default is 100.
+    nrand : int
+        Number of reference graphs. Default is 10.
+    seed : int
+        Seed of the first reference graph. Default is 42.
+    n_procs : int
+        Number of processes to use. Default is None, which uses all available cores.
+
     Returns
     -------
-    P : Nx1 np.ndarray
-        Participation coefficient
-
-    References
-    ----------
-    .. [1] Guimera, R., & Amaral, L. A. N. (2005). Functional cartography of
-      complex metabolic networks. Nature, 433, 895-900.
-    .. [2] Rubinov, M., & Sporns, O. (2010). Complex network measures of brain
-      connectivity: Uses and interpretations. NeuroImage, 52, 1059-1069.
+    rc_null : np.ndarray
+        nrand x K rich-club coefficients of the reference graphs, for every degree k < K.
 
     """
+    import hashlib
+    import multiprocessing as mp
+
+    A = (np.asarray(W) != 0).astype(np.float64)
+    np.fill_diagonal(A, 0)
+    key = (hashlib.sha1(np.sort(A.sum(axis=1)).tobytes()).hexdigest(), Q, nrand, seed)
+    if key in _RICH_CLUB_CACHE:
+        return _RICH_CLUB_CACHE[key]
+
+    if n_procs is None:
+        n_procs = mp.cpu_count()
+    n_procs = max(1, min(int(n_procs), nrand))
+
+    tasks = [(Q, seed + i) for i in range(nrand)]
+    # Daemonic processes (e.g. pool workers) are not allowed to spawn children of their own
+    if n_procs > 1 and not mp.current_process().daemon:
+        with mp.Pool(n_procs, initializer=_init_null_model_worker, initargs=(A,)) as pool:
+            rc_null = pool.map(_rich_club_null, tasks)
+    else:
+        _init_null_model_worker(A)
+        rc_null = [_rich_club_null(task) for task in tasks]
 
-    if degree == 'in':
-        W = W.T
-
-    _, ci = np.unique(ci, return_inverse=True)
-    ci += 1
-    n = len(W)  # number of vertices
-    Ko = np.sum(W, axis=1)  # (out) degree
-    Gc = np.dot((W != 0), np.diag(ci))  # neighbor community affiliation
-    Kc2 = np.zeros((n,))  # community-specific neighbors
-    for i in range(1, int(np.max(ci)) + 1):
-        Kc2 += np.square(np.sum(W * (Gc == i), axis=1))
-
-    P = np.ones((n,)) - Kc2 / np.square(Ko)
-    # P=0 if for nodes with no (out) neighbors
-    P[np.where(np.logical_not(Ko))] = 0
-
-    return P
+    rc_null = np.array(rc_null, dtype=np.float64)
+    _RICH_CLUB_CACHE[key] = rc_null
+    return rc_null
 
 
-@timeout(720)
-def participation_coef_sign(W, ci):
+def rich_club_coefficient_norm(W, Q=100, nrand=10, seed=42, n_procs=None):
     """
-    Participation coefficient is a measure of diversity of intermodular
-    connections of individual nodes.
+    Rich-club coefficient of an undirected graph for every degree, normalized by its mean across
+    degree-preserving random reference graphs (see rich_club_null_distribution).
 
     Parameters
     ----------
     W : NxN np.ndarray
-        undirected connection matrix with positive and negative weights
-    ci : Nx1 np.ndarray
-        community affiliation vector
+        Undirected connectivity matrix (edge weights are ignored).
+    Q : int
+        Approximate number of double-edge swaps per edge. Default is 100.
+    nrand : int
+        Number of reference graphs. Default is 10.
+    seed : int
+        Seed of the first reference graph. Default is 42.
+    n_procs : int
+        Number of processes to use. Default is None, which uses all available cores.
 
     Returns
     -------
-    Ppos : Nx1 np.ndarray
-        participation coefficient from positive weights
-    Pneg : Nx1 np.ndarray
-        participation coefficient from negative weights
-
-    References
-    ----------
-    .. [1] Guimera, R., & Amaral, L. A. N. (2005). Functional cartography of
-      complex metabolic networks. Nature, 433, 895-900.
-    .. [2] Rubinov, M., & Sporns, O. (2010). Complex network measures of brain
-      connectivity: Uses and interpretations. NeuroImage, 52, 1059-1069.
+    rc : dict
+        Normalized rich-club coefficient of each degree k, which is NaN where the reference
+        coefficient is 0.
 
     """
-    _, ci = np.unique(ci, return_inverse=True)
-    ci += 1
-
-    n = len(W)  # number of vertices
+    rc = rich_club_coefficient_mat(W)
+    rc_rand = np.mean(rich_club_null_distribution(W, Q=Q, nrand=nrand, seed=seed, n_procs=n_procs), axis=0)
+    rc_norm = np.divide(rc, rc_rand, out=np.full(len(rc), np.nan), where=rc_rand != 0)
+    return dict(enumerate(rc_norm))
 
-    def pcoef(W_):
-        S = np.sum(W_, axis=1)  # strength
-        # neighbor community affil.
-        Gc = np.dot(np.logical_not(W_ == 0), np.diag(ci))
-        Sc2 = np.zeros((n,))
 
-        for i in range(1, int(np.max(ci) + 1)):
-            Sc2 += np.square(np.sum(W_ * (Gc == i), axis=1))
+def _communicability_deletion(args):
+    """
+    Inner product of the communicability of a graph with node i deleted with a fixed matrix, from the
+    eigendecomposition of the intact graph.
+    """
+    lam, U, cluster, M_eig, M_eig_block, M_eig_trace, i, shift = args
+    z = U[i, :].copy()
+
+    # Eigenvectors within a cluster of equal eigenvalues can be rotated such that all but one vanish at node
+    # i, which are then eigenvectors of the node-deleted graph as well
+    z_clust = np.bincount(cluster, weights=z ** 2, minlength=len(M_eig_trace))
+    lam_clust = np.bincount(cluster, weights=lam, minlength=len(M_eig_trace)) / np.bincount(cluster)
+    active = z_clust > 1e-24
+    z[~active[cluster]] = 0
+    z_quad = np.bincount(cluster, weights=z * (M_eig_block @ z), minlength=len(M_eig_trace))
+    deflated = M_eig_trace - np.divide(z_quad, z_clust, out=np.zeros(len(z_clust)), where=active)
+    total = np.sum(np.exp(lam_clust - shift) * deflated)
+
+    # The remaining eigenvalues are roots of the secular equation sum_k z_k^2 / (lam_k - mu) = 0, one
+    # between each pair of consecutive poles, which are found relative to their nearest pole
+    poles, weights = lam_clust[active], z_clust[active]
+    if len(poles) < 2:
+        return total
+    gap = np.diff(poles)
+    mid = poles[:-1] + gap / 2
+    left = np.sum(weights / (poles[None, :] - mid[:, None]), axis=1) > 0
+    origin = np.where(left, poles[:-1], poles[1:])
+    offsets = poles[None, :] - origin[:, None]
+    below = np.arange(len(poles))[None, :] <= np.arange(len(poles) - 1)[:, None]
+    d_lo, d_hi = offsets[:, :-1].diagonal(), offsets[:, 1:].diagonal()
+    lo = np.where(left, 0, -gap / 2)
+    hi = np.where(left, gap / 2, 0)
+    delta = (lo + hi) / 2
+    pending = np.arange(len(origin))
+    for _ in range(50):
+        denom = offsets[pending] - delta[pending, None]
+        terms = weights / denom
+        slopes = terms / denom
+        f = np.sum(terms, axis=1)
+        lo[pending] = np.where(f < 0, delta[pending], lo[pending])
+        hi[pending] = np.where(f > 0, delta[pending], hi[pending])
+        # Model the poles below and above the root each by a single pole with matching value and slope, and
+        # solve the resulting quadratic for the correction
+        P, Q = d_lo[pending] - delta[pending], d_hi[pending] - delta[pending]
+        slope_lo = np.sum(slopes * below[pending], axis=1)
+        b_lo = slope_lo * P ** 2
+        b_hi = (np.sum(slopes, axis=1) - slope_lo) * Q ** 2
+        c = f - b_lo / P - b_hi / Q
+        a1 = -(c * (P + Q) + b_lo + b_hi)
+        a0 = P * Q * f
+        root = -a1 - np.copysign(np.sqrt(np.maximum(a1 ** 2 - 4 * c * a0, 0)), a1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.where((2 * a0 / root > P) & (2 * a0 / root < Q), 2 * a0 / root, root / (2 * c))
+        step = delta[pending] + corr
+        # The model overshoots from one side of the root and converges monotonically from the other, so that an
+        # overshoot restarts from the end of the bracket it passed, unless that end is the pole itself
+        fallback = np.where(step <= lo[pending], lo[pending], hi[pending])
+        fallback = np.where(fallback == 0, (lo[pending] + hi[pending]) / 2, fallback)
+        step = np.where((step > lo[pending]) & (step < hi[pending]), step, fallback)
+        # Converged once the step or the secular function itself is within rounding error
+        done = (np.abs(step - delta[pending]) <= 4 * np.finfo(float).eps * np.abs(delta[pending])) | \
+            (np.abs(f) <= 8 * len(poles) * np.finfo(float).eps * np.sum(np.abs(terms), axis=1))
+        delta[pending] = np.where(done, delta[pending], step)
+        pending = pending[~done]
+        if len(pending) == 0:
+            break
 
-        P = np.ones((n,)) - Sc2 / np.square(S)
-        P[np.where(np.isnan(P))] = 0
-        P[np.where(np.logical_not(P))] = 0  # p_ind=0 if no (out)neighbors
-        return P
+    # Eigenvectors of the node-deleted graph in the eigenbasis of the intact graph
+    vecs = np.divide(z[:, None], (lam_clust[cluster][:, None] - origin[None, :]) - delta[None, :],
+                     out=np.zeros((len(z), len(origin))), where=active[cluster][:, None])
+    quad = np.sum(vecs * (M_eig @ vecs), axis=0) / np.sum(vecs ** 2, axis=0)
+    return total + np.sum(np.exp(origin + delta - shift) * quad)
 
-    # explicitly ignore compiler warning for division by zero
-    with np.errstate(invalid='ignore'):
-        Ppos = pcoef(W * (W > 0))
-        Pneg = pcoef(-W * (W < 0))
 
-    return Ppos, Pneg
+def _communicability_deletion_exact(args):
+    """
+    Inner product of the communicability of a graph with node i deleted with a fixed matrix, from the
+    matrix exponential of the node-deleted graph.
+    """
+    from scipy.linalg import expm
+    A, M, i, shift = args
+    keep = np.arange(A.shape[0]) != i
+    return np.sum(expm(A[np.ix_(keep, keep)] - shift * np.eye(len(A) - 1)) * M[np.ix_(keep, keep)])
 
 
-@timeout(720)
-def diversity_coef_sign(W, ci):
+def communicability_betweenness_centrality_mat(W, n_threads=None):
     """
-    The Shannon-entropy based diversity coefficient measures the diversity
+    Communicability betweenness centrality of an undirected graph, equivalent to
+    nx.communicability_betweenness_centrality on connected graphs.
+
+    The betweenness of node i, sum_{j != k, j,k != i} (C_jk - C_jk(i)) / C_jk, is rewritten as
+    (N - 1)(N - 2) - <C(i), 1 / C>, where C is the communicability exp(A) and C(i) that of the graph
+    with node i deleted. Rather than a matrix exponential per node, a single eigendecomposition of A
+    is updated for the deletion of each node, whose eigenvalues are roots of a secular equation and
+    whose eigenvectors follow in closed form from them. Nodes are processed across a thread pool,
+    since the matrix products release the GIL. Communicabilities are shifted by the leading
+    eigenvalue of A, which leaves their ratios unchanged while keeping them from overflowing on dense
+    graphs. Where communicabilities span too many orders of magnitude for the eigendecomposition to
+    resolve their ratios (e.g. in long chains of nodes), the matrix exponential of each node-deleted
+    graph is computed instead.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray
+        Undirected connectivity matrix (edge weights are ignored).
+    n_threads : int
+        Number of nodes to process concurrently. Default is None, which uses all available cores.
+
+    Returns
+    -------
+    cbc : dict
+        Communicability betweenness centrality of each node. Pairs of nodes that are disconnected
+        from each other, for which communicability is 0, do not contribute.
+
+    References
+    ----------
+    .. [1] Estrada, E., Higham, D. J., & Hatano, N. (2009). Communicability betweenness in complex
+      networks. Physica A, 388(5), 764-774.
+    .. [2] Golub, G. H. (1973). Some modified matrix eigenvalue problems. SIAM Review, 15(2), 318-334.
+
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    from scipy.linalg import expm
+    from scipy.sparse.csgraph import connected_components
+
+    A = (np.asarray(W) != 0).astype(np.float64)
+    order = A.shape[0]
+    cbc = np.zeros(order)
+    n_threads = n_threads or os.cpu_count()
+
+    # Communicability vanishes between components, so that each can be treated as a graph of its own
+    _, labels = connected_components(A, directed=False)
+    with ThreadPoolExecutor(max(1, int(n_threads))) as pool:
+        for label in np.unique(labels):
+            nodes = np.flatnonzero(labels == label)
+            if len(nodes) < 3:
+                continue
+            A_comp = A[np.ix_(nodes, nodes)]
+            lam, U = np.linalg.eigh(A_comp)
+            shift = lam[-1]
+            comm = expm(A_comp - shift * np.eye(len(nodes)))
+            inv_comm = 1 / comm
+            np.fill_diagonal(inv_comm, 0)
+            if comm.max() / comm.min() < 1e8:
+                M_eig = U.T @ inv_comm @ U
+                cluster = np.concatenate([[0], np.cumsum(np.diff(lam) > 1e-10 * max(1, np.abs(lam).max()))])
+                M_eig_block = np.where(cluster[:, None] == cluster[None, :], M_eig, 0)
+                M_eig_trace = np.bincount(cluster, weights=np.diag(M_eig))
+                tasks = [(lam, U, cluster, M_eig, M_eig_block, M_eig_trace, i, shift) for i in range(len(nodes))]
+                deletion = _communicability_deletion
+            else:
+                tasks = [(A_comp, inv_comm, i, shift) for i in range(len(nodes))]
+                deletion = _communicability_deletion_exact
+            cbc[nodes] = (len(nodes) - 1) * (len(nodes) - 2) - np.fromiter(pool.map(deletion, tasks),
+                                                                           dtype=np.float64, count=len(nodes))
+
+    if order > 2:
+        cbc = cbc / ((order - 1.0) ** 2 - (order - 1.0))
+    return dict(enumerate(cbc))
+
+
+def create_communities(node_comm_aff_mat, node_num):
+    """
+    Create a 1D vector of community assignments from a community affiliation matrix.
+
+    Parameters
+    ----------
+    node_comm_aff_mat : array
+        Community affiliation matrix produced from modularity estimation (e.g. Louvain).
+    node_num : int
+        Number of total connected nodes in the graph used to estimate node_comm_aff_mat.
+
+    Returns
+    -------
+    com_assign : array
+        1D numpy vector of community assignments.
+
+    References
+    ----------
+    .. [1] Newman, M.E.J. & Girvan, M. Finding and evaluating community
+      structure in networks. Physical Review E 69, 26113(2004).
+    .. [2] Blondel, V.D. et al. Fast unfolding of communities in large
+      networks. J. Stat. Mech 10008, 1-12(2008).
+
+    """
+    com_assign = np.zeros((node_num, 1))
+    for i in range(len(node_comm_aff_mat)):
+        community = node_comm_aff_mat[i, :]
+        for j in range(len(community)):
+            if community[j] == 1:
+                com_assign[j, 0] = i
+    return com_assign
+
+
+def _module_strengths(W, ci):
+    """
+    Return the strength of each node's connections to each community, Kc[..., i, c], as a single product of W with a
+    sparse one-hot community indicator matrix.
+
+    Parameters
+    ----------
+    W : NxN or GxNxN np.ndarray, or NxN scipy.sparse matrix
+        Connection matrix, or stack of G connection matrices.
+    ci : Nx1 or GxN np.ndarray
+        Community affiliation vector, shared by or specific to each graph of the stack.
+
+    Returns
+    -------
+    Kc : NxM or GxNxM np.ndarray
+        Node-to-community strengths, where M is the (maximum) number of communities.
+    m : int or Gx1 np.ndarray
+        Number of communities (of each graph).
+
+    """
+    from scipy import sparse
+
+    def indicator(ci_):
+        _, ci_ = np.unique(ci_, return_inverse=True)
+        ci_ = ci_.ravel()
+        return sparse.csr_matrix((np.ones(len(ci_)), (np.arange(len(ci_)), ci_)), shape=(len(ci_), ci_.max() + 1))
+
+    ci = np.asarray(ci)
+    if sparse.issparse(W) or np.ndim(W) == 2:
+        M = indicator(ci)
+        Kc = M.T.dot(W.T).T
+        return (Kc.toarray() if sparse.issparse(Kc) else np.asarray(Kc)), M.shape[1]
+
+    W = np.asarray(W)
+    n_graphs, n = W.shape[:2]
+    if ci.ndim == 1:
+        M = indicator(ci)
+        Kc = np.asarray(M.T.dot(W.reshape(-1, n).T).T).reshape(n_graphs, n, M.shape[1])
+        return Kc, np.full(n_graphs, M.shape[1])
+
+    Ms = [indicator(ci_) for ci_ in ci]
+    m = np.array([M.shape[1] for M in Ms])
+    Kc = np.zeros((n_graphs, n, m.max()))
+    for g, M in enumerate(Ms):
+        Kc[g, :, :m[g]] = np.asarray(M.T.dot(W[g].T).T)
+    return Kc, m
+
+
+def _split_signs(W):
+    from scipy import sparse
+    if sparse.issparse(W):
+        return W.multiply(W > 0).tocsr(), (-W).multiply(W < 0).tocsr()
+    return W * (W > 0), -W * (W < 0)
+
+
+@timeout(720)
+def participation_coef(W, ci, degree='undirected'):
+    """
+    Participation coefficient is a measure of diversity of intermodular
+    connections of individual nodes.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray
+        binary/weighted directed/undirected connection matrix, or a GxNxN stack
+        of G such matrices (e.g. across thresholds)
+    ci : Nx1 np.ndarray
+        community affiliation vector, or GxN array of one per graph of the stack
+    degree : str
+        Flag to describe nature of graph 'undirected': For undirected graphs
+                                         'in': Uses the in-degree
+                                         'out': Uses the out-degree
+    Returns
+    -------
+    P : Nx1 np.ndarray
+        Participation coefficient (GxN for a stack of graphs)
+
+    References
+    ----------
+    .. [1] Guimera, R., & Amaral, L. A. N. (2005). Functional cartography of
+      complex metabolic networks. Nature, 433, 895-900.
+    .. [2] Rubinov, M., & Sporns, O. (2010). Complex network measures of brain
+      connectivity: Uses and interpretations. NeuroImage, 52, 1059-1069.
+
+    """
+
+    if degree == 'in':
+        W = W.T if np.ndim(W) == 2 else np.swapaxes(W, -1, -2)
+
+    Kc, _ = _module_strengths(W, ci)  # community-specific strengths
+    Ko = np.sum(Kc, axis=-1)  # (out) degree
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        P = 1 - np.sum(np.square(Kc), axis=-1) / np.square(Ko)
+    # P=0 if for nodes with no (out) neighbors
+    P[Ko == 0] = 0
+
+    return P
+
+
+@timeout(720)
+def participation_coef_sign(W, ci):
+    """
+    Participation coefficient is a measure of diversity of intermodular
+    connections of individual nodes.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray
+        undirected connection matrix with positive and negative weights, or a
+        GxNxN stack of G such matrices
+    ci : Nx1 np.ndarray
+        community affiliation vector, or GxN array of one per graph of the stack
+
+    Returns
+    -------
+    Ppos : Nx1 np.ndarray
+        participation coefficient from positive weights
+    Pneg : Nx1 np.ndarray
+        participation coefficient from negative weights
+
+    References
+    ----------
+    .. [1] Guimera, R., & Amaral, L. A. N. (2005). Functional cartography of
+      complex metabolic networks. Nature, 433, 895-900.
+    .. [2] Rubinov, M., & Sporns, O. (2010). Complex network measures of brain
+      connectivity: Uses and interpretations. NeuroImage, 52, 1059-1069.
+
+    """
+
+    def pcoef(W_):
+        Sc, _ = _module_strengths(W_, ci)
+        S = np.sum(Sc, axis=-1)  # strength
+        P = 1 - np.sum(np.square(Sc), axis=-1) / np.square(S)
+        P[np.isnan(P)] = 0  # p_ind=0 if no (out)neighbors
+        return P
+
+    W_pos, W_neg = _split_signs(W)
+
+    # explicitly ignore compiler warning for division by zero
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Ppos = pcoef(W_pos)
+        Pneg = pcoef(W_neg)
+
+    return Ppos, Pneg
+
+
+@timeout(720)
+def diversity_coef_sign(W, ci):
+    """
+    The Shannon-entropy based diversity coefficient measures the diversity
     of intermodular connections of individual nodes and ranges from 0 to 1.
 
     Parameters
     ----------
     W : NxN np.ndarray
-        undirected connection matrix with positive and negative weights
+        undirected connection matrix with positive and negative weights, or a
+        GxNxN stack of G such matrices
     ci : Nx1 np.ndarray
-        community affiliation vector
+        community affiliation vector, or GxN array of one per graph of the stack
 
     Returns
     -------
@@ -480,27 +1236,21 @@ def diversity_coef_sign(W, ci):
     """
 
     def entropy(w_):
-        # Strength
-        S = np.sum(w_, axis=1)
         # Node-to-module degree
-        Snm = np.zeros((n, m))
-        for i in range(m):
-            Snm[:, i] = np.sum(w_[:, ci == i + 1], axis=1)
-        pnm = Snm / (np.tile(S, (m, 1)).T)
+        Snm, m = _module_strengths(w_, ci)
+        # Strength
+        S = np.sum(Snm, axis=-1)
+        pnm = Snm / S[..., None]
         pnm[np.isnan(pnm)] = 0
         pnm[np.logical_not(pnm)] = 1
-        return -np.sum(pnm * np.log(pnm), axis=1) / np.log(m)
+        return -np.sum(pnm * np.log(pnm), axis=-1) / np.expand_dims(np.log(m), -1)
 
-    n = len(W)
-    _, ci = np.unique(ci, return_inverse=True)
-    ci += 1
-    # Number of modules
-    m = np.max(ci)
+    W_pos, W_neg = _split_signs(W)
 
     # Explicitly ignore compiler warning for division by zero
-    with np.errstate(invalid='ignore'):
-        Hpos = entropy(W * (W > 0))
-        Hneg = entropy(-W * (W < 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Hpos = entropy(W_pos)
+        Hneg = entropy(W_neg)
 
     return Hpos, Hneg
 
@@ -535,14 +1285,15 @@ def link_communities(W, type_clustering='single'):
       https://doi.org/10.1098/rstb.2013.0527
 
     """
+    from scipy.sparse import coo_matrix, csgraph
 
     from pynets.core.thresholding import normalize
 
-    n = len(W)
-    W = normalize(W)
-
     if type_clustering not in ('single', 'complete'):
-        print('Error: Unrecognized clustering type')
+        raise ValueError(f"{type_clustering}' clustering type not recognized!")
+
+    n = len(W)
+    W = normalize(np.array(W, dtype=np.float64))
 
     # Set diagonal to mean weights
     np.fill_diagonal(W, 0)
@@ -554,149 +1305,122 @@ def link_communities(W, type_clustering='single'):
     Ni = np.sum(W ** 2, axis=0)
 
     # Weighted in/out jaccard
-    Jo = np.zeros((n, n))
-    Ji = np.zeros((n, n))
-
-    for b in range(n):
-        for c in range(n):
-            Do = np.dot(W[b, :], W[c, :].T)
-            Jo[b, c] = Do / (No[b] + No[c] - Do)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Do = np.dot(W, W.T)
+        Jo = Do / (No[:, None] + No[None, :] - Do)
+        Di = np.dot(W.T, W)
+        Ji = Di / (Ni[:, None] + Ni[None, :] - Di)
 
-            Di = np.dot(W[:, b].T, W[:, c])
-            Ji[b, c] = Di / (Ni[b] + Ni[c] - Di)
-
-    # Get link similarity
+    # Link nodes and weights
     A, B = np.where(np.logical_and(np.logical_or(W, W.T), np.triu(np.ones((n, n)), 1)))
     m = len(A)
-    # Link nodes
-    Ln = np.zeros((m, 2), dtype=np.int32)
-    # Link weights
-    Lw = np.zeros((m,))
-
-    for i in range(m):
-        Ln[i, :] = (A[i], B[i])
-        Lw[i] = (W[A[i], B[i]] + W[B[i], A[i]]) / 2
-
-    # Link similarity
-    ES = np.zeros((m, m), dtype=np.float32)
-    for i in range(m):
-        for j in range(m):
-            if Ln[i, 0] == Ln[j, 0]:
-                a = Ln[i, 0]
-                b = Ln[i, 1]
-                c = Ln[j, 1]
-            elif Ln[i, 0] == Ln[j, 1]:
-                a = Ln[i, 0]
-                b = Ln[i, 1]
-                c = Ln[j, 0]
-            elif Ln[i, 1] == Ln[j, 0]:
-                a = Ln[i, 1]
-                b = Ln[i, 0]
-                c = Ln[j, 1]
-            elif Ln[i, 1] == Ln[j, 1]:
-                a = Ln[i, 1]
-                b = Ln[i, 0]
-                c = Ln[j, 0]
-            else:
-                continue
-
-            ES[i, j] = (W[a, b] * W[a, c] * Ji[b, c] + W[b, a] * W[c, a] * Jo[b, c]) / 2
-
-    np.fill_diagonal(ES, 0)
-    # Perform hierarchical clustering
-    # Community affiliation matrix
-    C = np.zeros((m, m), dtype=np.int32)
-    Nc = C.copy()
-    Mc = np.zeros((m, m), dtype=np.float32)
-    # Community nodes, links, density
-    Dc = Mc.copy()
-    # Initial community assignments
-    U = np.arange(m)
-    C[0, :] = np.arange(m)
-
-    for i in range(m - 1):
-        print(f'Hierarchy {i:d}')
-        # time1 = time.time()
-        # Loop over communities
-        for j in range(len(U)):
-            # Get link indices
-            ixes = C[i, :] == U[j]
-            links = np.sort(Lw[ixes])
-            # nodes = np.sort(Ln[ixes,:].flat)
-            nodes = np.sort(np.reshape(
-                Ln[ixes, :], 2 * np.size(np.where(ixes))))
-            # Get unique nodes
-            nodulo = np.append(nodes[0], (nodes[1:])[nodes[1:] != nodes[:-1]])
-            # nodulo = ((nodes[1:])[nodes[1:] != nodes[:-1]])
-            nc = len(nodulo)
-            # nc = len(nodulo)+1
-            mc = np.sum(links)
-            # Minimal weight
-            min_mc = np.sum(links[:nc - 1])
-            # Community density
+    Ln = np.column_stack((A, B)).astype(np.int32)
+    Lw = (W[A, B] + W[B, A]) / 2
+    if m < 2:
+        return np.zeros((0, n))
+
+    # Link similarity is only defined for pairs of links that share a node, so enumerate those
+    # pairs node-by-node from the link incidence list and store them sparsely.
+    inc_node = np.concatenate((A, B))
+    inc_other = np.concatenate((B, A))
+    inc_link = np.concatenate((np.arange(m), np.arange(m)))
+    order = np.argsort(inc_node, kind='mergesort')
+    inc_node, inc_other, inc_link = inc_node[order], inc_other[order], inc_link[order]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(inc_node, minlength=n))))
+    pair_i, pair_j = [], []
+    for node in range(n):
+        g = bounds[node + 1] - bounds[node]
+        if g > 1:
+            iu, ju = np.triu_indices(g, 1)
+            pair_i.append(bounds[node] + iu)
+            pair_j.append(bounds[node] + ju)
+    if pair_i:
+        pair_i = np.concatenate(pair_i)
+        pair_j = np.concatenate(pair_j)
+    else:
+        pair_i = pair_j = np.zeros(0, dtype=np.int64)
+    a = inc_node[pair_i]
+    b = inc_other[pair_i]
+    c = inc_other[pair_j]
+    es = np.nan_to_num((W[a, b] * W[a, c] * Ji[b, c] + W[b, a] * W[c, a] * Jo[b, c]) / 2)
+    li = inc_link[pair_i]
+    lj = inc_link[pair_j]
+
+    # Perform hierarchical clustering on link distances (smax - similarity), where link pairs that
+    # share no node have zero similarity
+    smax = np.max(es) if len(es) > 0 else 0
+    if type_clustering == 'single':
+        # Single-linkage merges follow a maximum spanning forest of the (sparse) similarity graph
+        dist = coo_matrix((smax - es + 1, (li, lj)), shape=(m, m)).tocsr()
+        mst = csgraph.minimum_spanning_tree(dist).tocoo()
+        merge_order = np.argsort(mst.data, kind='mergesort')
+        merges = list(zip(mst.row[merge_order], mst.col[merge_order]))
+        # Remaining components are joined at zero similarity
+        n_comp, comp_labels = csgraph.connected_components(mst, directed=False)
+        if n_comp > 1:
+            _, reps = np.unique(comp_labels, return_index=True)
+            merges.extend(zip(np.repeat(reps[0], n_comp - 1), reps[1:]))
+    else:
+        from scipy.cluster.hierarchy import linkage
+        condensed = np.full(m * (m - 1) // 2, smax, dtype=np.float64)
+        i_lo, j_hi = np.minimum(li, lj), np.maximum(li, lj)
+        condensed[m * i_lo - i_lo * (i_lo + 1) // 2 + (j_hi - i_lo - 1)] = smax - es
+        Z = linkage(condensed, method='complete')
+        rep = np.concatenate((np.arange(m), np.zeros(m - 1, dtype=np.int64)))
+        merges = []
+        for t, (z0, z1) in enumerate(Z[:, :2].astype(np.int64)):
+            rep[m + t] = rep[z0]
+            merges.append((rep[z0], rep[z1]))
+
+    # Evaluate the partition density of every level of the hierarchy incrementally, updating
+    # only the two communities that are merged at each step
+    def _density(nodes, links):
+        nc = len(nodes)
+        mc = np.sum(links)
+        # Minimal weight
+        min_mc = np.sum(links[:nc - 1])
+        with np.errstate(divide='ignore', invalid='ignore'):
             dc = (mc - min_mc) / (nc * (nc - 1) / 2 - min_mc)
-            if np.array(dc).shape is not ():
-                print(dc)
-                print(dc.shape)
-            Nc[i, j] = nc
-            Mc[i, j] = mc
-            Dc[i, j] = dc if not np.isnan(dc) else 0
-        # time2 = time.time()
-        # print('compute densities time', time2-time1)
-        # Copy current partition
-        C[i + 1, :] = C[i, :]
-        # if i in (2693,):
-        #    import pdb
-        #    pdb.set_trace()
-        u1, u2 = np.where(ES[np.ix_(U, U)] == np.max(ES[np.ix_(U, U)]))
-        if np.size(u1) > 2:
-            wehr, = np.where((u1 == u2[0]))
-            uc = np.squeeze((u1[0], u2[0]))
-            ud = np.squeeze((u1[wehr], u2[wehr]))
-            u1 = uc
-            u2 = ud
-
-        # time25 = time.time()
-        # print('copy and max time', time25-time2)
-        # ugl = np.array((u1,u2))
-        ugl = np.sort((u1, u2), axis=1)
-        ug_rows = ugl[np.argsort(ugl, axis=0)[:, 0]]
-        # implementation of matlab unique(A, 'rows')
-        unq_rows = np.vstack({tuple(row) for row in ug_rows})
-        V = U[unq_rows]
-        # time3 = time.time()
-        # print('sortrows time', time3-time25)
-
-        for j in range(len(V)):
-            if type_clustering == 'single':
-                x = np.max(ES[V[j, :], :], axis=0)
-            elif type_clustering == 'complete':
-                x = np.min(ES[V[j, :], :], axis=0)
-            # Assign distances to whole clusters
-            #            import pdb
-            #            pdb.set_trace()
-            ES[V[j, :], :] = np.array((x, x))
-            ES[:, V[j, :]] = np.transpose((x, x))
-            # clear diagonal
-            ES[V[j, 0], V[j, 0]] = 0
-            ES[V[j, 1], V[j, 1]] = 0
-            # merge communities
-            C[i + 1, C[i + 1, :] == V[j, 1]] = V[j, 0]
-            V[V == V[j, 1]] = V[j, 0]
-
-        # time4 = time.time()
-        # print('get linkages time', time4-time3)
-        U = np.unique(C[i + 1, :])
-        if len(U) == 1:
-            break
-        # time5 = time.time()
-        # print('get unique communities time', time5-time4)
-    # Dc[ np.where(np.isnan(Dc)) ]=0
-    i = np.argmax(np.sum(Dc * Mc, axis=1))
-    U = np.unique(C[i, :])
+        return (dc if np.isfinite(dc) else 0) * mc
+
+    parent = np.arange(m)
+
+    def _find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    comm_nodes = {j: {Ln[j, 0], Ln[j, 1]} for j in range(m)}
+    comm_links = {j: Lw[j:j + 1] for j in range(m)}
+    comm_score = {j: _density(comm_nodes[j], comm_links[j]) for j in range(m)}
+    score = sum(comm_score.values())
+    scores = [score]
+    for u, v in merges:
+        ru, rv = _find(u), _find(v)
+        if len(comm_nodes[ru]) < len(comm_nodes[rv]):
+            ru, rv = rv, ru
+        parent[rv] = ru
+        comm_nodes[ru] |= comm_nodes.pop(rv)
+        comm_links[ru] = np.sort(np.concatenate((comm_links[ru], comm_links.pop(rv))), kind='mergesort')
+        score = score - comm_score[ru] - comm_score.pop(rv)
+        comm_score[ru] = _density(comm_nodes[ru], comm_links[ru])
+        score = score + comm_score[ru]
+        scores.append(score)
+
+    # Replay the merges up to the level of maximal partition density, excluding the trivial
+    # partition in which all links belong to a single community
+    i = int(np.argmax(scores[:-1]))
+    parent = np.arange(m)
+    for u, v in merges[:i]:
+        parent[_find(v)] = _find(u)
+    C = np.array([_find(j) for j in range(m)])
+    U, labels = np.unique(C, return_inverse=True)
     M = np.zeros((len(U), n))
-    for j in range(len(U)):
-        M[j, np.unique(Ln[C[i, :] == U[j], :])] = 1
+    M[labels, Ln[:, 0]] = 1
+    M[labels, Ln[:, 1]] = 1
 
     M = M[np.sum(M, axis=1) > 2, :]
     return M
@@ -773,23 +1497,14 @@ def prune_disconnected(G):
     """
     print('Pruning disconnected...')
 
-    # List because it returns a generator
-    components = list(nx.connected_components(G))
-    components.sort(key=len, reverse=True)
-    components_connected = list(components[0])
-
-    isolates = [n for (n, d) in G.degree() if d == 0]
+    # Only the largest connected component (of at least two nodes) is kept
+    components = connected_component_indices(G)
+    keep = set(components[0]) if len(components) > 0 else set()
 
-    # Remove disconnected nodes
-    pruned_nodes = []
-    s = 0
-    for node in list(G.nodes()):
-        if node not in components_connected or node in isolates:
-            G.remove_node(node)
-            pruned_nodes.append(s)
-        s = s + 1
+    nodes = list(G.nodes())
+    pruned_nodes = [s for s in range(len(nodes)) if s not in keep]
 
-    return G, pruned_nodes
+    return G.subgraph([nodes[s] for s in sorted(keep)]).copy(), pruned_nodes
 
 
 def most_important(G):
@@ -851,17 +1566,38 @@ def most_important(G):
     return Gt, pruned_nodes
 
 
+def _metric_weight(i):
+    """
+    Return the edge attribute that a (possibly partial) NetworkX-style metric function is weighted by.
+    """
+    import inspect
+    from functools import partial
+    if isinstance(i, partial) and 'weight' in i.keywords:
+        return i.keywords['weight']
+    try:
+        weight = inspect.signature(i).parameters.get('weight')
+    except (TypeError, ValueError):
+        return None
+    return None if weight is None else weight.default
+
+
 @timeout(1800)
-def raw_mets(G, i):
+def raw_mets(G, i, components=None):
     """
     API that iterates across NetworkX algorithms for a G.
 
+    Metrics whose definitions require a connected graph are computed separately on each
+    connected component of a fragmented G, and aggregated across components.
+
     Parameters
     ----------
     G : Obj
         NetworkX graph.
     i : str
         Name of the NetworkX algorithm.
+    components : list
+        Optional precomputed output of connected_component_indices for G, so that a G is
+        decomposed only once across its metrics.
 
     Returns
     -------
@@ -869,76 +1605,145 @@ def raw_mets(G, i):
         Value of the graph metric i that was calculated from G.
 
     """
-
-    # import random
     from functools import partial
     if isinstance(i, partial):
         net_name = str(i.func)
     else:
         net_name = str(i)
-    if 'average_shortest_path_length' in net_name:
-        if nx.is_connected(G) is True:
-            try:
-                net_met_val = float(i(G))
-            except:
-                net_met_val = float(average_shortest_path_length_for_all(G))
-        else:
-            try:
-                [H, _] = prune_disconnected(G)
-                net_met_val = float(i(H))
-            except:
-                print(f"{'WARNING: '}{net_name}{' failed for G.'}")
-                # np.save(f"{'/tmp/average_shortest_path_length'}{random.randint(1, 400)}{'.npy'}",
-                #         np.array(nx.to_numpy_matrix(H)))
-    elif 'graph_number_of_cliques' in net_name:
-        if nx.is_connected(G) is True:
-            try:
-                net_met_val = float(i(G))
-            except:
-                net_met_val = float(subgraph_number_of_cliques_for_all(G))
-        else:
-            try:
-                [H, _] = prune_disconnected(G)
-                net_met_val = float(i(H))
-            except:
-                print(f"{'WARNING: '}{net_name}{' failed for G.'}")
-                # np.save(f"{'/tmp/graph_num_cliques'}{random.randint(1, 400)}{'.npy'}",
-                #         np.array(nx.to_numpy_matrix(H)))
-    elif 'smallworldness' in net_name:
+
+    if components is None:
+        components = connected_component_indices(G)
+    connected = len(components) == 1 and len(components[0]) == G.number_of_nodes()
+
+    if 'average_shortest_path_length' in net_name and not connected:
+        # Weighted by the number of node pairs of each component
+        net_met_val = float(average_shortest_path_length_for_all(G, weight=_metric_weight(i),
+                                                                 components=components))
+    elif 'graph_number_of_cliques' in net_name and not connected:
+        # Weighted by the number of nodes of each component
+        net_met_val = float(subgraph_number_of_cliques_for_all(G, components=components))
+    elif 'smallworldness' in net_name and not connected:
+        # Weighted by the number of nodes of each component large enough to be rewired
+        W = nx.to_numpy_array(G, weight='weight')
+        vals = []
+        sizes = []
+        for c in components:
+            if len(c) > 3:
+                val = float(i(nx.from_numpy_array(W[np.ix_(c, c)])))
+                if np.isfinite(val):
+                    vals.append(val)
+                    sizes.append(len(c))
+        net_met_val = float(np.average(vals, weights=sizes)) if len(vals) > 0 else np.nan
+    elif 'degree_assortativity_coefficient' in net_name:
+        # Assortativity is defined over the edges of G irrespective of its connectedness. Weights are rescaled to
+        # integers, which weighted assortativity requires in older versions of NetworkX.
+        H = G.copy()
+        for u, v, d in H.edges(data=True):
+            d['weight'] = int(np.round(100 * d['weight'], 1))
         try:
-            net_met_val = float(i(G))
+            net_met_val = float(i(H))
         except:
             try:
-                [H, _] = prune_disconnected(G)
-                net_met_val = float(i(H))
+                from networkx.algorithms.assortativity import degree_pearson_correlation_coefficient
+                net_met_val = float(degree_pearson_correlation_coefficient(H, weight='weight'))
             except:
                 print(f"{'WARNING: '}{net_name}{' failed for G.'}")
-                # np.save(f"{'/tmp/smallworldness'}{random.randint(1, 400)}{'.npy'}",
-                #         np.array(nx.to_numpy_matrix(H)))
-    elif 'degree_assortativity_coefficient' in net_name:
-            H = G.copy()
-            for u, v, d in H.edges(data=True):
-                H[u][v]['weight'] = int(np.round(100*H[u][v]['weight'], 1))
-            try:
-                net_met_val = float(i(H))
-            except:
-                try:
-                    [H, _] = prune_disconnected(H)
-                    net_met_val = float(i(H))
-                except:
-                    try:
-                        from networkx.algorithms.assortativity import degree_pearson_correlation_coefficient
-                        net_met_val = float(degree_pearson_correlation_coefficient(H, weight='weight'))
-                    except:
-                        print(f"{'WARNING: '}{net_name}{' failed for G.'}")
-                        # np.save(f"{'/tmp/degree_assortativity_coefficient'}{random.randint(1, 400)}{'.npy'}",
-                        #         np.array(nx.to_numpy_matrix(H)))
+                net_met_val = np.nan
     else:
         net_met_val = float(i(G))
 
     return net_met_val
 
 
+class SparseGraph(object):
+    """
+    A Class for holding an undirected graph as a scipy.sparse CSR matrix.
+
+    Binarized and connection-length variants are views that share the index arrays of the
+    weighted matrix (each costing only one array of edge values), while dense and NetworkX
+    representations are only built, once, for metrics that require them. Connection-length
+    variants are computed once per transform and cached.
+
+    Parameters
+    ----------
+    W : NxN np.ndarray or scipy.sparse matrix
+        Undirected connectivity matrix. Sparse input is used without copying.
+    eliminate_zeros : bool
+        Whether to drop explicitly stored zeros of sparse input, which connection-length matrices keep as
+        zero-length edges. Default is True.
+
+    """
+
+    def __init__(self, W, eliminate_zeros=True):
+        from scipy import sparse
+        if sparse.issparse(W):
+            self.W = W.tocsr()
+            if self.W.dtype != np.float64:
+                self.W = self.W.astype(np.float64)
+        else:
+            self.W = sparse.csr_matrix(np.asarray(W, dtype=np.float64))
+        if eliminate_zeros is True:
+            self.W.eliminate_zeros()
+        self._dense = None
+        self._G = None
+        self._lengths = {}
+
+    @property
+    def shape(self):
+        return self.W.shape
+
+    def number_of_nodes(self):
+        return self.W.shape[0]
+
+    def number_of_edges(self):
+        # Self-loops are stored once, all other edges twice
+        loops = np.count_nonzero(self.W.diagonal())
+        return int((self.W.nnz - loops) / 2 + loops)
+
+    def _view(self, data):
+        from scipy import sparse
+        # Bypasses __init__, since eliminating (e.g. zero-length) entries would modify the shared index arrays
+        view = SparseGraph.__new__(SparseGraph)
+        view.W = sparse.csr_matrix((data, self.W.indices, self.W.indptr), shape=self.W.shape, copy=False)
+        view._dense = None
+        view._G = None
+        view._lengths = {}
+        return view
+
+    def binarized(self):
+        return self._view(np.ones_like(self.W.data))
+
+    def lengths(self, transform='inverse'):
+        """
+        Connection-length graph, for one of the transforms of thresholding.length_matrix.
+        """
+        if transform not in self._lengths:
+            self._lengths[transform] = self._view(thresholding.length_matrix(self.W, transform=transform).data)
+        return self._lengths[transform]
+
+    def toarray(self):
+        # Note that zero-length edges of connection-length graphs are indistinguishable from absent edges when dense
+        if self._dense is None:
+            self._dense = self.W.toarray()
+        return self._dense
+
+    def to_networkx(self):
+        if self._G is None:
+            try:
+                self._G = nx.from_scipy_sparse_array(self.W)
+            except AttributeError:
+                self._G = nx.from_scipy_sparse_matrix(self.W)
+        return self._G
+
+    @classmethod
+    def from_networkx(cls, G):
+        try:
+            W = nx.to_scipy_sparse_array(G, weight='weight', format='csr')
+        except AttributeError:
+            W = nx.to_scipy_sparse_matrix(G, weight='weight', format='csr')
+        return cls(W)
+
+
 class CleanGraphs(object):
     """
     A Class for cleaning graphs in preparation for network analysis.
@@ -957,6 +1762,9 @@ class CleanGraphs(object):
         Indicates whether to prune final graph of disconnected nodes/isolates.
     norm : int
         Indicates method of normalizing resulting graph.
+    conn_matrix : NxN np.ndarray or scipy.sparse matrix
+        Optional thresholded graph, cleaned in place of the graph saved at est_path, in which case the pruned
+        graph is not saved. Default is None.
 
     Returns
     -------
@@ -974,7 +1782,7 @@ class CleanGraphs(object):
 
     """
 
-    def __init__(self, thr, conn_model, est_path, prune, norm, out_fmt='edgelist_ssv'):
+    def __init__(self, thr, conn_model, est_path, prune, norm, out_fmt='edgelist_ssv', conn_matrix=None):
         from pynets.core import utils
         self.thr = thr
         self.conn_model = conn_model
@@ -982,22 +1790,43 @@ class CleanGraphs(object):
         self.prune = prune
         self.norm = norm
         self.out_fmt = out_fmt
-        self.in_mat = None
 
         # Load and threshold matrix
-        self.in_mat_raw = utils.load_mat(self.est_path)
+        if conn_matrix is None:
+            self.in_mat_raw = utils.load_mat_sparse(self.est_path)
+        else:
+            self.in_mat_raw = utils.undirected_mat_sparse(conn_matrix)
 
         # De-diagnal and remove nan's and inf's, ensure edge weights are positive
-        self.in_mat = np.array(np.array(thresholding.autofix(np.abs(self.in_mat_raw))))
+        self.graph = SparseGraph(thresholding.autofix(abs(self.in_mat_raw)))
+
+        # Indices of the nodes of the thresholded graph that remain after pruning
+        self.nodes = np.arange(self.graph.shape[0])
+
+    @property
+    def in_mat(self):
+        # Dense matrix, only built on request
+        return self.graph.toarray()
 
-        # Load numpy matrix as networkx graph
-        self.G = nx.from_numpy_array(self.in_mat)
+    @in_mat.setter
+    def in_mat(self, in_mat):
+        self.graph = SparseGraph(in_mat)
+
+    @property
+    def G(self):
+        # NetworkX graph, only built on request
+        return self.graph.to_networkx()
+
+    @G.setter
+    def G(self, G):
+        self.graph = SparseGraph.from_networkx(G)
 
     def normalize_graph(self):
+        W = self.graph.W.copy()
 
         # Get hyperbolic tangent (i.e. fischer r-to-z transform) of matrix if non-covariance
         if (self.conn_model == 'corr') or (self.conn_model == 'partcorr'):
-            self.in_mat = np.arctanh(self.in_mat)
+            W.data = np.arctanh(W.data)
 
         # Normalize connectivity matrix
         if self.norm == 3 or self.norm == 4 or self.norm == 5:
@@ -1005,94 +1834,825 @@ class CleanGraphs(object):
 
         # By maximum edge weight
         if self.norm == 1:
-            self.in_mat = thresholding.normalize(np.nan_to_num(self.in_mat))
+            W.data = np.nan_to_num(W.data)
+            if W.nnz > 0:
+                W.data /= np.max(np.abs(W.data))
         # Apply log10
         elif self.norm == 2:
-            self.in_mat = np.log10(np.nan_to_num(self.in_mat))
+            W.data = np.log10(np.nan_to_num(W.data))
         # Apply PTR simple-nonzero
         elif self.norm == 3:
-            self.in_mat = pass_to_ranks(np.nan_to_num(self.in_mat), method="simple-nonzero")
+            W = pass_to_ranks(np.nan_to_num(W.toarray()), method="simple-nonzero")
         # Apply PTR simple-all
         elif self.norm == 4:
-            self.in_mat = pass_to_ranks(np.nan_to_num(self.in_mat), method="simple-all")
+            W = pass_to_ranks(np.nan_to_num(W.toarray()), method="simple-all")
         # Apply PTR zero-boost
         elif self.norm == 5:
-            self.in_mat = pass_to_ranks(np.nan_to_num(self.in_mat), method="zero-boost")
+            W = pass_to_ranks(np.nan_to_num(W.toarray()), method="zero-boost")
         # Apply standardization [0, 1]
         elif self.norm == 6:
-            self.in_mat = thresholding.standardize(np.nan_to_num(self.in_mat))
+            W = thresholding.standardize(np.nan_to_num(W.toarray()))
         else:
             pass
 
-        self.in_mat = thresholding.autofix(self.in_mat)
-        self.G = nx.from_numpy_array(self.in_mat)
+        self.graph = SparseGraph(thresholding.autofix(W))
 
-        return self.G
+        return self.graph
 
     def prune_graph(self):
         from pynets.core import utils
-        from graspy.utils import remove_loops, symmetrize, get_lcc
+        from scipy.sparse import csgraph
 
         # Prune irrelevant nodes (i.e. nodes who are fully disconnected
         # from the graph and/or those whose betweenness
         # centrality are > 3 standard deviations below the mean)
-        if int(self.prune) == 1:
-            if nx.is_connected(self.G) is False:
-                print('Graph fragmentation detected...\n')
-            [self.G, _] = prune_disconnected(self.G)
+        W = self.graph.W
+        if int(self.prune) == 1 or int(self.prune) == 3:
+            n_components, labels = csgraph.connected_components(W, directed=False)
+            if int(self.prune) == 1:
+                if n_components > 1:
+                    print('Graph fragmentation detected...\n')
+                print('Pruning disconnected...')
+            else:
+                print('Pruning all but the largest connected component subgraph...')
+            keep = np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+            W = W[keep][:, keep]
+            self.nodes = self.nodes[keep]
         elif int(self.prune) == 2:
             print('Pruning by node centrality...')
-            [self.G, _] = most_important(self.G)
-        elif int(self.prune) == 3:
-            print('Pruning all but the largest connected component subgraph...')
-            self.G = self.G.subgraph(get_lcc(self.G))
+            [G, _] = most_important(self.G)
+            W = SparseGraph.from_networkx(G).W
+            self.nodes = self.nodes[list(G.nodes())]
         else:
             print('Graph is connected...')
 
-        self.in_mat = symmetrize(remove_loops(nx.to_numpy_matrix(self.G)))
+        self.graph = SparseGraph(thresholding.autofix(W))
 
-        self.in_mat = thresholding.autofix(self.in_mat)
-
-        self.G = nx.from_numpy_array(self.in_mat)
-
-        # Saved pruned
-        if (self.prune != 0) and (self.prune is not None):
+        # Saved pruned, unless cleaning a graph that was passed in rather than loaded
+        final_mat_path = None
+        if self.est_path is None:
+            print('Source File: None')
+        elif (self.prune != 0) and (self.prune is not None):
             final_mat_path = f"{self.est_path.split('.npy')[0]}{'_pruned_mat'}"
-            utils.save_mat(self.in_mat, final_mat_path, self.out_fmt)
+            utils.save_mat(self.graph.W, final_mat_path, self.out_fmt)
             print(f"{'Source File: '}{final_mat_path}")
         else:
             print(f"{'Source File: '}{self.est_path}")
-        return self.in_mat, final_mat_path
+        return self.graph.W, final_mat_path
 
     def print_summary(self):
         print(f"\n\nThreshold: {100 * float(self.thr):.2f}%")
 
-        info_list = list(nx.info(self.G).split('\n'))[2:]
-        for i in info_list:
-            print(i)
+        n_nodes = self.graph.number_of_nodes()
+        n_edges = self.graph.number_of_edges()
+        print(f"Number of nodes: {n_nodes}")
+        print(f"Number of edges: {n_edges}")
+        if n_nodes > 0:
+            print(f"Average degree: {2 * n_edges / n_nodes:8.4f}")
         return
 
     def binarize_graph(self):
-        from pynets.core import thresholding
-        in_mat_bin = thresholding.binarize(self.in_mat)
+        graph_bin = self.graph.binarized()
+        return graph_bin.toarray(), graph_bin.to_networkx()
+
+    def create_length_matrix(self, transform='inverse'):
+        # Lengths are kept sparse, since zero-length edges (e.g. of the 'neglog' transform) would be lost when dense
+        graph_len = self.graph.lengths(transform=transform)
+        return graph_len.W, graph_len.to_networkx()
+
+
+def _brandes_dependencies(adjacency, D, max_elements=2 ** 22):
+    """
+    Pair dependencies of each node on shortest paths from each of a set of source nodes (Brandes, 2001).
+
+    Shortest paths from a batch of sources are processed together, one distance level at a time, such
+    that counting shortest paths (forward) and accumulating pair dependencies (backward) each reduce to
+    one sparse matrix product per level of the batch.
+
+    Parameters
+    ----------
+    adjacency : NxN np.ndarray or scipy.sparse matrix
+        Adjacency matrix of an undirected graph.
+    D : SxN np.ndarray
+        Hop distances from each of S source nodes, with the source itself at distance 0.
+    max_elements : int
+        Maximum size of the SxN arrays of a batch of sources. Default is 2 ** 22.
+
+    Returns
+    -------
+    dependencies : SxN np.ndarray
+        Dependencies of each node on each source node.
+
+    """
+    from scipy import sparse
+
+    A = sparse.csr_matrix(adjacency != 0, dtype=np.float64)
+    D = np.asarray(D)
+    dependencies = np.zeros(D.shape)
+    batch_size = max(1, int(max_elements // max(D.shape[1], 1)))
+    for start in range(0, D.shape[0], batch_size):
+        Db = D[start:start + batch_size]
+        n_levels = int(np.max(Db[np.isfinite(Db)], initial=0))
+        # Number of shortest paths from each source to each node
+        sigma = (Db == 0).astype(np.float64)
+        for level in range(1, n_levels + 1):
+            frontier = Db == level
+            sigma[frontier] = (A @ (sigma * (Db == level - 1)).T).T[frontier]
+        delta = dependencies[start:start + batch_size]
+        for level in range(n_levels, 1, -1):
+            coef = np.divide(1 + delta, sigma, out=np.zeros_like(sigma), where=Db == level)
+            predecessors = Db == level - 1
+            delta[predecessors] += (sigma * (A @ coef.T).T)[predecessors]
+    return dependencies
+
+
+def approximate_betweenness_centrality(adjacency, epsilon=0.05, delta=0.1, seed=42, D=None):
+    """
+    Normalized (hop-count) betweenness centrality, estimated from shortest paths out of a random sample of
+    pivot nodes.
+
+    Pivots are sampled uniformly (with replacement) in batches of doubling size, with each batch of
+    shortest paths computed at once. After each batch, an empirical Bernstein bound on the error of
+    every node's estimate is computed from the sample variance of its dependencies, with a union bound
+    over nodes and batches, and sampling stops once that bound is no greater than epsilon. If the sample
+    would reach N pivots, betweenness is instead computed exactly from every node.
+
+    Parameters
+    ----------
+    adjacency : NxN np.ndarray or scipy.sparse matrix
+        Adjacency (or length) matrix of an undirected graph.
+    epsilon : float
+        Maximum absolute error of the normalized estimates. Default is 0.05.
+    delta : float
+        Probability that any estimate exceeds its bound. Default is 0.1.
+    seed : int
+        Seed of the pivot sample. Default is 42.
+    D : NxN np.ndarray
+        Optional precomputed hop distance matrix, from which pivot rows are taken rather than computed.
+
+    Returns
+    -------
+    bc : dict
+        Estimated betweenness centrality of each node.
+    bound : float
+        Error bound achieved with probability 1 - delta, which is 0 for exact values.
+
+    References
+    ----------
+    .. [1] Brandes, U., & Pich, C. (2007). Centrality estimation in large
+      networks. International Journal of Bifurcation and Chaos, 17(07), 2303-2318.
+    .. [2] Maurer, A., & Pontil, M. (2009). Empirical Bernstein bounds and
+      sample variance penalization. Proceedings of COLT 2009.
+
+    """
+    from scipy import sparse
+    from scipy.sparse.csgraph import shortest_path
+
+    N = adjacency.shape[0]
+    if N <= 2:
+        return dict.fromkeys(range(N), 0.0), 0.0
+
+    def dependencies(pivots):
+        if D is None:
+            D_pivots = shortest_path(sparse.csr_matrix(adjacency), directed=False, unweighted=True, indices=pivots)
+        else:
+            D_pivots = D[pivots]
+        # Each pivot's (rescaled) dependencies are an unbiased estimate of normalized betweenness, within [0, R]
+        return _brandes_dependencies(adjacency, D_pivots) * N / ((N - 1) * (N - 2))
+
+    R = N / (N - 1)
+    n_looks = int(np.ceil(np.log2(N))) + 1
+    log_term = np.log(4 * N * n_looks / delta)
+    # The bound cannot fall below epsilon with fewer pivots than this
+    n_pivots = int(np.ceil(7 * R * log_term / (3 * epsilon))) + 1
+
+    rng = np.random.RandomState(seed)
+    total = np.zeros(N)
+    total_sq = np.zeros(N)
+    n = 0
+    while n_pivots < N:
+        pivots, counts = np.unique(rng.randint(N, size=n_pivots - n), return_counts=True)
+        X = dependencies(pivots)
+        total += counts @ X
+        total_sq += counts @ np.square(X)
+        n = n_pivots
+        var = np.maximum(total_sq - np.square(total) / n, 0) / (n - 1)
+        bound = float(np.max(np.sqrt(2 * var * log_term / n) + 7 * R * log_term / (3 * (n - 1))))
+        if bound <= epsilon:
+            return dict(enumerate(total / n)), bound
+        n_pivots = 2 * n_pivots
+
+    return dict(enumerate(dependencies(np.arange(N)).sum(axis=0) / N)), 0.0
+
+
+def leading_eigenvectors(A):
+    """
+    Non-negative, unit-norm leading eigenvectors of one or a stack of symmetric adjacency matrices.
+
+    Parameters
+    ----------
+    A : NxN or GxNxN np.ndarray
+        Symmetric adjacency matrix, or a stack of them.
+
+    Returns
+    -------
+    v : N or GxN np.ndarray
+        Leading eigenvector of each matrix, which is uniform for matrices without edges (as returned by
+        nx.eigenvector_centrality).
+
+    """
+    A = np.asarray(A, dtype=np.float64)
+    N = A.shape[-1]
+    if N == 0:
+        return np.zeros(A.shape[:-1])
+    _, V = np.linalg.eigh(A)
+    # The leading eigenvector of a connected graph has entries of a single (arbitrary) sign
+    v = np.abs(V[..., -1])
+    return np.where(np.any(A != 0, axis=(-2, -1))[..., None], v, 1 / np.sqrt(N))
+
+
+class MetricPlan(object):
+    """
+    A Class for sharing intermediate computations across the graph metrics of a single graph.
+
+    Each intermediate (i.e. the weighted and hop-count all-pairs shortest path matrices, the
+    weighted and binary per-node triangle counts, node degrees and connected components) is
+    computed once, on first request, and every supported metric is derived from those cached
+    intermediates rather than re-traversing the graph. Requests and computations are counted per
+    intermediate so that the amount of duplicated work eliminated can be reported.
+
+    Parameters
+    ----------
+    in_mat : NxN np.ndarray or scipy.sparse matrix
+        Undirected connectivity matrix, whose weights are treated as connection lengths for
+        shortest paths (as with NetworkX's weight='weight').
+    cache : dict
+        Optional dictionary of precomputed intermediates (e.g. those of another MetricPlan of
+        the same matrix), keyed by intermediate name.
+
+    References
+    ----------
+    .. [1] Brandes, U. (2001). A faster algorithm for betweenness centrality.
+      Journal of Mathematical Sociology, 25(2), 163-177.
+    .. [2] Onnela, J.-P., Saramaki, J., Kertesz, J., & Kaski, K. (2005).
+      Intensity and coherence of motifs in weighted complex networks.
+      Physical Review E, 71(6), 065103.
+
+    """
+
+    # Intermediates required by each supported metric, keyed by metric name
+    DEPENDENCIES = {'global_efficiency': ('distances',),
+                    'average_shortest_path_length': ('distances',),
+                    'average_clustering': ('weighted_triangles', 'degrees'),
+                    'weighted_transitivity': ('weighted_triangles', 'degrees'),
+                    'transitivity': ('triangles', 'degrees'),
+                    'local_clustering': ('triangles', 'degrees'),
+                    'degree_centrality': ('degrees',),
+                    'betweenness_centrality': ('hop_distances',),
+                    'eigenvector_centrality': ('leading_eigenvector',)}
+
+    def __init__(self, in_mat, cache=None):
+        from scipy import sparse
+        self.in_mat = sparse.csr_matrix(in_mat, dtype=np.float64, copy=True)
+        if self.in_mat.diagonal().any():
+            self.in_mat.setdiag(0)
+        self.in_mat.eliminate_zeros()
+        self.adjacency = self.in_mat.astype(bool)
+        self.cache = dict(cache) if cache is not None else {}
+        self.requests = dict.fromkeys(self.cache, 0)
+        self.computations = dict.fromkeys(self.cache, 0)
+        self.timings = dict.fromkeys(self.cache, 0)
+
+    def _compute(self, name):
+        if name == 'distances':
+            return shortest_path_lengths(self.in_mat, weighted=True)
+        elif name == 'hop_distances':
+            return shortest_path_lengths(self.in_mat, weighted=False)
+        elif name == 'degrees':
+            return np.diff(self.in_mat.indptr)
+        elif name == 'triangles':
+            A = self.adjacency.astype(np.float64)
+            return np.asarray(A.multiply(A @ A).sum(axis=1)).ravel()
+        elif name == 'weighted_triangles':
+            Wc = abs(self.in_mat)
+            if Wc.nnz > 0:
+                Wc.data = np.cbrt(Wc.data / np.max(Wc.data))
+            return np.asarray(Wc.multiply(Wc @ Wc).sum(axis=1)).ravel()
+        elif name == 'leading_eigenvector':
+            return leading_eigenvectors(self.adjacency.toarray())
+        elif name == 'components':
+            return connected_component_indices(self.adjacency)
+        else:
+            raise KeyError(f"Unknown intermediate: {name}")
+
+    def get(self, name):
+        """
+        Return a shared intermediate, computing it only if it has not already been computed.
+        """
+        import time
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if name not in self.cache:
+            start_time = time.time()
+            self.cache[name] = self._compute(name)
+            self.computations[name] = self.computations.get(name, 0) + 1
+            self.timings[name] = time.time() - start_time
+        return self.cache[name]
+
+    def precompute(self, metric_list):
+        """
+        Compute every intermediate required by the supported metrics of metric_list.
+        """
+        for name in sorted({i for metric in metric_list for i in self.DEPENDENCIES.get(metric, ())}):
+            if name not in self.cache:
+                self.cache[name] = self._compute(name)
+                self.computations[name] = self.computations.get(name, 0) + 1
+        return self.cache
+
+    def supports(self, metric):
+        return metric in self.DEPENDENCIES
+
+    def global_efficiency(self, weighted=True):
+        N = self.in_mat.shape[0]
+        if N < 2:
+            return 0
+        with np.errstate(divide='ignore'):
+            inv = 1 / self.get('distances' if weighted else 'hop_distances')
+        inv[~np.isfinite(inv)] = 0
+        np.fill_diagonal(inv, 0)
+        return np.sum(inv) / (N * (N - 1))
+
+    def average_shortest_path_length(self, weighted=True):
+        # Averaged over the connected node pairs of every component when G is fragmented, as in raw_mets
+        D = self.get('distances' if weighted else 'hop_distances')
+        finite = np.isfinite(D)
+        pairs = np.count_nonzero(finite) - D.shape[0]
+        if pairs == 0:
+            raise nx.NetworkXPointlessConcept('Path length is undefined for fewer than two connected nodes.')
+        return np.sum(D[finite]) / pairs
+
+    def _clustering(self, weighted):
+        tri = self.get('weighted_triangles' if weighted else 'triangles')
+        deg = self.get('degrees')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(deg > 1, tri / (deg * (deg - 1)), 0)
+
+    def average_clustering(self, weighted=True):
+        return np.mean(self._clustering(weighted)) if self.in_mat.shape[0] > 0 else 0
+
+    def _transitivity(self, weighted):
+        triangles = np.sum(self.get('weighted_triangles' if weighted else 'triangles'))
+        deg = self.get('degrees')
+        return 0 if triangles == 0 else triangles / np.sum(deg * (deg - 1))
+
+    def transitivity(self):
+        return self._transitivity(weighted=False)
+
+    def weighted_transitivity(self):
+        return self._transitivity(weighted=True)
+
+    def local_clustering(self):
+        return dict(enumerate(self._clustering(weighted=False)))
+
+    def degree_centrality(self):
+        N = self.in_mat.shape[0]
+        deg = self.get('degrees')
+        return dict(enumerate(deg / (N - 1) if N > 1 else np.ones(N)))
+
+    def betweenness_centrality(self):
+        """
+        Normalized (hop-count) betweenness centrality, equivalent to
+        nx.betweenness_centrality(G, normalized=True).
+        """
+        N = self.adjacency.shape[0]
+        bc = _brandes_dependencies(self.adjacency, self.get('hop_distances')).sum(axis=0)
+        if N > 2:
+            bc = bc / ((N - 1) * (N - 2))
+        return dict(enumerate(bc))
+
+    def eigenvector_centrality(self):
+        """
+        Eigenvector centrality of the binarized graph, equivalent to nx.eigenvector_centrality(G) on
+        connected graphs.
+        """
+        return dict(enumerate(self.get('leading_eigenvector')))
+
+    def approximate_betweenness_centrality(self, epsilon=0.05, delta=0.1, seed=42):
+        """
+        Normalized (hop-count) betweenness centrality, estimated from a sample of pivot nodes (see
+        approximate_betweenness_centrality), from the hop distance matrix if it has already been computed.
+        """
+        return approximate_betweenness_centrality(self.adjacency, epsilon=epsilon, delta=delta, seed=seed,
+                                                  D=self.cache.get('hop_distances'))
+
+    def metric(self, name, weighted=True):
+        """
+        Return a supported global metric by name.
+        """
+        if name in ('global_efficiency', 'average_shortest_path_length', 'average_clustering'):
+            return getattr(self, name)(weighted=weighted)
+        return getattr(self, name)()
+
+    def report(self, metric_list=None):
+        """
+        Report the shared-intermediate computations that were (or, for metric_list, would be)
+        eliminated relative to computing each metric independently.
+
+        Parameters
+        ----------
+        metric_list : list
+            Optional list of metric names (e.g. as parsed from global_graph_measures.yaml and
+            nodal_graph_measures.yaml). If None, the requests made of this plan are reported.
+
+        Returns
+        -------
+        df : DataFrame
+            One row per intermediate, with the number of times it is needed, the number of times
+            it was computed, the number of computations eliminated, and for the executed plan,
+            the approximate time saved in seconds.
+
+        """
+        if metric_list is not None:
+            needed = {}
+            for metric in metric_list:
+                for name in self.DEPENDENCIES.get(metric, ()):
+                    needed[name] = needed.get(name, 0) + 1
+            computed = dict.fromkeys(needed, 1)
+            timings = dict.fromkeys(needed, np.nan)
+        else:
+            needed = self.requests
+            computed = self.computations
+            timings = self.timings
+        df = pd.DataFrame({'intermediate': list(needed.keys()),
+                           'needed': [needed[i] for i in needed],
+                           'computed': [computed.get(i, 0) for i in needed]})
+        df['eliminated'] = df['needed'] - df['computed']
+        df['seconds_saved'] = [timings.get(i, np.nan) for i in needed] * df['eliminated']
+        print(f"\nShared intermediates: {int(df['needed'].sum())} requested, {int(df['computed'].sum())} computed, "
+              f"{int(df['eliminated'].sum())} duplicate computations eliminated")
+        return df
+
+
+# Minimum number of graphs sharing an atlas for NetworkAnalysis to be run in batch mode (see extractnetstats_batch)
+BATCH_MIN_GRAPHS = 4
+
+# Intermediates of MetricPlan that are computed for a stack of graphs at once by batch_plan_intermediates
+BATCH_INTERMEDIATES = ('degrees', 'triangles', 'weighted_triangles', 'leading_eigenvector')
+
+# Metrics computed by batch_graph_metrics, keyed by name, with whether each is nodal or global
+BATCH_METRICS = {'degree': 'nodal', 'strength': 'nodal', 'local_clustering': 'nodal',
+                 'eigenvector_centrality': 'nodal', 'average_clustering': 'global', 'global_efficiency': 'global',
+                 'modularity': 'global'}
+
+
+def _zero_diagonal_stack(stack):
+    W = np.array(stack, dtype=np.float64)
+    idx = np.arange(W.shape[-1])
+    W[:, idx, idx] = 0
+    return W
+
+
+def batch_plan_intermediates(stack, metric_list=None):
+    """
+    Compute the shared intermediates of MetricPlan for a stack of graphs at once, with batched matrix
+    products and a batched symmetric eigensolver.
+
+    Shortest path lengths, which do not batch efficiently, are not included and are left to be
+    computed by each graph's plan on request.
+
+    Parameters
+    ----------
+    stack : GxNxN np.ndarray
+        Stack of G undirected connectivity matrices of the same size.
+    metric_list : list
+        Optional list of metric names, such that only the intermediates they depend on are computed.
+        Default is None, which computes all of BATCH_INTERMEDIATES.
+
+    Returns
+    -------
+    caches : list
+        Dictionary of intermediates of each graph, for use as the cache of its MetricPlan.
 
-        # Load numpy matrix as networkx graph
-        G_bin = nx.from_numpy_array(in_mat_bin)
-        return in_mat_bin, G_bin
+    """
+    W = _zero_diagonal_stack(stack)
+    if metric_list is None:
+        names = set(BATCH_INTERMEDIATES)
+    else:
+        names = {i for metric in metric_list for i in MetricPlan.DEPENDENCIES.get(metric, ())} & \
+            set(BATCH_INTERMEDIATES)
+
+    A = (W != 0).astype(np.float64)
+    intermediates = {}
+    if 'degrees' in names:
+        intermediates['degrees'] = np.count_nonzero(W, axis=-1)
+    if 'triangles' in names:
+        intermediates['triangles'] = np.sum(A * (A @ A), axis=-1)
+    if 'weighted_triangles' in names:
+        Wc = np.abs(W)
+        scale = np.max(Wc, axis=(-2, -1), keepdims=True)
+        Wc = np.cbrt(np.divide(Wc, scale, out=np.zeros_like(Wc), where=scale > 0))
+        intermediates['weighted_triangles'] = np.sum(Wc * (Wc @ Wc), axis=-1)
+    if 'leading_eigenvector' in names:
+        intermediates['leading_eigenvector'] = leading_eigenvectors(A)
+    return [{name: val[g] for name, val in intermediates.items()} for g in range(W.shape[0])]
+
+
+def _modularity_stack(W, ci):
+    """
+    Modularity of the partition of each graph of a stack, equivalent to community.modularity.
+    """
+    ci = np.broadcast_to(np.asarray(ci), W.shape[:2])
+    Kc, _ = _module_strengths(W, ci)
+    own = np.array([np.unique(ci_, return_inverse=True)[1].ravel() for ci_ in ci])
+    # Twice the within-community weight, and the total strength of each community
+    within = np.sum(np.take_along_axis(Kc, own[..., None], axis=-1), axis=(-2, -1))
+    community_strength = np.sum(Kc, axis=-2)
+    two_m = np.sum(W, axis=(-2, -1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(two_m > 0, within / two_m - np.sum(community_strength ** 2, axis=-1) / two_m ** 2, np.nan)
+
+
+def batch_graph_metrics(stack, metric_list=None, ci=None, weighted=True):
+    """
+    Compute graph metrics of a stack of same-atlas graphs at once.
+
+    Degrees, strengths and clustering coefficients are computed with batched matrix products,
+    eigenvector centralities with a batched symmetric eigensolver, and modularity with a single
+    product of each graph with its community indicator matrix. Communities are detected per graph
+    with community_resolution_selection, unless given.
+
+    Parameters
+    ----------
+    stack : GxNxN np.ndarray
+        Stack of G undirected connectivity matrices of the same size, whose weights are treated as
+        connection lengths for global efficiency (as in MetricPlan).
+    metric_list : list
+        Names of metrics to compute, from BATCH_METRICS. Default is None, which computes all of them.
+    ci : Nx1 or GxN np.ndarray
+        Community affiliation vector, shared by or specific to each graph, for modularity.
+    weighted : bool
+        Whether average clustering and global efficiency are weighted. Default is True.
+
+    Returns
+    -------
+    df : DataFrame
+        One row per graph, metric and node (which is null for global metrics), with columns `graph`
+        (index into the stack), `metric`, `node` and `value`.
+
+    """
+    W = _zero_diagonal_stack(stack)
+    n_graphs, N = W.shape[:2]
+    if metric_list is None:
+        metric_list = list(BATCH_METRICS)
+    unknown = [i for i in metric_list if i not in BATCH_METRICS]
+    if unknown:
+        raise ValueError(f"Unsupported batch metrics: {unknown}")
+
+    # Only the intermediates of the requested metrics are computed, by way of their MetricPlan equivalents
+    plan_metrics = ['degree_centrality']
+    if 'local_clustering' in metric_list or ('average_clustering' in metric_list and weighted is False):
+        plan_metrics.append('local_clustering')
+    if 'average_clustering' in metric_list and weighted is True:
+        plan_metrics.append('average_clustering')
+    if 'eigenvector_centrality' in metric_list:
+        plan_metrics.append('eigenvector_centrality')
+    caches = batch_plan_intermediates(W, plan_metrics)
+    intermediates = {name: np.array([cache[name] for cache in caches]) for name in caches[0]} if caches else \
+        dict.fromkeys(BATCH_INTERMEDIATES, np.zeros((0, N)))
+    deg = intermediates['degrees']
+
+    values = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'degree' in metric_list:
+            values['degree'] = deg
+        if 'strength' in metric_list:
+            values['strength'] = np.sum(W, axis=-1)
+        if 'local_clustering' in metric_list:
+            values['local_clustering'] = np.where(deg > 1, intermediates['triangles'] / (deg * (deg - 1)), 0)
+        if 'eigenvector_centrality' in metric_list:
+            values['eigenvector_centrality'] = intermediates['leading_eigenvector']
+        if 'average_clustering' in metric_list:
+            tri = intermediates['weighted_triangles' if weighted else 'triangles']
+            values['average_clustering'] = np.mean(np.where(deg > 1, tri / (deg * (deg - 1)), 0), axis=-1)
+        if 'global_efficiency' in metric_list:
+            inv = 1 / np.array([shortest_path_lengths(W[g], weighted=weighted) for g in range(n_graphs)])
+            inv[~np.isfinite(inv)] = 0
+            inv[:, np.arange(N), np.arange(N)] = 0
+            values['global_efficiency'] = np.sum(inv, axis=(-2, -1)) / (N * (N - 1)) if N > 1 else \
+                np.zeros(n_graphs)
+    if 'modularity' in metric_list:
+        if ci is None:
+            ci = np.array([community_resolution_selection(nx.from_numpy_array(W[g]))[1] for g in range(n_graphs)])
+        values['modularity'] = _modularity_stack(W, ci)
+
+    frames = []
+    for metric in metric_list:
+        vals = np.asarray(values[metric], dtype=np.float64)
+        if BATCH_METRICS[metric] == 'nodal':
+            graph, node = np.divmod(np.arange(n_graphs * N), N)
+            frames.append(pd.DataFrame({'graph': graph, 'metric': metric, 'node': pd.array(node, dtype='Int32'),
+                                        'value': vals.ravel()}))
+        else:
+            frames.append(pd.DataFrame({'graph': np.arange(n_graphs), 'metric': metric,
+                                        'node': pd.array([None] * n_graphs, dtype='Int32'), 'value': vals}))
+    return pd.concat(frames, ignore_index=True).sort_values(['graph'], kind='stable').reset_index(drop=True)
+
+
+# Schema of the columnar netmetrics store, in which each row holds a single metric value of a thresholded graph.
+# Nodal values are keyed by their node (or degree level, for rich-club coefficients), while global metrics and
+# nodal averages have a null node. A model is identified by its graph's file name, less the threshold.
+NETMETS_SCHEMA = [('subject', 'string'), ('session', 'string'), ('modality', 'string'), ('atlas', 'string'),
+                  ('model', 'string'), ('thr', 'float64'), ('metric', 'string'), ('node', 'int32'),
+                  ('value', 'float32')]
+
+
+def _netmets_arrow_schema():
+    import pyarrow as pa
+    return pa.schema([(name, getattr(pa, dtype)()) for name, dtype in NETMETS_SCHEMA])
+
+
+def netmets_keys(ID, thr, est_path):
+    """
+    Identify a thresholded graph by the subject, session, modality, atlas, model and threshold columns of the
+    netmetrics store.
+
+    Parameters
+    ----------
+    ID : str
+        A subject id or other unique identifier.
+    thr : float
+        The threshold applied to the graph.
+    est_path : str
+        File path to the thresholded graph, saved as a numpy array in .npy format, within the
+        <subject>/<session>/<modality>/<atlas>/graphs directory of the run.
 
-    def create_length_matrix(self):
-        in_mat_len = thresholding.weight_conversion(self.in_mat, 'lengths')
+    Returns
+    -------
+    keys : dict
+        Values of the key columns of NETMETS_SCHEMA.
+
+    """
+    import re
+    import os.path as op
+    from pathlib import Path
+
+    path = Path(op.realpath(est_path))
+    stem = path.name.split('.npy')[0]
+    try:
+        thr = float(thr)
+    except (TypeError, ValueError):
+        thr = np.nan
 
-        # Load numpy matrix as networkx graph
-        G_len = nx.from_numpy_array(in_mat_len)
-        return in_mat_len, G_len
+    return {'subject': str(ID),
+            'session': next((part for part in path.parts if part.startswith('ses-')), None),
+            'modality': stem.split('modality-')[1].split('_')[0] if 'modality-' in stem else None,
+            'atlas': path.parent.parent.name,
+            'model': re.sub(r'_thr-[^_]+$', '', stem),
+            'thr': thr}
 
 
-def save_netmets(dir_path, est_path, metric_list_names, net_met_val_list_final):
+def netmets_records(metric_list_names, net_met_val_list_final, keys):
+    """
+    Convert named graph metric values to long-format rows of the netmetrics store.
+
+    Parameters
+    ----------
+    metric_list_names : list
+        Metric names, as produced by extractnetstats (e.g. `global_efficiency`, `12_local_efficiency`).
+    net_met_val_list_final : list
+        Metric values.
+    keys : dict
+        Values of the key columns of NETMETS_SCHEMA, as returned by netmets_keys.
+
+    Returns
+    -------
+    df : DataFrame
+        Rows of the netmetrics store, with the columns of NETMETS_SCHEMA.
+
+    """
+    names = pd.Series(metric_list_names, dtype='object').astype(str)
+    nodal = names.str.extract(r'^(\d+)_(.+)$')
+    df = pd.DataFrame({'metric': nodal[1].fillna(names),
+                       'node': pd.to_numeric(nodal[0]).astype('Int32'),
+                       'value': np.asarray(net_met_val_list_final, dtype='float32')})
+    for name, _ in reversed(NETMETS_SCHEMA[:6]):
+        df.insert(0, name, keys[name])
+    return df
+
+
+def netmets_to_wide(df):
+    """
+    Pivot rows of the netmetrics store to one row per graph, with columns named as in the netmetrics csv files.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Rows of the netmetrics store, as returned by read_netmets.
+
+    Returns
+    -------
+    df_wide : DataFrame
+        Metric values of each graph, indexed by its key columns.
+
+    """
+    keys = [name for name, _ in NETMETS_SCHEMA[:6] if name in df.columns]
+    node = df['node'].astype('Int64').astype(str)
+    df = df.assign(column=np.where(df['node'].isnull(), df['metric'], node + '_' + df['metric']))
+    df_wide = df.set_index(keys + ['column'])['value'].unstack('column')
+    df_wide = df_wide.reindex(columns=pd.unique(df['column']))
+    df_wide.columns.name = None
+    return df_wide
+
+
+def read_netmets(paths, columns=None, **filters):
+    """
+    Read rows of the netmetrics store, pushing column selection and filters down to the parquet scan, so that only
+    matching row groups are decoded.
+
+    Parameters
+    ----------
+    paths : str or list
+        Parquet files of the store, or directories containing them.
+    columns : list
+        Optional subset of columns to read. Default is None, which reads all columns.
+    filters : dict
+        Column values to match. Each value may be a scalar, a list of accepted values, or None to select
+        null values (e.g. node=None reads global metrics only).
+
+    Returns
+    -------
+    df : DataFrame
+        Matching rows of the netmetrics store.
+
+    """
+    import glob
+    import os.path as op
+    import pyarrow.dataset as ds
+
+    files = []
+    for path in ([paths] if isinstance(paths, str) else list(paths)):
+        files.extend(sorted(glob.glob(f"{path}/*.parquet")) if op.isdir(path) else [path])
+
+    expression = None
+    for column, value in filters.items():
+        if value is None:
+            condition = ds.field(column).is_null()
+        elif isinstance(value, (list, tuple, set, np.ndarray)):
+            condition = ds.field(column).isin(list(value))
+        else:
+            condition = ds.field(column) == value
+        expression = condition if expression is None else expression & condition
+
+    dataset = ds.dataset(files, schema=_netmets_arrow_schema(), format='parquet')
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def save_netmets(dir_path, est_path, metric_list_names, net_met_val_list_final, keys=None):
+    """
+    Save graph metrics, either to the columnar netmetrics store or to a one-row csv file.
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the directory containing the thresholded graph.
+    est_path : str
+        File path to the thresholded graph, saved as a numpy array in .npy format.
+    metric_list_names : list
+        Metric names.
+    net_met_val_list_final : list
+        Metric values.
+    keys : dict
+        Values of the key columns of NETMETS_SCHEMA, as returned by netmets_keys. If provided, metrics are
+        appended to the netmetrics.parquet store of the netmetrics directory, as a parquet file of their own.
+        Otherwise, or if pyarrow is unavailable, metrics are saved to a csv file. Default is None.
+
+    Returns
+    -------
+    out_path : str
+        Path to the saved parquet or csv file.
+
+    """
+    import os
+    import os.path as op
     from pynets.core import utils
 
+    csv_path = utils.create_csv_path(dir_path, est_path)
+
+    if keys is not None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print('pyarrow is unavailable. Saving graph metrics to csv...')
+        else:
+            store_path = f"{op.dirname(csv_path)}/netmetrics.parquet"
+            os.makedirs(store_path, exist_ok=True)
+            out_path = f"{store_path}/{op.basename(est_path).split('.npy')[0]}.parquet"
+            df = netmets_records(metric_list_names, net_met_val_list_final, keys)
+            pq.write_table(pa.Table.from_pandas(df, schema=_netmets_arrow_schema(), preserve_index=False), out_path)
+            return out_path
+
     # And save results to csv
-    out_path_neat = f"{utils.create_csv_path(dir_path, est_path).split('.csv')[0]}{'_neat.csv'}"
+    out_path_neat = f"{csv_path.split('.csv')[0]}{'_neat.csv'}"
     zipped_dict = dict(zip(metric_list_names, net_met_val_list_final))
     df = pd.DataFrame.from_dict(zipped_dict, orient='index', dtype='float32').transpose()
     df.to_csv(out_path_neat, index=False)
@@ -1101,18 +2661,26 @@ def save_netmets(dir_path, est_path, metric_list_names, net_met_val_list_final):
     return out_path_neat
 
 
-def iterate_nx_global_measures(G, metric_list_glob):
+def iterate_nx_global_measures(G, metric_list_glob, plan=None):
     import time
     # import random
     num_mets = len(metric_list_glob)
     net_met_arr = np.zeros([num_mets, 2], dtype='object')
+    components = None
     j = 0
     for i in metric_list_glob:
         start_time = time.time()
         net_met = str(i).split('<function ')[1].split(' at')[0]
         try:
             try:
-                net_met_val = raw_mets(G, i)
+                if plan is not None and plan.supports(net_met):
+                    net_met_val = float(plan.metric(net_met, weighted=_metric_weight(i) is not None))
+                else:
+                    # G is decomposed into its connected components once, for all of its metrics
+                    if components is None:
+                        components = plan.get('components') if plan is not None else \
+                            connected_component_indices(G)
+                    net_met_val = raw_mets(G, i, components=components)
             except:
                 print(f"{'WARNING: '}{net_met}{' failed for G.'}")
                 # np.save("%s%s%s%s" % ('/tmp/', net_met, random.randint(1, 400), '.npy'),
@@ -1139,45 +2707,273 @@ def iterate_nx_global_measures(G, metric_list_glob):
     return net_met_val_list, metric_list_names
 
 
-def community_resolution_selection(G):
+_COMMUNITY_CACHE = {}
+_louvain_G = None
+
+
+def _init_louvain_worker(G):
+    global _louvain_G
+    _louvain_G = G
+
+
+def _louvain_seed(args):
+    """
+    Run a single seeded Louvain optimization, optionally warm-started from an initial partition by optimizing
+    the graph induced by its communities.
+    """
     import community
-    resolution = 1
-    ci = np.array(list(community.best_partition(G, resolution=resolution).values()))
-    num_comms = len(np.unique(ci))
-    if num_comms == 1:
-        resolution = 10
-        tries = 0
-        while num_comms == 1:
-            ci = np.array(list(community.best_partition(G, resolution=resolution).values()))
-            num_comms = len(np.unique(ci))
-            print(f"{'Found '}{num_comms}{' communities at resolution: '}{resolution}{'...'}")
-            resolution = resolution + 10
-            tries = tries + 1
-            if tries > 100:
-                print('\nWARNING: Louvain community detection failed. Proceeding with single community affiliation '
-                      'vector...')
-                break
-    elif num_comms > len(G.edges()) / 10:
-        resolution = 0.1
-        tries = 0
-        while num_comms == 1:
-            ci = np.array(list(community.best_partition(G, resolution=resolution).values()))
-            num_comms = len(np.unique(ci))
-            print(f"{'Found '}{num_comms}{' communities at resolution: '}{resolution}{'...'}")
+    resolution, partition, seed = args
+    if partition is None:
+        return community.best_partition(_louvain_G, resolution=resolution, random_state=seed)
+    induced = community.best_partition(community.induced_graph(partition, _louvain_G), resolution=resolution,
+                                       random_state=seed)
+    return {node: induced[com] for node, com in partition.items()}
+
+
+def _graph_hash(G):
+    """
+    Hash the node order and weighted edges of a graph, independently of the order in which edges were added.
+    """
+    import hashlib
+
+    nodes = list(G.nodes())
+    index = dict(zip(nodes, range(len(nodes))))
+    edges = np.array([(min(index[u], index[v]), max(index[u], index[v]), w) for u, v, w in
+                      G.edges(data='weight', default=1)], dtype=np.float64).reshape(-1, 3)
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    return hashlib.sha1(repr(nodes).encode() + edges.tobytes()).hexdigest()
+
+
+def louvain_partitions(G, resolution=1.0, partition=None, seeds=(0,), n_procs=1):
+    """
+    Louvain partitions of a graph, one per random seed, computed across a process pool.
+
+    Parameters
+    ----------
+    G : NetworkX graph
+        An undirected graph.
+    resolution : float
+        Louvain resolution, where larger values yield more, smaller communities. Default is 1.
+    partition : dict
+        Optional partition (node: community) from which to warm-start each optimization, by merging its
+        communities. It should therefore be no coarser than the partition sought. Default is None.
+    seeds : list
+        Random seeds, one per partition. Default is (0,).
+    n_procs : int
+        Number of processes to use. Default is 1.
+
+    Returns
+    -------
+    partitions : list
+        List of dictionaries (node: community), in the order of `seeds`.
+
+    """
+    import multiprocessing as mp
+
+    tasks = [(resolution, partition, seed) for seed in seeds]
+    n_procs = max(1, min(int(n_procs), len(tasks)))
+    # Daemonic processes (e.g. pool workers) are not allowed to spawn children of their own
+    if n_procs > 1 and not mp.current_process().daemon:
+        with mp.Pool(n_procs, initializer=_init_louvain_worker, initargs=(G,)) as pool:
+            return pool.map(_louvain_seed, tasks)
+    _init_louvain_worker(G)
+    return [_louvain_seed(task) for task in tasks]
+
+
+def consensus_partition(G, partitions, resolution=1.0, tau=0.5, max_iter=10, n_procs=1):
+    """
+    Consensus of several partitions of a graph, obtained by repeatedly partitioning their co-assignment matrix
+    until all partitions agree.
+
+    Parameters
+    ----------
+    G : NetworkX graph
+        The partitioned graph.
+    partitions : list
+        List of dictionaries (node: community).
+    resolution : float
+        Louvain resolution used to partition the co-assignment matrix. Default is 1.
+    tau : float
+        Co-assignment fraction below which pairs of nodes are no longer linked. Default is 0.5.
+    max_iter : int
+        Maximum number of consensus iterations. Default is 10.
+    n_procs : int
+        Number of processes to use. Default is 1.
+
+    Returns
+    -------
+    partition : dict
+        Consensus partition (node: community), with communities numbered from 0.
+
+    References
+    ----------
+    .. [1] Lancichinetti, A., & Fortunato, S. (2012). Consensus clustering in
+      complex networks. Scientific Reports, 2, 336.
+
+    """
+    nodes = list(G.nodes())
+    labels = np.array([[partition[node] for node in nodes] for partition in partitions])
+    for _ in range(max_iter):
+        D = np.mean(labels[:, :, None] == labels[:, None, :], axis=0)
+        if np.all((D == 0) | (D == 1)):
+            break
+        D[D < tau] = 0
+        np.fill_diagonal(D, 0)
+        C = nx.relabel_nodes(nx.from_numpy_array(D), dict(zip(range(len(nodes)), nodes)))
+        labels = np.array([[partition[node] for node in nodes] for partition in
+                           louvain_partitions(C, resolution, seeds=range(len(partitions)), n_procs=n_procs)])
+
+    return dict(zip(nodes, np.unique(labels[0], return_inverse=True)[1].ravel()))
+
+
+def _community_path(cache_dir, key):
+    """
+    Path of the file to which the partition memoized under `key` is persisted in `cache_dir`.
+    """
+    graph_hash, n_seeds, max_iter = key
+    return f"{cache_dir}/communities/louvain_{graph_hash}_seeds-{n_seeds}_iter-{max_iter}.npz"
+
+
+def _save_community(path, ci, resolution, num_comms):
+    """
+    Save a partition atomically, such that concurrent stages never read a partially written file.
+    """
+    import os
+    import tempfile
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, ci=ci, resolution=resolution, num_comms=num_comms)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def community_options():
+    """
+    Louvain restart options (n_seeds and n_procs) configured in nodal_graph_measures.yaml, which graph
+    analysis and plotting share, such that both stages look up the same persisted partitions.
+    """
+    import yaml
+    import pkg_resources
+
+    with open(pkg_resources.resource_filename("pynets", "stats/nodal_graph_measures.yaml"), 'r') as stream:
+        metric_dict_nodal = yaml.load(stream)
+    options = metric_dict_nodal.get('louvain_modularity') or {}
+    return {key: int(options[key]) for key in ('n_seeds', 'n_procs') if key in options}
+
+
+def community_resolution_selection(G, n_seeds=1, n_procs=1, max_iter=20, cache_dir=None):
+    """
+    Louvain community detection, searching for a resolution that yields more than one community, but no more
+    than one for every 10 edges.
+
+    The resolution is bracketed in steps of 10 from 1, and then bisected in log-space, with each partition
+    warm-started from the finest partition found so far that has too many communities. At the selected
+    resolution, `n_seeds` seeded restarts are run across a process pool and combined into their consensus.
+    Seeds are fixed, so results are reproducible, and are memoized per graph hash so that the same graph
+    yields the same partition across stages (e.g. graph analysis and plotting). Partitions are memoized in
+    memory and, if `cache_dir` is given, persisted to its `communities` subdirectory, such that stages that
+    run in other processes (e.g. other nipype nodes) reuse them.
+
+    Parameters
+    ----------
+    G : NetworkX graph
+        An undirected graph.
+    n_seeds : int
+        Number of seeded restarts to combine at the selected resolution. Default is 1.
+    n_procs : int
+        Number of processes across which to run restarts. Default is 1.
+    max_iter : int
+        Maximum number of resolutions to try. Default is 20.
+    cache_dir : str
+        Optional directory in which partitions are persisted, typically the `graphs` directory of a run.
+        Default is None.
+
+    Returns
+    -------
+    ci_dict : dict
+        Community affiliation of each node.
+    ci : Nx1 np.ndarray
+        Community affiliation vector, in the order of G.nodes().
+    resolution : float
+        The selected resolution.
+    num_comms : int
+        Number of communities.
+
+    """
+    import os
+
+    key = (_graph_hash(G), n_seeds, max_iter)
+    if key not in _COMMUNITY_CACHE and cache_dir is not None and os.path.isfile(_community_path(cache_dir, key)):
+        try:
+            with np.load(_community_path(cache_dir, key)) as f:
+                ci = f['ci']
+                _COMMUNITY_CACHE[key] = (dict(zip(G.nodes(), ci)), ci, float(f['resolution']), int(f['num_comms']))
+        except Exception as e:
+            print(f"{'WARNING: '}Failed to load the saved partition of G ({e}). Recomputing it...")
+    if key in _COMMUNITY_CACHE:
+        ci_dict, ci, resolution, num_comms = _COMMUNITY_CACHE[key]
+        return dict(ci_dict), ci.copy(), resolution, num_comms
+
+    max_comms = max(len(G.edges()) / 10, 2)
+
+    def count(partition):
+        return len(set(partition.values()))
+
+    resolution = 1.0
+    partition = louvain_partitions(G, resolution)[0]
+    num_comms = count(partition)
+    print(f"{'Found '}{num_comms}{' communities at resolution: '}{resolution}{'...'}")
+
+    # (resolution, partition) with too many communities, and with a single community
+    fine = coarse = None
+    tries = 0
+    while not 1 < num_comms <= max_comms and tries < max_iter and G.number_of_edges() > 0:
+        if num_comms == 1:
+            coarse = (resolution, partition)
+        else:
+            fine = (resolution, partition)
+        if fine is None:
+            resolution = resolution * 10
+        elif coarse is None:
             resolution = resolution / 10
-            tries = tries + 1
-            if tries > 100:
-                print('\nWARNING: Louvain community detection failed. Proceeding with single community affiliation '
-                      'vector...')
-                break
-    else:
+        else:
+            resolution = float(np.sqrt(fine[0] * coarse[0]))
+        partition = louvain_partitions(G, resolution, partition=fine[1] if fine is not None else None)[0]
+        num_comms = count(partition)
         print(f"{'Found '}{num_comms}{' communities at resolution: '}{resolution}{'...'}")
-    return dict(zip(G.nodes(), ci)), ci, resolution, num_comms
+        tries = tries + 1
+
+    if not 1 < num_comms <= max_comms:
+        print('\nWARNING: Louvain resolution search failed. Proceeding with the last community affiliation '
+              'vector found...')
+
+    if n_seeds > 1:
+        partitions = [partition] + louvain_partitions(G, resolution, partition=fine[1] if fine is not None else None,
+                                                      seeds=range(1, n_seeds), n_procs=n_procs)
+        partition = consensus_partition(G, partitions, resolution, n_procs=n_procs)
+        num_comms = count(partition)
+        print(f"{'Consensus of '}{n_seeds}{' restarts: '}{num_comms}{' communities...'}")
+
+    ci = np.array([partition[node] for node in G.nodes()])
+    _COMMUNITY_CACHE[key] = (dict(zip(G.nodes(), ci)), ci, resolution, num_comms)
+    if cache_dir is not None:
+        try:
+            _save_community(_community_path(cache_dir, key), ci, resolution, num_comms)
+        except OSError as e:
+            print(f"{'WARNING: '}Failed to save the partition of G to {cache_dir} ({e})")
+    return dict(zip(G.nodes(), ci)), ci.copy(), resolution, num_comms
 
 
-def get_community(G, net_met_val_list_final, metric_list_names):
+def get_community(G, net_met_val_list_final, metric_list_names, n_seeds=1, n_procs=1, cache_dir=None):
     import community
-    ci_dict, ci, resolution, num_comms = community_resolution_selection(G)
+    ci_dict, ci, resolution, num_comms = community_resolution_selection(G, n_seeds=n_seeds, n_procs=n_procs,
+                                                                        cache_dir=cache_dir)
     modularity = community.community_louvain.modularity(ci_dict, G)
     metric_list_names.append('modularity')
     if modularity == 1.0:
@@ -1187,60 +2983,36 @@ def get_community(G, net_met_val_list_final, metric_list_names):
     return net_met_val_list_final, metric_list_names, ci
 
 
+def _coefficient_summary(vector, suffix):
+    """
+    Return the per-node names and values of a nodal coefficient vector, followed by its mean.
+    """
+    vector = np.asarray(vector, dtype='float64')
+    names = [f"{i}_{suffix}" for i in range(len(vector))] + [f"average_{suffix}"]
+    # Mean is taken over the same entries as the other nodal summaries (all but the first node, padded with 0)
+    return names, list(vector) + [np.mean(np.append(vector[1:], 0))]
+
+
 def get_participation(in_mat, ci, metric_list_names, net_met_val_list_final):
-    if len(in_mat[in_mat < 0.0]) > 0:
+    if np.any(in_mat < 0.0):
         pc_vector = participation_coef_sign(in_mat, ci)[0]
     else:
         pc_vector = participation_coef(in_mat, ci)
     print('\nCalculating Participation Coefficients...')
-    pc_vals = list(pc_vector)
-    pc_edges = list(range(len(pc_vector)))
-    num_edges = len(pc_edges)
-    pc_arr = np.zeros([num_edges + 1, 2], dtype='object')
-    j = 0
-    for i in range(num_edges):
-        pc_arr[j, 0] = f"{str(pc_edges[j])}{'_participation_coefficient'}"
-        try:
-            pc_arr[j, 1] = pc_vals[j]
-        except:
-            print(f"{'Participation coefficient is undefined for node '}{str(j)}{' of G'}")
-            pc_arr[j, 1] = np.nan
-        j = j + 1
-    # Add mean
-    pc_arr[num_edges, 0] = 'average_participation_coefficient'
-    nonzero_arr_partic_coef = np.delete(pc_arr[:, 1], [0])
-    pc_arr[num_edges, 1] = np.mean(nonzero_arr_partic_coef)
-    print(f"{'Mean Participation Coefficient: '}{str(pc_arr[num_edges, 1])}")
-    for i in pc_arr[:, 0]:
-        metric_list_names.append(i)
-    net_met_val_list_final = net_met_val_list_final + list(pc_arr[:, 1])
+    names, vals = _coefficient_summary(pc_vector, 'participation_coefficient')
+    print(f"{'Mean Participation Coefficient: '}{str(vals[-1])}")
+    metric_list_names.extend(names)
+    net_met_val_list_final = net_met_val_list_final + vals
     return metric_list_names, net_met_val_list_final
 
 
 def get_diversity(in_mat, ci, metric_list_names, net_met_val_list_final):
     dc_vector = diversity_coef_sign(in_mat, ci)[0]
     print('\nCalculating Diversity Coefficients...')
-    dc_vals = list(dc_vector)
-    dc_edges = list(range(len(dc_vector)))
-    num_edges = len(dc_edges)
-    dc_arr = np.zeros([num_edges + 1, 2], dtype='object')
-    j = 0
-    for i in range(num_edges):
-        dc_arr[j, 0] = f"{str(dc_edges[j])}{'_diversity_coefficient'}"
-        try:
-            dc_arr[j, 1] = dc_vals[j]
-        except:
-            print(f"{'Diversity coefficient is undefined for node '}{str(j)}{' of G'}")
-            dc_arr[j, 1] = np.nan
-        j = j + 1
-    # Add mean
-    dc_arr[num_edges, 0] = 'average_diversity_coefficient'
-    nonzero_arr_diversity_coef = np.delete(dc_arr[:, 1], [0])
-    dc_arr[num_edges, 1] = np.mean(nonzero_arr_diversity_coef)
-    print(f"{'Mean Diversity Coefficient: '}{str(dc_arr[num_edges, 1])}")
-    for i in dc_arr[:, 0]:
-        metric_list_names.append(i)
-    net_met_val_list_final = net_met_val_list_final + list(dc_arr[:, 1])
+    names, vals = _coefficient_summary(dc_vector, 'diversity_coefficient')
+    print(f"{'Mean Diversity Coefficient: '}{str(vals[-1])}")
+    metric_list_names.extend(names)
+    net_met_val_list_final = net_met_val_list_final + vals
     return metric_list_names, net_met_val_list_final
 
 
@@ -1270,10 +3042,13 @@ def get_local_efficiency(G, metric_list_names, net_met_val_list_final):
     return metric_list_names, net_met_val_list_final
 
 
-def get_clustering(G, metric_list_names, net_met_val_list_final):
+def get_clustering(G, metric_list_names, net_met_val_list_final, plan=None):
     from networkx.algorithms import clustering
 
-    cl_vector = clustering(G)
+    if plan is not None:
+        cl_vector = plan.local_clustering()
+    else:
+        cl_vector = clustering(G)
     print('\nCalculating Local Clusterings...')
     cl_vals = list(cl_vector.values())
     cl_nodes = list(cl_vector.keys())
@@ -1298,9 +3073,12 @@ def get_clustering(G, metric_list_names, net_met_val_list_final):
     return metric_list_names, net_met_val_list_final
 
 
-def get_degree_centrality(G, metric_list_names, net_met_val_list_final):
+def get_degree_centrality(G, metric_list_names, net_met_val_list_final, plan=None):
     from networkx.algorithms import degree_centrality
-    dc_vector = degree_centrality(G)
+    if plan is not None:
+        dc_vector = plan.degree_centrality()
+    else:
+        dc_vector = degree_centrality(G)
     print('\nCalculating Local Degree Centralities...')
     dc_vals = list(dc_vector.values())
     dc_nodes = list(dc_vector.keys())
@@ -1325,9 +3103,25 @@ def get_degree_centrality(G, metric_list_names, net_met_val_list_final):
     return metric_list_names, net_met_val_list_final
 
 
-def get_betweenness_centrality(G_len, metric_list_names, net_met_val_list_final):
+def get_betweenness_centrality(G_len, metric_list_names, net_met_val_list_final, plan=None, approximate=False,
+                               epsilon=0.05, delta=0.1):
     from networkx.algorithms import betweenness_centrality
-    bc_vector = betweenness_centrality(G_len, normalized=True)
+    bound = None
+    if approximate is True:
+        if plan is not None:
+            bc_vector, bound = plan.approximate_betweenness_centrality(epsilon=epsilon, delta=delta)
+        else:
+            # Hop-count adjacency, in which zero-length edges remain edges
+            try:
+                A = nx.to_scipy_sparse_array(G_len, weight=None, format='csr')
+            except AttributeError:
+                A = nx.to_scipy_sparse_matrix(G_len, weight=None, format='csr')
+            bc_vector, bound = approximate_betweenness_centrality(A, epsilon=epsilon, delta=delta)
+            bc_vector = dict(zip(G_len.nodes(), bc_vector.values()))
+    elif plan is not None:
+        bc_vector = plan.betweenness_centrality()
+    else:
+        bc_vector = betweenness_centrality(G_len, normalized=True)
     print('\nCalculating Local Betweenness Centralities...')
     bc_vals = list(bc_vector.values())
     bc_nodes = list(bc_vector.keys())
@@ -1349,12 +3143,19 @@ def get_betweenness_centrality(G_len, metric_list_names, net_met_val_list_final)
     for i in bc_arr[:, 0]:
         metric_list_names.append(i)
     net_met_val_list_final = net_met_val_list_final + list(bc_arr[:, 1])
+    if bound is not None:
+        print(f"{'Betweenness Centrality error bound (confidence '}{1 - delta}{'): '}{bound}")
+        metric_list_names.append('betweenness_centrality_error_bound')
+        net_met_val_list_final.append(bound)
     return metric_list_names, net_met_val_list_final
 
 
-def get_eigen_centrality(G, metric_list_names, net_met_val_list_final):
+def get_eigen_centrality(G, metric_list_names, net_met_val_list_final, plan=None):
     from networkx.algorithms import eigenvector_centrality
-    ec_vector = eigenvector_centrality(G, max_iter=1000)
+    if plan is not None:
+        ec_vector = plan.eigenvector_centrality()
+    else:
+        ec_vector = eigenvector_centrality(G, max_iter=1000)
     print('\nCalculating Local Eigenvector Centralities...')
     ec_vals = list(ec_vector.values())
     ec_nodes = list(ec_vector.keys())
@@ -1379,9 +3180,8 @@ def get_eigen_centrality(G, metric_list_names, net_met_val_list_final):
     return metric_list_names, net_met_val_list_final
 
 
-def get_comm_centrality(G, metric_list_names, net_met_val_list_final):
-    from networkx.algorithms import communicability_betweenness_centrality
-    cc_vector = communicability_betweenness_centrality(G, normalized=True)
+def get_comm_centrality(in_mat, metric_list_names, net_met_val_list_final):
+    cc_vector = communicability_betweenness_centrality_mat(in_mat)
     print('\nCalculating Local Communicability Centralities...')
     cc_vals = list(cc_vector.values())
     cc_nodes = list(cc_vector.keys())
@@ -1407,9 +3207,8 @@ def get_comm_centrality(G, metric_list_names, net_met_val_list_final):
 
 
 @timeout(720)
-def get_rich_club_coeff(G, metric_list_names, net_met_val_list_final):
-    from networkx.algorithms import rich_club_coefficient
-    rc_vector = rich_club_coefficient(G, normalized=True, seed=42, Q=100)
+def get_rich_club_coeff(in_mat, metric_list_names, net_met_val_list_final):
+    rc_vector = rich_club_coefficient_norm(in_mat, Q=100)
     print('\nCalculating Local Rich Club Coefficients...')
     rc_vals = list(rc_vector.values())
     rc_edges = list(rc_vector.keys())
@@ -1435,7 +3234,256 @@ def get_rich_club_coeff(G, metric_list_names, net_met_val_list_final):
     return metric_list_names, net_met_val_list_final
 
 
-def extractnetstats(ID, network, thr, conn_model, est_path, roi, prune, norm, binary):
+# Nodal metrics in the order in which they are written to the netmetrics csv, along with the function
+# used to compute them, the graph representation that they are computed on, and whether they
+# require the community affiliation vector produced by 'louvain_modularity'.
+NODAL_METRICS = [('louvain_modularity', 'get_community', 'G', False),
+                 ('participation_coefficient', 'get_participation', 'in_mat', True),
+                 ('diversity_coefficient', 'get_diversity', 'in_mat', True),
+                 ('local_efficiency', 'get_local_efficiency', 'G', False),
+                 ('local_clustering', 'get_clustering', 'G', False),
+                 ('degree_centrality', 'get_degree_centrality', 'G', False),
+                 ('betweenness_centrality', 'get_betweenness_centrality', 'G_len', False),
+                 ('eigenvector_centrality', 'get_eigen_centrality', 'G', False),
+                 ('communicability_centrality', 'get_comm_centrality', 'in_mat', False),
+                 ('rich_club_coefficient', 'get_rich_club_coeff', 'in_mat', False)]
+
+
+def _get_graph(mats, graphs, name):
+    """
+    Return one of `in_mat`, `G`, `G_len` or `plan`, building them lazily from the shared matrices.
+    """
+    if name not in graphs:
+        if name == 'plan':
+            graphs[name] = MetricPlan(mats['in_mat'], cache={key.split('plan_', 1)[1]: np.asarray(val) for
+                                                             key, val in mats.items() if key.startswith('plan_')})
+        elif name == 'graph':
+            graphs[name] = SparseGraph(mats['in_mat'])
+        elif name == 'graph_len':
+            # Zero-length edges are kept
+            graphs[name] = SparseGraph(mats['in_mat_len'], eliminate_zeros=False)
+        elif name == 'in_mat':
+            graphs[name] = _get_graph(mats, graphs, 'graph').toarray()
+        elif name == 'G':
+            graphs[name] = _get_graph(mats, graphs, 'graph').to_networkx()
+        elif name == 'G_len':
+            graphs[name] = _get_graph(mats, graphs, 'graph_len').to_networkx()
+    return graphs[name]
+
+
+def compute_metric(task, mats, graphs=None, ci=None):
+    """
+    Compute a single global or nodal metric of a graph.
+
+    Parameters
+    ----------
+    task : tuple
+        Either ('global', func) for a function from the global metric list, or ('nodal', name)
+        for a metric name from NODAL_METRICS, optionally followed by a dictionary of keyword
+        arguments of its function (e.g. as configured in nodal_graph_measures.yaml).
+    mats : dict
+        Dictionary of the `in_mat` and `in_mat_len` matrices (dense or sparse, possibly memory-mapped), along with
+        any precomputed MetricPlan intermediates, prefixed by `plan_`.
+    graphs : dict
+        Optional cache of graph representations that have already been built from mats.
+    ci : Nx1 np.ndarray
+        Community affiliation vector, required by metrics that depend on louvain_modularity.
+
+    Returns
+    -------
+    metric_list_names : list
+        Names of the computed metric values.
+    net_met_val_list : list
+        Computed metric values.
+    ci : Nx1 np.ndarray
+        Community affiliation vector if the task is louvain_modularity, otherwise None.
+
+    """
+    import time
+    import pynets.stats.netstats
+
+    if graphs is None:
+        graphs = {}
+    kind, metric = task[:2]
+    options = task[2] if len(task) > 2 else {}
+
+    plan = _get_graph(mats, graphs, 'plan')
+    if kind == 'global':
+        net_met = str(metric).split('<function ')[1].split(' at')[0]
+        G = None if plan.supports(net_met) else _get_graph(mats, graphs, 'G')
+        net_met_val_list, metric_list_names = iterate_nx_global_measures(G, [metric], plan=plan)
+        return metric_list_names, net_met_val_list, None
+
+    _, func_name, graph_name, needs_ci = [spec for spec in NODAL_METRICS if spec[0] == metric][0]
+    func = getattr(pynets.stats.netstats, func_name)
+    start_time = time.time()
+    if metric == 'louvain_modularity':
+        net_met_val_list, metric_list_names, ci = func(_get_graph(mats, graphs, graph_name), [], [], **options)
+    else:
+        if needs_ci is True:
+            if ci is None:
+                raise KeyError(f"{metric} cannot be calculated for G in the absence of a community affiliation "
+                               f"vector")
+            metric_list_names, net_met_val_list = func(_get_graph(mats, graphs, graph_name), ci, [], [])
+        elif plan.supports(metric):
+            metric_list_names, net_met_val_list = func(None, [], [], plan=plan, **options)
+        else:
+            metric_list_names, net_met_val_list = func(_get_graph(mats, graphs, graph_name), [], [], **options)
+        ci = None
+    print(f"{np.round(time.time() - start_time, 1)}{'s'}")
+    return metric_list_names, net_met_val_list, ci
+
+
+def _save_shared_matrix(mat, path):
+    """
+    Save a dense or CSR matrix for memory-mapping by worker processes.
+    """
+    from scipy import sparse
+    if sparse.issparse(mat):
+        mat = mat.tocsr()
+        for part in ('data', 'indices', 'indptr'):
+            np.save(f"{path}_{part}.npy", getattr(mat, part))
+        return path, mat.shape
+    np.save(f"{path}.npy", np.asarray(mat))
+    return path, None
+
+
+def _load_shared_matrix(spec):
+    from scipy import sparse
+    path, shape = spec
+    if shape is not None:
+        return sparse.csr_matrix(tuple(np.load(f"{path}_{part}.npy", mmap_mode='r') for part in
+                                       ('data', 'indices', 'indptr')), shape=shape)
+    return np.load(f"{path}.npy", mmap_mode='r')
+
+
+def _metric_worker(task, mat_paths, ci, conn):
+    """
+    Compute a single metric in an isolated process from memory-mapped matrices and send back the result.
+    """
+    mats = {key: _load_shared_matrix(path) for key, path in mat_paths.items()}
+    try:
+        result = compute_metric(task, mats, ci=ci)
+    except:
+        result = None
+    conn.send(result)
+    conn.close()
+
+
+def _metric_failure_message(task):
+    kind, metric = task[:2]
+    if kind == 'global':
+        return f"{'WARNING: '}{str(metric)}{' failed for G.'}"
+    if metric == 'louvain_modularity':
+        return 'Louvain modularity calculation is undefined for G'
+    return f"{metric.replace('_', ' ').capitalize()} cannot be calculated for G"
+
+
+def run_metric_schedule(tasks, mats, n_procs=1, timeout=1800, poll_interval=0.05):
+    """
+    Run independent graph metrics concurrently, with one isolated process per metric.
+
+    The matrices are written once to memory-mapped .npy files that each worker loads without
+    copying, rather than pickling a NetworkX graph per worker. Each metric is given its own
+    wall-clock timeout, enforced by the parent process (such that it works off the main thread),
+    after which its worker is terminated and its values are omitted, as for any failed metric.
+    Metrics that require a community affiliation vector are only dispatched once
+    louvain_modularity has finished.
+
+    Parameters
+    ----------
+    tasks : list
+        List of ('global', func) or ('nodal', name) tuples (see compute_metric).
+    mats : dict
+        Dictionary of the `in_mat` and `in_mat_len` matrices.
+    n_procs : int
+        Maximum number of metrics to run concurrently. Default is 1.
+    timeout : int
+        Per-metric timeout in seconds. Default is 1800.
+    poll_interval : float
+        Interval in seconds at which running workers are polled. Default is 0.05.
+
+    Returns
+    -------
+    results : list
+        (metric_list_names, net_met_val_list) for each task, in the order of tasks, with None for
+        tasks that failed, timed out, or whose dependencies failed.
+
+    """
+    import os
+    import time
+    import shutil
+    import tempfile
+    import multiprocessing as mp
+
+    shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+    tmp_dir = tempfile.mkdtemp(prefix='pynets_netstats_', dir=shm_dir)
+    mat_paths = {}
+    for key, mat in mats.items():
+        mat_paths[key] = _save_shared_matrix(mat, f"{tmp_dir}/{key}")
+
+    needs_ci = {spec[0] for spec in NODAL_METRICS if spec[3] is True}
+    has_community = ('nodal', 'louvain_modularity') in [task[:2] for task in tasks]
+    results = [None] * len(tasks)
+    pending = list(range(len(tasks)))
+    running = {}
+    ci = None
+    community_done = not has_community
+    try:
+        while pending or running:
+            for j in list(pending):
+                if len(running) >= n_procs:
+                    break
+                if tasks[j][0] == 'nodal' and tasks[j][1] in needs_ci:
+                    if not community_done:
+                        continue
+                    if ci is None:
+                        print(_metric_failure_message(tasks[j]))
+                        pending.remove(j)
+                        continue
+                recv_conn, send_conn = mp.Pipe(duplex=False)
+                proc = mp.Process(target=_metric_worker, args=(tasks[j], mat_paths, ci, send_conn))
+                proc.daemon = True
+                proc.start()
+                send_conn.close()
+                running[j] = (proc, recv_conn, time.time())
+                pending.remove(j)
+
+            time.sleep(poll_interval)
+            for j, (proc, recv_conn, start_time) in list(running.items()):
+                result = None
+                if recv_conn.poll():
+                    try:
+                        result = recv_conn.recv()
+                    except EOFError:
+                        result = None
+                    proc.join()
+                    if result is None:
+                        print(_metric_failure_message(tasks[j]))
+                elif not proc.is_alive():
+                    print(_metric_failure_message(tasks[j]))
+                elif time.time() - start_time > timeout:
+                    proc.terminate()
+                    proc.join()
+                    print(f"{'WARNING: '}{_metric_failure_message(tasks[j])} (timed out after {timeout}s)")
+                else:
+                    continue
+                recv_conn.close()
+                del running[j]
+                if result is not None:
+                    results[j] = result[:2]
+                if tasks[j][:2] == ('nodal', 'louvain_modularity'):
+                    community_done = True
+                    ci = result[2] if result is not None else None
+    finally:
+        for proc, recv_conn, _ in running.values():
+            proc.terminate()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return results
+
+
+def extractnetstats(ID, network, thr, conn_model, est_path, roi, prune, norm, binary, n_procs=1):
     """
     Function interface for performing fully-automated graph analysis.
 
@@ -1463,11 +3511,15 @@ def extractnetstats(ID, network, thr, conn_model, est_path, roi, prune, norm, bi
     binary : bool
         Indicates whether to binarize resulting graph edges to form an
         unweighted graph.
+    n_procs : int
+        Number of metrics to compute concurrently, each in its own process. Default is 1,
+        which computes all metrics sequentially in the current process.
 
     Returns
     -------
     out_path : str
-        Path to .csv file where graph analysis results are saved.
+        Path to the file of the netmetrics.parquet store (or, if pyarrow is unavailable, the .csv file) where
+        graph analysis results are saved.
 
     References
     ----------
@@ -1480,33 +3532,109 @@ def extractnetstats(ID, network, thr, conn_model, est_path, roi, prune, norm, bi
       pp. 11–15, Aug 2008
 
     """
-    import time
     import gc
     import os.path as op
-    import yaml
-    # import random
-    import pkg_resources
-    import networkx
-    import pynets.stats.netstats
-    from pathlib import Path
 
-    cg = CleanGraphs(thr, conn_model, est_path, prune, norm)
+    graph, graph_len = _clean_graph(thr, conn_model, est_path, prune, norm, binary)
+    metric_lists = _load_metric_lists(binary)
+    metric_list_names, net_met_val_list_final = _run_metric_tasks(graph, graph_len, *metric_lists, n_procs=n_procs,
+                                                                  community_dir=op.dirname(op.realpath(est_path)))
+
+    out_path_neat = save_netmets(op.dirname(op.realpath(est_path)), est_path, metric_list_names,
+                                 net_met_val_list_final, keys=netmets_keys(ID, thr, est_path))
+
+    # Cleanup
+    del net_met_val_list_final, metric_list_names, metric_lists
+    gc.collect()
+
+    return out_path_neat
+
+
+def _clean_graph(thr, conn_model, est_path, prune, norm, binary):
+    """
+    Load, normalize and prune a thresholded graph, returning it along with its connection-length graph.
+    """
+    cg = _cleaned_graph(thr, conn_model, est_path, prune, norm)
+
+    # Graph variants share a single sparse edge structure. Dense and NetworkX representations are only built for
+    # metrics that require them.
+    if binary is True:
+        graph = cg.graph.binarized()
+    else:
+        graph = cg.graph
+
+    graph_len = cg.graph.lengths()
+
+    cg.print_summary()
+    return graph, graph_len
+
+
+def _cleaned_graph(thr, conn_model, est_path, prune, norm, conn_matrix=None):
+    """
+    Normalize and prune a thresholded graph, loaded from est_path unless conn_matrix is given (see CleanGraphs).
+    """
+    cg = CleanGraphs(thr, conn_model, est_path, prune, norm, conn_matrix=conn_matrix)
     if float(norm) >= 1:
         cg.normalize_graph()
 
     if float(prune) >= 1:
         cg.prune_graph()
+    return cg
 
-    if binary is True:
-        in_mat, G = cg.binarize_graph()
-    else:
-        in_mat, G = cg.in_mat, cg.G
 
-    in_mat_len, G_len = cg.create_length_matrix()
+def graph_communities(conn_matrix, conn_model, prune, norm, binary, n_seeds=1, n_procs=1, cache_dir=None):
+    """
+    Louvain community affiliation of the nodes of a thresholded graph, as found by graph analysis.
+
+    Communities are detected in the graph as cleaned for graph analysis (see _clean_graph), such that stages
+    which display the thresholded graph (e.g. plotting) share the partition, persisted to `cache_dir`, of graph
+    analysis, rather than partitioning a graph of their own.
 
-    cg.print_summary()
+    Parameters
+    ----------
+    conn_matrix : NxN np.ndarray
+        The thresholded graph, as saved for graph analysis.
+    conn_model : str
+       Connectivity estimation model (e.g. corr for correlation, cov for covariance, sps for precision covariance,
+       partcorr for partial correlation). sps type is used by default.
+    prune : int
+        Indicates whether to prune final graph of disconnected nodes/isolates.
+    norm : int
+        Indicates method of normalizing resulting graph.
+    binary : bool
+        Indicates whether to binarize resulting graph edges to form an unweighted graph.
+    n_seeds : int
+        Number of seeded restarts (see community_resolution_selection). Default is 1.
+    n_procs : int
+        Number of processes across which to run restarts. Default is 1.
+    cache_dir : str
+        Directory in which partitions are persisted, typically the `graphs` directory of a run. Default is None.
+
+    Returns
+    -------
+    ci : Nx1 np.ndarray
+        Community affiliation vector of the nodes of conn_matrix. Nodes pruned before graph analysis are
+        assigned communities of their own.
 
-    dir_path = op.dirname(op.realpath(est_path))
+    """
+    cg = _cleaned_graph(None, conn_model, None, prune, norm, conn_matrix=conn_matrix)
+    graph = cg.graph.binarized() if binary is True else cg.graph
+    ci_pruned = community_resolution_selection(graph.to_networkx(), n_seeds=n_seeds, n_procs=n_procs,
+                                               cache_dir=cache_dir)[1]
+
+    ci = np.arange(len(conn_matrix)) + (np.max(ci_pruned) + 1 if len(ci_pruned) > 0 else 0)
+    ci[cg.nodes] = ci_pruned
+    return np.unique(ci, return_inverse=True)[1].ravel()
+
+
+def _load_metric_lists(binary):
+    """
+    Parse the global and nodal graph metrics to compute from global_graph_measures.yaml and nodal_graph_measures.yaml.
+    """
+    import yaml
+    import pkg_resources
+    import networkx
+    import pynets.stats.netstats
 
     # Load netstats config and parse graph algorithms as objects
     with open(pkg_resources.resource_filename("pynets", "stats/global_graph_measures.yaml"), 'r') as stream:
@@ -1537,153 +3665,409 @@ def extractnetstats(ID, network, thr, conn_model, est_path, roi, prune, norm, bi
         except FileNotFoundError:
             print('Failed to parse nodal_graph_measures.yaml')
 
-    # Note the use of bare excepts in preceding blocks. Typically, this is considered bad practice in python. Here,
-    # we are exploiting it intentionally to facilitate uninterrupted, automated graph analysis even when algorithms are
-    # undefined. In those instances, solutions are assigned NaN's.
+    return metric_list_global, metric_list_global_names, metric_dict_nodal, metric_list_nodal
 
-    # Iteratively run functions from above metric list that generate single scalar output
-    net_met_val_list_final, metric_list_names = iterate_nx_global_measures(G, metric_list_global)
 
-    # Run miscellaneous functions that generate multiple outputs
-    # Calculate modularity using the Louvain algorithm
-    if 'louvain_modularity' in metric_list_nodal:
-        try:
-            start_time = time.time()
-            net_met_val_list_final, metric_list_names, ci = get_community(G, net_met_val_list_final, metric_list_names)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Louvain modularity calculation is undefined for G')
-            # np.save("%s%s%s" % ('/tmp/community_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G)))
-            pass
+def _plan_metric_names(metric_list_global_names, metric_dict_nodal, metric_list_nodal):
+    """
+    Names of the configured metrics whose shared intermediates should be computed by a MetricPlan.
+    """
+    metric_names = metric_list_global_names + list(metric_list_nodal)
+    # Sampled betweenness centrality only requires shortest paths from its pivot nodes
+    if (metric_dict_nodal.get('betweenness_centrality') or {}).get('approximate') is True and \
+            'betweenness_centrality' in metric_names:
+        metric_names.remove('betweenness_centrality')
+    return metric_names
 
-    # Participation Coefficient by louvain community
-    if 'participation_coefficient' in metric_list_nodal:
-        try:
-            if ci is None:
-                raise KeyError('Participation coefficient cannot be calculated for G in the absence of a '
-                               'community affiliation vector')
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_participation(in_mat, ci, metric_list_names,
-                                                                          net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Participation coefficient cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/partic_coeff_failure', random.randint(1, 400), '.npy'), in_mat)
-            pass
 
-    # Diversity Coefficient by louvain community
-    if 'diversity_coefficient' in metric_list_nodal:
-        try:
-            if ci is None:
-                raise KeyError('Diversity coefficient cannot be calculated for G in the absence of a community '
-                               'affiliation vector')
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_diversity(in_mat, ci, metric_list_names,
-                                                                      net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Diversity coefficient cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/div_coeff_failure', random.randint(1, 400), '.npy'), in_mat)
-            pass
+def _run_metric_tasks(graph, graph_len, metric_list_global, metric_list_global_names, metric_dict_nodal,
+                      metric_list_nodal, n_procs=1, cache=None, community_dir=None):
+    """
+    Compute the configured global and nodal metrics of a graph, optionally from precomputed MetricPlan
+    intermediates (cache), returning their names and values. Its community partition is persisted to
+    community_dir, if given (see community_resolution_selection).
+    """
+    # Note the use of bare excepts in the metric functions. Typically, this is considered bad practice in python.
+    # Here, we are exploiting it intentionally to facilitate uninterrupted, automated graph analysis even when
+    # algorithms are undefined. In those instances, solutions are assigned NaN's.
+    tasks = [('global', i) for i in metric_list_global] + [('nodal', spec[0], metric_dict_nodal[spec[0]]) if
+                                                           isinstance(metric_dict_nodal.get(spec[0]), dict) else
+                                                           ('nodal', spec[0]) for spec in NODAL_METRICS if
+                                                           spec[0] in metric_list_nodal]
+    if community_dir is not None:
+        tasks = [task[:2] + (dict(task[2] if len(task) > 2 else {}, cache_dir=community_dir),) if
+                 task[:2] == ('nodal', 'louvain_modularity') else task for task in tasks]
+    mats = {'in_mat': graph.W, 'in_mat_len': graph_len.W}
+
+    # Shortest paths, triangles and degrees are computed once and shared by every metric derived from them
+    plan = MetricPlan(graph.W, cache=cache)
+    metric_names = _plan_metric_names(metric_list_global_names, metric_dict_nodal, metric_list_nodal)
+
+    if int(n_procs) > 1:
+        print(f"Computing {len(tasks)} metrics across {int(n_procs)} processes...")
+        mats.update({f"plan_{key}": val for key, val in plan.precompute(metric_names).items()})
+        results = run_metric_schedule(tasks, mats, n_procs=int(n_procs))
+        print(plan.report(metric_names))
+    else:
+        graphs = {'graph': graph, 'graph_len': graph_len, 'plan': plan}
+        results = []
+        ci = None
+        for task in tasks:
+            try:
+                metric_list_names, net_met_val_list, ci_task = compute_metric(task, mats, graphs, ci=ci)
+                results.append((metric_list_names, net_met_val_list))
+                if task[:2] == ('nodal', 'louvain_modularity'):
+                    ci = ci_task
+            except:
+                print(_metric_failure_message(task))
+                results.append(None)
+        print(plan.report())
 
-    # Local Efficiency
-    if 'local_efficiency' in metric_list_nodal:
-        try:
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_local_efficiency(G, metric_list_names,
-                                                                             net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Local efficiency cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/local_eff_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G)))
-            pass
+    net_met_val_list_final = []
+    metric_list_names = []
+    for result in results:
+        if result is not None:
+            metric_list_names = metric_list_names + list(result[0])
+            net_met_val_list_final = net_met_val_list_final + list(result[1])
+    return metric_list_names, net_met_val_list_final
 
-    # Local Clustering
-    if 'local_clustering' in metric_list_nodal:
-        try:
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_clustering(G, metric_list_names, net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Local clustering cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/local_clust_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G)))
-            pass
 
-    # Degree centrality
-    if 'degree_centrality' in metric_list_nodal:
-        try:
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_degree_centrality(G, metric_list_names,
-                                                                              net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Degree centrality cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/degree_cent_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G)))
-            pass
+def sweep_threshold_stacks(thr, est_path, metric_list=None, binary=False):
+    """
+    Sweep the thresholds of each group of graphs that differ only by threshold (see sweep_thresholds),
+    starting from the densest graph of the group, and save the per-threshold metrics and their AUC
+    alongside the graphs.
 
-    # Betweenness Centrality
-    if 'betweenness_centrality' in metric_list_nodal:
-        try:
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_betweenness_centrality(G_len, metric_list_names,
-                                                                                   net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Betweenness centrality cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/betw_cent_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G_len)))
-            pass
+    Proportional thresholds of the densest graph reproduce those of its raw graph, so groups are only
+    swept if thresholding the densest graph at every threshold of the group yields each of its graphs
+    (e.g. not for minimum-spanning-tree thresholds). Metrics are those of the graphs as thresholded,
+    i.e. before any normalization or pruning.
 
-    # Eigenvector Centrality
-    if 'eigenvector_centrality' in metric_list_nodal:
-        try:
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_eigen_centrality(G, metric_list_names,
-                                                                             net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Eigenvector centrality cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/eig_cent_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G)))
-            pass
+    Parameters
+    ----------
+    thr : list
+        The threshold of each graph.
+    est_path : list
+        File paths to the thresholded graphs, saved as numpy arrays in .npy format.
+    metric_list : list
+        Optional list of MetricPlan-supported metric names to recompute in full at each threshold
+        (see sweep_thresholds). Default is None.
+    binary : bool
+        Indicates whether to sweep binarized graphs, in which case file names are suffixed by `_bin`.
+        Default is False.
+
+    Returns
+    -------
+    out_paths : list
+        Paths to the per-threshold metrics and AUC .csv files of each group that was swept.
+
+    """
+    from pynets.core import utils
+    from pynets.core.thresholding import threshold_proportional
 
-    # Communicability Centrality
-    if 'communicability_centrality' in metric_list_nodal:
+    stacks = {}
+    for i, path in enumerate(est_path):
+        stacks.setdefault(utils.stack_path(path), []).append(i)
+
+    out_paths = []
+    for stack, group in stacks.items():
+        if len(group) < 2 or stack == est_path[group[0]]:
+            continue
         try:
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_comm_centrality(G, metric_list_names,
-                                                                            net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Communicability centrality cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/comm_cent_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G)))
-            pass
+            thr_list = [float(thr[i]) for i in group]
+            mats = [utils.load_mat_sparse(est_path[i]).toarray() for i in group]
+            densest = mats[int(np.argmax(thr_list))]
+            if not all(np.array_equal(threshold_proportional(densest, t) != 0, mat != 0) for t, mat in
+                       zip(thr_list, mats)):
+                print(f"Graphs of {stack} are not nested proportional thresholds. Skipping threshold sweep...")
+                continue
+            df_sweep, df_auc = sweep_thresholds(densest, thr_list, metric_list=metric_list, binary=binary)
+        except Exception as e:
+            print(f"{'WARNING: '}Threshold sweep of {stack} failed: {e}")
+            continue
+        suffix = '_bin' if binary is True else ''
+        out_path_sweep = stack.replace('_thr-stack.npy', f"_thr-sweep{suffix}.csv")
+        out_path_auc = stack.replace('_thr-stack.npy', f"_thr-sweep{suffix}_auc.csv")
+        df_sweep.to_csv(out_path_sweep, index=False)
+        df_auc.to_csv(out_path_auc, index=False)
+        print(f"Threshold sweep of {len(group)} graphs saved to {out_path_sweep}")
+        out_paths.extend([out_path_sweep, out_path_auc])
+
+    return out_paths
+
+
+def extractnetstats_batch(ID, network, thr, conn_model, est_path, roi, prune, norm, binary, n_procs=1,
+                          min_batch_size=2, max_batch_size=32, sweep=False):
+    """
+    Function interface for performing fully-automated graph analysis of many graphs at once, with the
+    intermediates of graphs that share an atlas (i.e. across thresholds, models and RSNs) computed in
+    batches (see batch_plan_intermediates).
+
+    Graphs are grouped by atlas, and by size and binarization after cleaning, since pruning may leave
+    graphs of the same atlas with different numbers of nodes. Groups of fewer than min_batch_size
+    graphs are analyzed one graph at a time, as by extractnetstats, whose results are identical.
+
+    Parameters
+    ----------
+    ID : str or list
+        A subject id or other unique identifier, or one per graph.
+    network : str or list
+        Resting-state network based on Yeo-7 and Yeo-17 naming (e.g. 'Default') used to filter nodes in the study of
+        brain subgraphs, or one per graph.
+    thr : list
+        The threshold of each graph.
+    conn_model : str or list
+       Connectivity estimation model, or one per graph.
+    est_path : list
+        File paths to the thresholded graphs, saved as numpy arrays in .npy format.
+    roi : str or list
+        File path to binarized/boolean region-of-interest Nifti1Image file, or one per graph.
+    prune : int or list
+        Indicates whether to prune final graphs of disconnected nodes/isolates.
+    norm : int or list
+        Indicates method of normalizing resulting graphs.
+    binary : bool or list
+        Indicates whether to binarize resulting graph edges to form unweighted graphs.
+    n_procs : int
+        Number of metrics to compute concurrently for each graph, each in its own process. Default is 1.
+    min_batch_size : int
+        Minimum number of graphs of a group for their intermediates to be computed in a batch. Default is 2.
+    max_batch_size : int
+        Maximum number of graphs whose intermediates are computed in a single batch, which bounds the memory
+        needed by their dense stack. Default is 32.
+    sweep : bool
+        Indicates whether to also sweep the thresholds of graphs that differ only by threshold, saving their
+        per-threshold metrics and AUC (see sweep_threshold_stacks), which are not collected alongside the
+        results of graph analysis. Graphs are swept separately for each binarization flag. Default is False.
 
-    # Rich club coefficient
-    if 'rich_club_coefficient' in metric_list_nodal:
+    Returns
+    -------
+    out_paths : list
+        Path to the file of the netmetrics.parquet store (or, if pyarrow is unavailable, the .csv file) where the
+        graph analysis results of each graph are saved. Graphs that failed to load or be analyzed are skipped.
+
+    """
+    import gc
+    import os.path as op
+
+    est_path = list(est_path)
+    n_graphs = len(est_path)
+    ID, network, thr, conn_model, roi, prune, norm, binary = [list(arg) if isinstance(arg, (list, tuple)) else
+                                                              [arg] * n_graphs for arg in
+                                                              (ID, network, thr, conn_model, roi, prune, norm,
+                                                               binary)]
+
+    # As when mapped over one graph at a time, a graph that fails to load or be analyzed is skipped rather than
+    # failing the analysis of every other graph
+    graphs = {}
+    for i in range(n_graphs):
         try:
-            start_time = time.time()
-            metric_list_names, net_met_val_list_final = get_rich_club_coeff(G, metric_list_names,
-                                                                            net_met_val_list_final)
-            print(f"{np.round(time.time() - start_time, 1)}{'s'}")
-        except:
-            print('Rich club coefficient cannot be calculated for G')
-            # np.save("%s%s%s" % ('/tmp/rich_club_failure', random.randint(1, 400), '.npy'),
-            #         np.array(nx.to_numpy_matrix(G)))
-            pass
+            graphs[i] = _clean_graph(thr[i], conn_model[i], est_path[i], prune[i], norm[i], binary[i])
+        except Exception as e:
+            print(f"{'WARNING: '}Skipping graph analysis of {est_path[i]}, which failed to load: {e}")
+    metric_lists = {flag: _load_metric_lists(flag) for flag in set(binary[i] for i in graphs)}
+
+    groups = {}
+    for i in graphs:
+        key = (netmets_keys(ID[i], thr[i], est_path[i])['atlas'], binary[i], graphs[i][0].shape[0])
+        groups.setdefault(key, []).append(i)
+
+    out_paths = [None] * n_graphs
+    for (atlas, flag, N), group in groups.items():
+        metric_names = _plan_metric_names(*metric_lists[flag][1:])
+        if len(group) >= min_batch_size:
+            print(f"\nComputing shared intermediates of {len(group)} graphs of {atlas} ({N} nodes) in batches...")
+        for start in range(0, len(group), max_batch_size):
+            chunk = group[start:start + max_batch_size]
+            caches = [None] * len(chunk)
+            if len(group) >= min_batch_size:
+                try:
+                    caches = batch_plan_intermediates(np.stack([graphs[i][0].toarray() for i in chunk]),
+                                                      metric_names)
+                except Exception as e:
+                    print(f"{'WARNING: '}Batched intermediates of {atlas} failed ({e}). Computing them per graph...")
+            for i, cache in zip(chunk, caches):
+                try:
+                    metric_list_names, net_met_val_list_final = _run_metric_tasks(
+                        *graphs[i], *metric_lists[flag], n_procs=n_procs, cache=cache,
+                        community_dir=op.dirname(op.realpath(est_path[i])))
+                    out_paths[i] = save_netmets(op.dirname(op.realpath(est_path[i])), est_path[i],
+                                                metric_list_names, net_met_val_list_final,
+                                                keys=netmets_keys(ID[i], thr[i], est_path[i]))
+                except Exception as e:
+                    print(f"{'WARNING: '}Skipping graph analysis of {est_path[i]}, which failed: {e}")
+            gc.collect()
+
+    out_paths = [i for i in out_paths if i is not None]
+    if not out_paths:
+        raise ValueError('Graph analysis failed for every graph')
+
+    if sweep is True:
+        for flag, (_, metric_list_global_names, _, metric_list_nodal) in metric_lists.items():
+            swept = [i for i in graphs if binary[i] == flag]
+            sweep_threshold_stacks([thr[i] for i in swept], [est_path[i] for i in swept],
+                                   metric_list=[i for i in metric_list_global_names + list(metric_list_nodal) if i in
+                                                ('global_efficiency', 'average_shortest_path_length',
+                                                 'average_clustering', 'weighted_transitivity',
+                                                 'betweenness_centrality')], binary=flag)
+    return out_paths
+
+
+def sweep_thresholds(conn_matrix, thr_list, metric_list=None, binary=False):
+    """
+    Compute graph metrics across a set of proportional thresholds in a single incremental sweep.
 
-    out_path_neat = save_netmets(dir_path, est_path, metric_list_names, net_met_val_list_final)
+    Proportional thresholds of the same matrix yield nested edge sets, so rather than thresholding
+    and analyzing each graph from scratch, edges are sorted once and added in order of descending
+    weight (i.e. in the same order that threshold_proportional retains them). Degree, strength,
+    density, connected components (via union-find) and triangle counts are maintained as each
+    edge is added, and are read off whenever the edge count of the next threshold is reached.
+    Metrics that do not admit incremental maintenance are recomputed in full at each threshold.
 
-    # Cleanup
-    del net_met_val_list_final, metric_list_names, metric_list_global
-    gc.collect()
+    Parameters
+    ----------
+    conn_matrix : NxN np.ndarray
+        Undirected (raw) connectivity matrix.
+    thr_list : list
+        Proportional thresholds (0<thr<=1), e.g. those spanning min_thr to max_thr by step_thr.
+    metric_list : list
+        Optional list of MetricPlan-supported metric names (e.g. 'global_efficiency',
+        'betweenness_centrality') to recompute in full at each threshold. Default is None.
+    binary : bool
+        Indicates whether to binarize the graph at each threshold, such that every edge has unit weight.
+        Default is False.
 
-    return out_path_neat
+    Returns
+    -------
+    df_sweep : DataFrame
+        One row per threshold (in ascending order), with a `thr` column and one column per
+        metric, named as in the netmetrics csv files produced by extractnetstats.
+    df_auc : DataFrame
+        Area Under the Curve of each metric across thresholds, with columns suffixed by `_auc`.
+
+    References
+    ----------
+    .. [1] Drakesmith, M., Caeyenberghs, K., Dutt, A., Lewis, G., David, A. S., &
+      Jones, D. K. (2015). Overcoming the effects of false positives and threshold
+      bias in graph theoretical analyses of neuroimaging data. NeuroImage.
+      https://doi.org/10.1016/j.neuroimage.2015.05.011
+
+    """
+    W = np.array(conn_matrix, dtype=np.float64)
+    np.fill_diagonal(W, 0)
+    if not np.allclose(W, W.T):
+        raise ValueError('Incremental threshold sweeps are only supported for undirected graphs')
+    n = W.shape[0]
+    thr_list = sorted(float(thr) for thr in thr_list)
+    if any(thr > 1 or thr < 0 for thr in thr_list):
+        raise ValueError('Threshold must be in range [0,1]')
+    recompute = [i for i in (metric_list or []) if i not in ('density', 'transitivity', 'local_clustering',
+                                                             'degree_centrality')]
+
+    # Sort edges once, exactly as threshold_proportional does
+    ind = np.where(np.triu(W, 1))
+    order = np.argsort(W[ind])[::-1]
+    rows, cols = ind[0][order], ind[1][order]
+    weights = np.ones(len(rows)) if binary is True else W[rows, cols]
+
+    A = np.zeros((n, n), dtype=bool)
+    deg = np.zeros(n)
+    strength = np.zeros(n)
+    triangles = np.zeros(n)
+    parent = np.arange(n)
+    size = np.ones(n, dtype=int)
+    n_components = n
+    largest = 1 if n > 0 else 0
+
+    def _find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    rows_out = []
+    e = 0
+    for thr in thr_list:
+        en = min(int(round((n * n - n) * thr / 2)), len(weights))
+        for u, v, w in zip(rows[e:en], cols[e:en], weights[e:en]):
+            common = A[u] & A[v]
+            c = np.count_nonzero(common)
+            if c > 0:
+                triangles[common] += 1
+                triangles[u] += c
+                triangles[v] += c
+            A[u, v] = A[v, u] = True
+            deg[u] += 1
+            deg[v] += 1
+            strength[u] += w
+            strength[v] += w
+            ru, rv = _find(u), _find(v)
+            if ru != rv:
+                if size[ru] < size[rv]:
+                    ru, rv = rv, ru
+                parent[rv] = ru
+                size[ru] += size[rv]
+                largest = max(largest, size[ru])
+                n_components -= 1
+        e = en
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            clustering = np.where(deg > 1, 2 * triangles / (deg * (deg - 1)), 0)
+        triads = np.sum(deg * (deg - 1))
+        row = {'thr': thr,
+               'density': 2 * en / (n * (n - 1)) if n > 1 else 0,
+               'average_strength': np.mean(strength),
+               'number_of_components': n_components,
+               'largest_component_size': largest,
+               'transitivity': 0 if triads == 0 else 2 * np.sum(triangles) / triads}
+        row.update({f"{i}_local_clustering": clustering[i] for i in range(n)})
+        row['average_local_clustering_nodewise'] = np.mean(clustering)
+        row.update({f"{i}_degree_centrality": deg[i] / (n - 1) for i in range(n)})
+        row['average_degree_centrality'] = np.mean(deg) / (n - 1)
+
+        if len(recompute) > 0:
+            W_thr = np.zeros((n, n))
+            W_thr[rows[:en], cols[:en]] = weights[:en]
+            plan = MetricPlan(W_thr + W_thr.T)
+            for metric in recompute:
+                try:
+                    if metric == 'betweenness_centrality':
+                        bc = plan.betweenness_centrality()
+                        row.update({f"{i}_betweenness_centrality": bc[i] for i in range(n)})
+                        row['average_betweenness_centrality'] = np.mean(list(bc.values()))
+                    else:
+                        row[metric] = plan.metric(metric)
+                except:
+                    print(f"{'WARNING: '}{metric}{' failed for G at threshold '}{thr}")
+                    row[metric] = np.nan
+        rows_out.append(row)
+
+    df_sweep = pd.DataFrame(rows_out)
+
+    # Area Under the Curve across thresholds, skipping undefined values
+    auc = {}
+    for measure in df_sweep.columns[1:]:
+        vals = np.array(df_sweep[measure], dtype='float32')
+        vals = vals[~np.isnan(vals)]
+        # Trapezoidal rule with unit spacing, as in collect_pandas_df_make
+        auc[f"{measure}_auc"] = np.sum(vals[1:] + vals[:-1]) / 2
+    df_auc = pd.DataFrame([auc])
+
+    return df_sweep, df_auc
+
+
+def _auc_file_name(net_mets_path):
+    """
+    Name of the AUC csv file of a threshold set, from the graph metrics file of any of its graphs, i.e. a csv file
+    saved by save_netmets, or a parquet file of the netmetrics.parquet store, named after its graph.
+    """
+    import re
+    import os.path as op
+
+    name = op.basename(net_mets_path)
+    if name.endswith('.parquet'):
+        name = f"{name.split('.parquet')[0]}_net_mets_neat.csv"
+    return re.sub(r'thr\-\d+\.*\d+', '', name).replace('neat', 'auc')
 
 
 def collect_pandas_df_make(net_mets_csv_list, ID, network, plot_switch, nc_collect=False, create_summary=True,
@@ -1694,7 +4078,8 @@ def collect_pandas_df_make(net_mets_csv_list, ID, network, plot_switch, nc_colle
     Parameters
     ----------
     net_mets_csv_list : list
-        List of file paths to pickled pandas dataframes as themselves.
+        List of file paths to the graph metrics produced by extractnetstats, either parquet files of the
+        netmetrics.parquet store or csv files.
     ID : str
         A subject id or other unique identifier.
     network : str
@@ -1737,44 +4122,79 @@ def collect_pandas_df_make(net_mets_csv_list, ID, network, plot_switch, nc_colle
         raise UserWarning('Warning! Number of actual models produced less than expected. Some graphs were excluded')
 
     net_mets_csv_list = net_mets_csv_list_exist
-    subject_path = op.dirname(op.dirname(op.dirname(net_mets_csv_list[0])))
+    # Graph metrics are either parquet files of the netmetrics.parquet store, or csv files, of the netmetrics
+    # directory
+    columnar = all(i.endswith('.parquet') for i in net_mets_csv_list)
+    netmetrics_dir = op.dirname(op.dirname(net_mets_csv_list[0])) if columnar else op.dirname(net_mets_csv_list[0])
+    subject_path = op.dirname(op.dirname(netmetrics_dir))
 
     if len(net_mets_csv_list) > 1:
         print(f"\n\nAll graph analysis results:\n{str(net_mets_csv_list)}\n\n")
 
-        models = []
-        for file_ in net_mets_csv_list:
-            models.append(f"{op.basename(op.dirname(op.dirname(file_)))}{'/netmetrics/'}{op.basename(file_)}")
-
-        def sort_thr(model_name):
-            return model_name.split('thr-')[1].split('_')[0]
-
-        models.sort(key=sort_thr)
-
-        # Group by secondary attributes
-        models_grouped = [list(x) for x in zip(*[list(g) for k, g in
-                                                 groupby(models, lambda s: s.split('thr-')[1].split('_')[0])])]
-
         hyperparam_dict = {}
         dfs_non_auc = []
         hyperparam_dict['id'] = ID
         gen_hyperparams = ['nodetype', 'est']
-        if max([len(i) for i in models_grouped]) > 1:
-            print('Multiple thresholds detected. Computing Area Under the Curve (AUC)...')
-            meta = dict()
-            non_decimal = re.compile(r'[^\d.]+')
-            for thr_set in range(len(models_grouped)):
-                meta[thr_set] = dict()
-                meta[thr_set]['dataframes'] = dict()
-                for i in models_grouped[thr_set]:
-                    thr = non_decimal.sub('', i.split('thr-')[1].split('_')[0])
-                    _file = subject_path + '/' + i
-                    df = pd.read_csv(_file)
-                    node_cols = [s for s in list(df.columns) if isinstance(s, int) or any(c.isdigit() for c in s)]
-                    if nc_collect is False:
-                        df = df.drop(node_cols, axis=1)
-                    meta[thr_set]['dataframes'][thr] = df
+        meta = dict()
+        if columnar:
+            # Threshold sets are the models of the store, so that they are read with filtered scans rather than by
+            # parsing file names and csv headers
+            df_keys = read_netmets(net_mets_csv_list, columns=['atlas', 'modality', 'model', 'thr'])
+            store_paths = {(op.basename(op.dirname(op.dirname(op.dirname(i)))),
+                            re.sub(r'_thr-[^_]+$', '', op.basename(i).split('.parquet')[0])): i for i in
+                           net_mets_csv_list}
+            thr_sets = df_keys.drop_duplicates().groupby(['atlas', 'modality', 'model'], sort=False, dropna=False)
+            if max(thr_sets.size()) > 1:
+                print('Multiple thresholds detected. Computing Area Under the Curve (AUC)...')
+                df_wide = netmets_to_wide(read_netmets(net_mets_csv_list, **({} if nc_collect else {'node': None})))
+                for thr_set, ((atlas, modality, model), _) in enumerate(thr_sets):
+                    df_model = df_wide.xs((atlas, modality, model), level=('atlas', 'modality', 'model'),
+                                          drop_level=False).sort_index(level='thr')
+                    meta[thr_set] = {'name': model, 'atlas': atlas, 'modality': modality,
+                                     'file_renamed': _auc_file_name(store_paths[(atlas, model)])}
+                    meta[thr_set]['dataframes'] = {str(thr): df_model.iloc[[i]].reset_index(drop=True) for i, thr in
+                                                   enumerate(df_model.index.get_level_values('thr'))}
+            else:
+                df_wide = netmets_to_wide(read_netmets(net_mets_csv_list))
+                dfs_non_auc = [df_wide.iloc[[i]].reset_index(drop=True) for i in range(len(df_wide))]
+        else:
+            models = []
+            for file_ in net_mets_csv_list:
+                models.append(f"{op.basename(op.dirname(op.dirname(file_)))}{'/netmetrics/'}{op.basename(file_)}")
+
+            def sort_thr(model_name):
+                return model_name.split('thr-')[1].split('_')[0]
+
+            models.sort(key=sort_thr)
+
+            # Group by secondary attributes
+            models_grouped = [list(x) for x in zip(*[list(g) for k, g in
+                                                     groupby(models, lambda s: s.split('thr-')[1].split('_')[0])])]
+
+            if max([len(i) for i in models_grouped]) > 1:
+                print('Multiple thresholds detected. Computing Area Under the Curve (AUC)...')
+                non_decimal = re.compile(r'[^\d.]+')
+                for thr_set in range(len(models_grouped)):
+                    meta[thr_set] = dict()
+                    meta[thr_set]['name'] = models_grouped[thr_set]
+                    meta[thr_set]['atlas'] = models_grouped[thr_set][0].split('/')[0]
+                    meta[thr_set]['file_renamed'] = list(set([_auc_file_name(i) for i in
+                                                              models_grouped[thr_set]]))[0]
+                    meta[thr_set]['modality'] = meta[thr_set]['file_renamed'].split('modality-')[1].split('_')[0]
+                    meta[thr_set]['dataframes'] = dict()
+                    for i in models_grouped[thr_set]:
+                        thr = non_decimal.sub('', i.split('thr-')[1].split('_')[0])
+                        _file = subject_path + '/' + i
+                        df = pd.read_csv(_file)
+                        node_cols = [s for s in list(df.columns) if isinstance(s, int) or any(c.isdigit() for c in s)]
+                        if nc_collect is False:
+                            df = df.drop(node_cols, axis=1)
+                        meta[thr_set]['dataframes'][thr] = df
+            else:
+                for file_ in net_mets_csv_list:
+                    dfs_non_auc.append(pd.read_csv(file_))
 
+        if meta:
             # For each unique threshold set, for each graph measure, extract AUC
             if sql_out is True:
                 try:
@@ -1791,12 +4211,10 @@ def collect_pandas_df_make(net_mets_csv_list, ID, network, plot_switch, nc_colle
                 df_summary_auc = df_summary.iloc[[0]]
                 df_summary_auc.columns = [col + '_auc' for col in df_summary.columns]
 
-                print(f"\nAUC for threshold group: {models_grouped[thr_set]}")
-                file_renamed = list(set([re.sub(r'thr\-\d+\.*\d+', '',
-                                                i.split('/netmetrics/')[1]).replace('neat', 'auc') for i in
-                                         models_grouped[thr_set]]))[0]
-                atlas = models_grouped[thr_set][0].split('/')[0]
-                modality = file_renamed.split('modality-')[1].split('_')[0]
+                print(f"\nAUC for threshold group: {meta[thr_set]['name']}")
+                file_renamed = meta[thr_set]['file_renamed']
+                atlas = meta[thr_set]['atlas']
+                modality = meta[thr_set]['modality']
 
                 # Build hyperparameter dictionary
                 hyperparam_dict, hyperparams = utils.build_hp_dict(file_renamed, atlas, modality, hyperparam_dict,
@@ -1823,9 +4241,6 @@ def collect_pandas_df_make(net_mets_csv_list, ID, network, plot_switch, nc_colle
                     # sql_db.engine.execute("SELECT * FROM func").fetchall()
                     del sql_db
                 del df_summary_auc
-        else:
-            for file_ in net_mets_csv_list:
-                dfs_non_auc.append(pd.read_csv(file_))
 
         if create_summary is True:
             try:
@@ -1835,18 +4250,16 @@ def collect_pandas_df_make(net_mets_csv_list, ID, network, plot_switch, nc_colle
 
                 # Concatenate and find mean across dataframes
                 print('Concatenating frames...')
-                if models_grouped:
-                    if max([len(i) for i in models_grouped]) > 1:
-                        df_concat = pd.concat([meta[thr_set]['auc_dataframe'] for thr_set in meta.keys()])
-                        del meta
-                    else:
-                        df_concat = pd.concat(dfs_non_auc)
+                if meta:
+                    df_concat = pd.concat([meta[thr_set]['auc_dataframe'] for thr_set in meta.keys()])
+                    del meta
                 else:
                     df_concat = pd.concat(dfs_non_auc)
                 measures = list(df_concat.columns)
                 if plot_switch is True:
                     from pynets.plotting import plot_gen
-                    plot_gen.plot_graph_measure_hists(df_concat, measures, file_)
+                    plot_gen.plot_graph_measure_hists(df_concat, measures,
+                                                      f"{netmetrics_dir}/{op.basename(net_mets_csv_list[-1])}")
                 df_concatted_mean = df_concat.loc[:, measures].mean(skipna=True).to_frame().transpose()
                 df_concatted_median = df_concat.loc[:, measures].median(skipna=True).to_frame().transpose()
                 df_concatted_mode = pd.DataFrame(df_concat.loc[:, measures].mode(axis=0, dropna=True).max()).transpose()
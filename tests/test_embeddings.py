@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Dec 27 16:19:14 2017
+
+@authors: Derek Pisner & Ryan Hammonds
+
+"""
+import numpy as np
+import os
+import time
+from pynets.core import utils
+import pytest
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(50)
+
+
+def test_build_asetomes_stack(tmp_path):
+    """
+    Test embedding graphs that were thresholded in a batch, and so only exist as a stack
+    """
+    pytest.importorskip('graspy')
+    from pynets.stats import embeddings
+
+    graph_dir = tmp_path/'sub-002'/'ses-1'/'func'/'atlasA'/'graphs'
+    graph_dir.mkdir(parents=True)
+    rng = np.random.RandomState(42)
+    conn_matrices = rng.rand(3, 20, 20)
+    conn_matrices = conn_matrices + conn_matrices.transpose(0, 2, 1)
+    est_paths = [str(graph_dir/f"002_modality-func_est-cov_nodetype-parc_thrtype-PROP_thr-{thr}.npy") for thr in
+                 [0.1, 0.2, 0.3]]
+    utils.save_mat_stack(conn_matrices, est_paths)
+
+    start_time = time.time()
+    out_paths = embeddings.build_asetomes([est_paths], '002')
+    print("%s%s%s" % ('build_asetomes --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+    assert len(out_paths) == len(est_paths)
+    assert all(os.path.isfile(out_path) for out_path in out_paths)
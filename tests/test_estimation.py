@@ -28,7 +28,8 @@ logger.setLevel(50)
 from pynets.fmri.estimation import (get_conn_matrix, timeseries_bootstrap,
                                     fill_confound_nans, TimeseriesExtraction)
 from pynets.dmri.estimation import (create_anisopowermap, tens_mod_fa_est, tens_mod_est,
-                                    csa_mod_est, csd_mod_est, streams2graph, sfm_mod_est)
+                                    csa_mod_est, csd_mod_est, streams2graph, sfm_mod_est,
+                                    streamline_label_counts)
 
 
 # fMRI
@@ -443,3 +444,105 @@ def test_streams2graph(fa_wei, dsn):
                                     disp_filt, parc, prune, atlas, atlas_dwi, labels, coords, norm, binary,
                                     directget, fa_path, error_margin, min_length, fa_wei)[2]
     assert conn_matrix is not None
+
+
+@pytest.mark.parametrize("fa_wei", [True, False])
+def test_streams2graph_synthetic(tmp_path, fa_wei):
+    """
+    Test streams2graph's edge accumulation on a synthetic atlas and tractogram against per-streamline counting
+    """
+    from itertools import combinations
+    from dipy.io.streamline import save_tractogram, load_tractogram
+    from dipy.io.stateful_tractogram import StatefulTractogram, Space, Origin
+    from dipy.tracking.streamline import values_from_volume
+    from dipy.tracking._utils import _mapping_to_voxel, _to_voxel_coordinates
+    from pynets.core import nodemaker
+
+    rng = np.random.RandomState(42)
+    atlas_data = rng.randint(0, 9, size=(3, 3, 3)).repeat(6, 0).repeat(6, 1).repeat(6, 2).astype('float64')
+    atlas_img = nib.Nifti1Image(atlas_data, np.eye(4))
+    atlas_path = str(tmp_path/'atlas.nii.gz')
+    nib.save(atlas_img, atlas_path)
+    fa_path = str(tmp_path/'fa.nii.gz')
+    nib.save(nib.Nifti1Image(rng.rand(18, 18, 18), np.eye(4)), fa_path)
+
+    # Straight streamlines between random points of the volume
+    streamlines = []
+    for _ in range(200):
+        start, end = rng.uniform(1, 16, size=(2, 3))
+        streamlines.append(np.linspace(start, end, rng.randint(5, 30)).astype(np.float32))
+    streams = str(tmp_path/'streamlines.trk')
+    save_tractogram(StatefulTractogram(streamlines, atlas_img, Space.RASMM), streams, bbox_valid_check=False)
+
+    atlas_labels = np.unique(atlas_data)[1:]
+    coords = list(range(len(atlas_labels)))
+    labels = list(range(1, len(atlas_labels) + 1))
+    error_margin = 1
+    overlap_thr = 2
+
+    start_time = time.time()
+    conn_matrix = streams2graph(atlas_path, streams, overlap_thr, str(tmp_path), 'local', 200, 'csd', None, None,
+                                False, '002', None, False, False, True, 0, 'atlas', atlas_path, labels, coords, 0,
+                                False, 'prob', fa_path, error_margin, 0, fa_wei)[2]
+    print("%s%s%s" % ('streams2graph --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    # Reference, one streamline at a time. With FA weighting, each streamline contributes its mean FA (normalized by
+    # the global range of FA) to its edges, rather than 1.
+    sl = load_tractogram(streams, atlas_img, to_space=Space.RASMM, to_origin=Origin.TRACKVIS,
+                         bbox_valid_check=False).streamlines
+    fa_vals = values_from_volume(np.asarray(nib.load(fa_path).dataobj), sl, np.eye(4))
+    fa_all = np.concatenate(fa_vals)
+    fa_min, fa_max = np.min(fa_all[fa_all > 0]), np.max(fa_all)
+    lin_T, offset = _mapping_to_voxel(np.eye(4))
+    expected = np.zeros((len(atlas_labels), len(atlas_labels)))
+    for s, vals in zip(sl, fa_vals):
+        lab_coords = np.vstack([nodemaker.get_sphere(coord, error_margin, (1, 1, 1), atlas_data.shape)
+                                for coord in _to_voxel_coordinates(s, lin_T, offset)])
+        lab_arr = atlas_data[tuple(lab_coords.T)]
+        endlabels = [np.flatnonzero(atlas_labels == lab)[0] for lab in atlas_labels if
+                     np.sum(lab_arr == lab) >= overlap_thr]
+        weight = np.mean((np.asarray(vals) - fa_min) / (fa_max - fa_min)) if fa_wei is True else 1
+        for i, j in combinations(endlabels, 2):
+            expected[i, j] += weight
+            expected[j, i] += weight
+
+    assert np.count_nonzero(expected) > 0
+    assert np.allclose(conn_matrix, expected)
+
+
+@pytest.mark.parametrize("error_margin,vox_dims",
+    [
+        (1, (1.0, 1.0, 1.0)),
+        (2, (1.0, 1.0, 1.0)),
+        # Half-voxel offsets
+        (3, (2.0, 2.0, 2.0)),
+        # Anisotropic voxels, with non-integer ratios to the error margin
+        (2, (1.5, 2.0, 2.5)),
+        (3, (1.2, 0.9, 2.0)),
+        # An error margin too small to reach any voxel
+        (0.4, (1.0, 1.0, 1.0))
+    ]
+)
+def test_streamline_label_counts(error_margin, vox_dims):
+    """
+    Test vectorized streamline-to-label mapping against per-point spherical neighborhoods
+    """
+    from pynets.core import nodemaker
+    rng = np.random.RandomState(42)
+    atlas_data = rng.randint(0, 20, size=(4, 4, 4)).repeat(5, 0).repeat(5, 1).repeat(5, 2).astype('float64')
+    streamlines = [np.clip(np.round(np.cumsum(rng.randn(rng.randint(5, 30), 3), 0) + 10), 0, 20).astype(int)
+                   for _ in range(100)]
+    lengths = np.array([len(s) for s in streamlines])
+
+    start_time = time.time()
+    label_counts = streamline_label_counts(np.vstack(streamlines), lengths, atlas_data,
+                                           nodemaker.get_sphere_offsets(error_margin, vox_dims)).toarray()
+    print("%s%s%s" % ('streamline_label_counts --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    atlas_labels = np.unique(atlas_data)[1:]
+    assert label_counts.shape == (len(streamlines), len(atlas_labels))
+    for s, counts in zip(streamlines, label_counts):
+        lab_coords = np.vstack([nodemaker.get_sphere(coord, error_margin, vox_dims, atlas_data.shape)
+                                for coord in s]).reshape(-1, 3)
+        lab_arr = atlas_data[tuple(lab_coords.T)]
+        assert np.array_equal(counts, [np.sum(lab_arr == lab) for lab in atlas_labels])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Dec 27 16:19:14 2017
+
+@authors: Derek Pisner & Ryan Hammonds
+
+"""
+import pytest
+import numpy as np
+import networkx as nx
+import time
+from itertools import combinations
+from pynets.stats import netmotifs
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(50)
+
+
+def _brute_force_census(A, N):
+    """
+    Motif-class counts of every connected induced N-node subgraph, by exhaustive enumeration.
+    """
+    G = nx.from_numpy_array(A)
+    counts = dict.fromkeys(netmotifs.MOTIF_CLASSES[N], 0)
+    for nodes in combinations(range(A.shape[0]), N):
+        H = G.subgraph(nodes)
+        if nx.is_connected(H):
+            counts[''.join(str(d) for d in sorted(dict(H.degree()).values()))] += 1
+    return np.array(list(counts.values()))
+
+
+@pytest.mark.parametrize("N", [3, 4])
+@pytest.mark.parametrize("n_procs", [1, 2])
+def test_motif_census(N, n_procs):
+    """
+    Test ESU motif census across ascending thresholds against exhaustive enumeration
+    """
+    in_mat = np.random.RandomState(42).rand(16, 16)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    thresholds = [0.8, 0.5, 0.7, 0.6]
+
+    start_time = time.time()
+    counts = netmotifs.motif_census(in_mat, N=N, thresholds=thresholds, n_procs=n_procs)
+    print("%s%s%s" % ('motif_census --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert counts.shape == (len(thresholds), len(netmotifs.MOTIF_CLASSES[N]))
+    for thr, census in zip(thresholds, counts):
+        assert np.array_equal(census, _brute_force_census((in_mat > thr).astype(int), N))
+
+    umotifs = netmotifs.countmotifs((in_mat > 0.6).astype(int), N=N)
+    assert [umotifs[k] for k in netmotifs.MOTIF_CLASSES[N]] == list(counts[3])
+    assert np.array_equal(netmotifs.adaptivethresh(in_mat, 0.6, list(netmotifs.MOTIF_CLASSES[N]), N), counts[3])
+
+
+def test_compare_motifs(tmp_path):
+    """
+    Test motif comparison and threshold selection across structural and functional graphs
+    """
+    pytest.importorskip('multinetx')
+    rng = np.random.RandomState(42)
+    struct_mat = np.triu(rng.rand(20, 20), 1)
+    struct_mat[struct_mat < 0.7] = 0
+    struct_mat = struct_mat + struct_mat.T
+    func_mat = np.triu(rng.rand(20, 20), 1)
+    func_mat = func_mat + func_mat.T
+
+    start_time = time.time()
+    [mg_dict, g_dict] = netmotifs.compare_motifs(struct_mat, func_mat, 'test', str(tmp_path), bins=20, n_procs=1)
+    print("%s%s%s" % ('compare_motifs --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert len(mg_dict) > 0
+    assert list(mg_dict.keys()) == list(g_dict.keys())
+    for thr, (func_thr_mat, struct_thr_mat) in g_dict.items():
+        assert func_thr_mat[func_thr_mat > 0].min() >= float(thr)
+        assert struct_thr_mat.max() <= 1
+    # Thresholds yielding identical thresholded matrices share a multigraph
+    assert len(set(mg_dict.values())) == len({tuple(np.flatnonzero(np.hstack(mats))) for mats in g_dict.values()})
@@ -9,6 +9,7 @@ Created on Wed Dec 27 16:19:14 2017
 import pytest
 import numpy as np
 import networkx as nx
+import pandas as pd
 import time
 from pathlib import Path
 from pynets.stats import netstats
@@ -48,6 +49,42 @@ def test_average_local_efficiency():
     assert average_local_efficiency is not None
 
 
+@pytest.mark.parametrize("weight", ['weight', None])
+def test_efficiency_mat(weight):
+    """
+    Test matrix-native global and local efficiency against NetworkX path lengths
+    """
+    in_mat = np.random.RandomState(42).rand(100, 100)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    in_mat[in_mat < 0.8] = 0
+    G = nx.from_numpy_array(in_mat)
+
+    def ref_global_efficiency(H):
+        if len(H) < 2:
+            return 0
+        inv_lengths = []
+        for node in H:
+            if weight is None:
+                lengths = nx.single_source_shortest_path_length(H, node)
+            else:
+                lengths = nx.single_source_dijkstra_path_length(H, node, weight=weight)
+            inv_lengths.extend([1 / x for x in lengths.values() if x != 0])
+        return sum(inv_lengths) / (len(H) * (len(H) - 1))
+
+    start_time = time.time()
+    ge = netstats.global_efficiency(G, weight=weight)
+    le = netstats.local_efficiency(G, weight=weight)
+    print("%s%s%s" % ('efficiency (matrix) --> finished: ', str(np.round(time.time() - start_time, 3)), 's'))
+
+    start_time = time.time()
+    ge_ref = ref_global_efficiency(G)
+    le_ref = [ref_global_efficiency(G.subgraph(G.neighbors(node))) for node in G]
+    print("%s%s%s" % ('efficiency (networkx) --> finished: ', str(np.round(time.time() - start_time, 3)), 's'))
+
+    assert np.isclose(ge, ge_ref)
+    assert np.allclose(list(le.values()), le_ref)
+
+
 # used random node_comm_aff_mat
 def test_create_communities():
     """
@@ -120,7 +157,7 @@ def test_diversity_coef_sign():
     [
         'single',
         'complete',
-        pytest.param(None, marks=pytest.mark.xfail(raises=UnboundLocalError))
+        pytest.param(None, marks=pytest.mark.xfail(raises=ValueError))
     ]
 )
 def test_link_communities(clustering):
@@ -137,6 +174,26 @@ def test_link_communities(clustering):
     assert M is not None
 
 
+@pytest.mark.parametrize("clustering", ['single', 'complete'])
+def test_link_communities_large(clustering):
+    """
+    Test link_communities on a 200-node graph with ~4000 links
+    """
+    in_mat = np.random.RandomState(42).rand(200, 200)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    in_mat[in_mat < 0.8] = 0
+    in_mat_orig = in_mat.copy()
+
+    start_time = time.time()
+    M = netstats.link_communities(in_mat, type_clustering=clustering)
+    print("%s%s%s" % ('link_communities --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert np.array_equal(in_mat, in_mat_orig)
+    assert M.shape[1] == 200
+    assert np.all(np.isin(M, [0, 1]))
+    assert np.all(np.sum(M, axis=1) > 2)
+
+
 def test_prune_disconnected():
     """
     Test pruning functionality
@@ -213,6 +270,286 @@ def test_extractnetstats(binary, prune, norm):
         pass
 
 
+def test_extractnetstats_batch(tmp_path):
+    """
+    Test that batch-mode graph analysis of graphs sharing an atlas matches analyzing each graph separately
+    """
+    graph_dir = tmp_path/'sub-002'/'ses-1'/'func'/'atlasA'/'graphs'
+    graph_dir.mkdir(parents=True)
+    rng = np.random.RandomState(42)
+    est_paths = []
+    thr_list = [0.2, 0.3, 0.4]
+    for thr in thr_list:
+        in_mat = np.triu(rng.rand(30, 30), 1)
+        in_mat = in_mat + in_mat.T
+        in_mat[in_mat < np.quantile(in_mat, 1 - thr)] = 0
+        est_paths.append(str(graph_dir/f"rawgraph_sub-002_modality-func_model-corr_thr-{thr}.npy"))
+        np.save(est_paths[-1], in_mat)
+
+    df_single = netstats.read_netmets([netstats.extractnetstats('002', None, thr, 'corr', est_path, None, 1, 0,
+                                                                False) for thr, est_path in zip(thr_list, est_paths)])
+    # A graph that fails to load is skipped, without failing the others
+    missing_path = str(graph_dir/"rawgraph_sub-002_modality-func_model-corr_thr-0.5.npy")
+    start_time = time.time()
+    out_paths = netstats.extractnetstats_batch('002', None, thr_list + [0.5], 'corr', est_paths + [missing_path],
+                                               None, 1, 0, False, sweep=True)
+    print("%s%s%s" % ('extractnetstats_batch --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+    df_batch = netstats.read_netmets(out_paths)
+    assert len(out_paths) == len(est_paths)
+    pd.testing.assert_frame_equal(df_single, df_batch)
+    # Independently drawn graphs are not thresholds of the same graph, so they are not swept
+    assert not list(graph_dir.glob('*_thr-sweep*.csv'))
+
+
+def test_sweep_threshold_stacks(tmp_path):
+    """
+    Test that graphs that differ only by proportional threshold are swept from their densest graph
+    """
+    from pynets.core import thresholding
+    in_mat = np.random.RandomState(42).rand(30, 30)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    thr_list = [0.3, 0.1, 0.2]
+    est_paths = []
+    for thr in thr_list:
+        est_paths.append(str(tmp_path/f"rawgraph_sub-002_modality-func_model-corr_thr-{thr}.npy"))
+        np.save(est_paths[-1], thresholding.threshold_proportional(in_mat, thr))
+    # A graph of another model is not part of the stack
+    other_path = str(tmp_path/"rawgraph_sub-002_modality-func_model-cov_thr-0.1.npy")
+    np.save(other_path, thresholding.threshold_proportional(in_mat, 0.1))
+
+    start_time = time.time()
+    out_paths = netstats.sweep_threshold_stacks(thr_list + [0.1], est_paths + [other_path],
+                                                metric_list=['global_efficiency'])
+    print("%s%s%s" % ('sweep_threshold_stacks --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+    assert out_paths == [str(tmp_path/"rawgraph_sub-002_modality-func_model-corr_thr-sweep.csv"),
+                         str(tmp_path/"rawgraph_sub-002_modality-func_model-corr_thr-sweep_auc.csv")]
+    df_sweep, df_auc = netstats.sweep_thresholds(in_mat, thr_list, metric_list=['global_efficiency'])
+    pd.testing.assert_frame_equal(pd.read_csv(out_paths[0]), df_sweep, check_dtype=False)
+    pd.testing.assert_frame_equal(pd.read_csv(out_paths[1]), df_auc, check_dtype=False)
+    assert netstats.sweep_threshold_stacks(thr_list, est_paths, binary=True) == \
+        [str(tmp_path/"rawgraph_sub-002_modality-func_model-corr_thr-sweep_bin.csv"),
+         str(tmp_path/"rawgraph_sub-002_modality-func_model-corr_thr-sweep_bin_auc.csv")]
+
+    # Graphs that are not nested thresholds of their densest graph are skipped
+    np.save(est_paths[1], thresholding.threshold_proportional(in_mat.max() - in_mat, 0.1))
+    assert netstats.sweep_threshold_stacks(thr_list, est_paths) == []
+
+
+def test_batch_graph_metrics():
+    """
+    Test batched graph metrics of a stack of graphs against those of each graph
+    """
+    import community
+    graphs = [nx.connected_watts_strogatz_graph(40, 6, 0.2, seed=i) for i in range(4)]
+    rng = np.random.RandomState(42)
+    stack = np.array([nx.to_numpy_array(G) for G in graphs]) * rng.rand(4, 40, 40)
+    stack = np.maximum(stack, stack.transpose(0, 2, 1))
+
+    start_time = time.time()
+    df = netstats.batch_graph_metrics(stack)
+    print("%s%s%s" % ('batch_graph_metrics --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+    assert set(df['metric']) == set(netstats.BATCH_METRICS)
+    for g in range(len(stack)):
+        plan = netstats.MetricPlan(stack[g])
+        values = df[df['graph'] == g].groupby('metric', sort=False)['value'].apply(np.asarray)
+        assert np.allclose(values['degree'], np.count_nonzero(stack[g], axis=1))
+        assert np.allclose(values['strength'], stack[g].sum(axis=1))
+        assert np.allclose(values['local_clustering'], list(plan.local_clustering().values()))
+        assert np.allclose(values['eigenvector_centrality'], list(plan.eigenvector_centrality().values()))
+        assert np.isclose(values['average_clustering'][0], plan.average_clustering(weighted=True))
+        assert np.isclose(values['global_efficiency'][0], plan.global_efficiency(weighted=True))
+
+    ci = np.array([netstats.community_resolution_selection(nx.from_numpy_array(W))[1] for W in stack])
+    df = netstats.batch_graph_metrics(stack, metric_list=['modularity'], ci=ci)
+    for g in range(len(stack)):
+        G = nx.from_numpy_array(stack[g])
+        assert np.isclose(df['value'][g], community.modularity(dict(zip(G.nodes, ci[g])), G))
+
+
+@pytest.mark.parametrize("n_procs", [1, 2])
+def test_run_metric_schedule(n_procs):
+    """
+    Test that scheduled metrics match those computed sequentially and are returned in task order
+    """
+    in_mat = np.random.RandomState(42).rand(30, 30)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    in_mat[in_mat < 0.6] = 0
+    in_mat_len = netstats.thresholding.weight_conversion(in_mat, 'lengths')
+    mats = {'in_mat': in_mat, 'in_mat_len': in_mat_len}
+    tasks = [('global', netstats.global_efficiency), ('nodal', 'louvain_modularity'),
+             ('nodal', 'participation_coefficient'), ('nodal', 'local_clustering'),
+             ('nodal', 'betweenness_centrality')]
+
+    start_time = time.time()
+    results = netstats.run_metric_schedule(tasks, mats, n_procs=n_procs)
+    print("%s%s%s" % ('run_metric_schedule --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert len(results) == len(tasks)
+    assert all(result is not None for result in results)
+    assert results[0][0] == ['global_efficiency']
+    assert np.isclose(results[0][1][0], netstats.global_efficiency(nx.from_numpy_array(in_mat)))
+    for task, result in zip(tasks[3:], results[3:]):
+        assert np.allclose(result[1], netstats.compute_metric(task, mats)[1])
+
+
+def test_metric_plan():
+    """
+    Test that metrics derived from shared MetricPlan intermediates match NetworkX
+    """
+    in_mat = np.random.RandomState(42).rand(60, 60)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    in_mat[in_mat < 0.9] = 0
+    G = nx.from_numpy_array(in_mat)
+
+    start_time = time.time()
+    plan = netstats.MetricPlan(in_mat)
+    assert np.isclose(plan.global_efficiency(), netstats.global_efficiency(G))
+    assert np.isclose(plan.average_clustering(), nx.average_clustering(G, weight='weight'))
+    assert np.isclose(plan.transitivity(), nx.transitivity(G))
+    assert np.isclose(plan.weighted_transitivity(), netstats.weighted_transitivity(G))
+    assert np.allclose(list(plan.local_clustering().values()), list(nx.clustering(G).values()))
+    assert np.allclose(list(plan.degree_centrality().values()), list(nx.degree_centrality(G).values()))
+    assert np.allclose(list(plan.betweenness_centrality().values()),
+                       list(nx.betweenness_centrality(G, normalized=True).values()))
+    assert np.isclose(plan.average_shortest_path_length(), netstats.average_shortest_path_length_for_all(G))
+    print("%s%s%s" % ('MetricPlan --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    report = plan.report()
+    assert (report['computed'] == 1).all()
+    assert report.set_index('intermediate').loc['degrees', 'eliminated'] > 0
+
+    report = plan.report(['global_efficiency', 'average_shortest_path_length', 'eigenvector_centrality'])
+    assert report.set_index('intermediate').loc['distances', 'eliminated'] == 1
+
+
+@pytest.mark.parametrize("epsilon", [0.2, 0.001])
+def test_approximate_betweenness_centrality(epsilon):
+    """
+    Test pivot-sampled betweenness centrality against exact values, within its achieved error bound
+    """
+    G = nx.connected_watts_strogatz_graph(600, 6, 0.1, seed=1)
+    exact = np.array(list(nx.betweenness_centrality(G, normalized=True).values()))
+
+    start_time = time.time()
+    bc, bound = netstats.approximate_betweenness_centrality(nx.to_numpy_array(G), epsilon=epsilon, delta=0.1)
+    print("%s%s%s" % ('approximate_betweenness_centrality --> finished: ',
+                      str(np.round(time.time() - start_time, 1)), 's'))
+    assert bound <= epsilon
+    assert np.max(np.abs(np.array(list(bc.values())) - exact)) <= bound + 1e-12
+    if epsilon < 0.01:
+        # Too small a bound to sample for, such that betweenness is computed from every node
+        assert bound == 0
+
+    plan = netstats.MetricPlan(nx.to_numpy_array(G))
+    metric_list_names, net_met_val_list_final = netstats.get_betweenness_centrality(None, [], [], plan=plan,
+                                                                                    approximate=True,
+                                                                                    epsilon=epsilon)
+    assert metric_list_names[-1] == 'betweenness_centrality_error_bound'
+    assert net_met_val_list_final[-1] == bound
+    assert len(metric_list_names) == len(net_met_val_list_final) == len(G) + 2
+
+
+def test_rich_club_coefficient():
+    """
+    Test vectorized rich-club coefficients against networkx, and caching of the reference distribution
+    """
+    G = nx.barabasi_albert_graph(200, 4, seed=1)
+    in_mat = nx.to_numpy_array(G)
+
+    start_time = time.time()
+    rc = netstats.rich_club_coefficient_mat(in_mat)
+    rc_null = netstats.rich_club_null_distribution(in_mat, Q=10, nrand=4, n_procs=2)
+    print("%s%s%s" % ('rich_club_coefficient --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+    assert np.allclose(rc, list(nx.rich_club_coefficient(G, normalized=False).values()))
+    assert rc_null.shape[0] == 4
+    assert netstats.rich_club_null_distribution(in_mat, Q=10, nrand=4, n_procs=2) is rc_null
+
+    rc_norm = netstats.rich_club_coefficient_norm(in_mat, Q=10, nrand=4, n_procs=1)
+    assert np.allclose(list(rc_norm.values()), rc / np.mean(rc_null, axis=0), equal_nan=True)
+    metric_list_names, net_met_val_list_final = netstats.get_rich_club_coeff(in_mat, [], [])
+    assert metric_list_names[-1] == 'average_rich_club_coefficient'
+    assert len(metric_list_names) == len(net_met_val_list_final)
+
+
+@pytest.mark.parametrize("graph", [nx.karate_club_graph(), nx.star_graph(10), nx.path_graph(20),
+                                   nx.disjoint_union(nx.petersen_graph(), nx.cycle_graph(6))])
+def test_communicability_betweenness_centrality(graph):
+    """
+    Test eigendecomposition-updated communicability betweenness against networkx, including graphs with repeated
+    eigenvalues (star), widely ranging communicabilities (path) and multiple components
+    """
+    in_mat = nx.to_numpy_array(graph)
+
+    start_time = time.time()
+    cbc = netstats.communicability_betweenness_centrality_mat(in_mat, n_threads=2)
+    print("%s%s%s" % ('communicability_betweenness_centrality_mat --> finished: ',
+                      str(np.round(time.time() - start_time, 1)), 's'))
+    order = len(graph)
+    expected = np.zeros(order)
+    for comp in nx.connected_components(graph):
+        comp = sorted(comp)
+        if len(comp) > 2:
+            # Components are normalized by their own size within networkx
+            scale = ((len(comp) - 1.0) ** 2 - (len(comp) - 1.0)) / ((order - 1.0) ** 2 - (order - 1.0))
+            vals = nx.communicability_betweenness_centrality(graph.subgraph(comp))
+            expected[comp] = [vals[node] * scale for node in comp]
+    assert np.allclose(list(cbc.values()), expected, atol=1e-6)
+
+
+def test_sweep_thresholds():
+    """
+    Test that an incremental threshold sweep matches metrics of each proportionally thresholded graph
+    """
+    from pynets.core import thresholding
+    in_mat = np.random.RandomState(42).rand(50, 50)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    thr_list = [0.3, 0.1, 0.2]
+
+    start_time = time.time()
+    df_sweep, df_auc = netstats.sweep_thresholds(in_mat, thr_list, metric_list=['global_efficiency'])
+    print("%s%s%s" % ('sweep_thresholds --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert list(df_sweep['thr']) == sorted(thr_list)
+    for thr, row in zip(sorted(thr_list), df_sweep.to_dict('records')):
+        G = nx.from_numpy_array(thresholding.threshold_proportional(in_mat, thr))
+        assert np.isclose(row['density'], nx.density(G))
+        assert np.isclose(row['transitivity'], nx.transitivity(G))
+        assert row['number_of_components'] == nx.number_connected_components(G)
+        assert np.allclose([row[f"{i}_local_clustering"] for i in range(50)], list(nx.clustering(G).values()))
+        assert np.isclose(row['global_efficiency'], netstats.global_efficiency(G))
+    assert np.isclose(df_auc['density_auc'][0], np.sum(df_sweep['density'][1:].values +
+                                                       df_sweep['density'][:-1].values) / 2)
+
+    # Binarized graphs have unit edge weights
+    df_sweep_bin = netstats.sweep_thresholds(in_mat, thr_list, metric_list=['global_efficiency'], binary=True)[0]
+    assert np.allclose(df_sweep_bin['average_strength'], df_sweep['average_degree_centrality'] * 49)
+    for thr, row in zip(sorted(thr_list), df_sweep_bin.to_dict('records')):
+        G = nx.from_numpy_array((thresholding.threshold_proportional(in_mat, thr) > 0).astype('float'))
+        assert np.isclose(row['global_efficiency'], netstats.global_efficiency(G))
+
+    with pytest.raises(ValueError):
+        netstats.sweep_thresholds(np.random.rand(5, 5), thr_list)
+
+
+def _slow_metric(G):
+    time.sleep(30)
+    return 0
+
+
+def test_run_metric_schedule_timeout():
+    """
+    Test that a metric exceeding its timeout is terminated and omitted
+    """
+    in_mat = np.random.RandomState(42).rand(20, 20)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    mats = {'in_mat': in_mat, 'in_mat_len': in_mat}
+    tasks = [('global', _slow_metric), ('nodal', 'degree_centrality')]
+
+    results = netstats.run_metric_schedule(tasks, mats, n_procs=2, timeout=1)
+    assert results[0] is None
+    assert results[1] is not None
+
+
 def test_raw_mets():
     """
     Test raw_mets extraction functionality
@@ -236,6 +573,47 @@ def test_raw_mets():
         assert net_met_val is not np.nan
 
 
+def test_raw_mets_disconnected():
+    """
+    Test raw_mets on a fragmented graph against per-component NetworkX computations
+    """
+    from functools import partial
+    from networkx.algorithms import average_shortest_path_length, degree_assortativity_coefficient
+    rng = np.random.RandomState(42)
+    G = nx.disjoint_union_all([nx.connected_watts_strogatz_graph(n, 4, 0.3, seed=n) for n in (30, 12, 6)])
+    for u, v in G.edges():
+        G[u][v]['weight'] = rng.rand()
+    G.add_nodes_from([48, 49])
+    num_nodes = G.number_of_nodes()
+
+    start_time = time.time()
+    components = netstats.connected_component_indices(G)
+    assert [len(c) for c in components] == [30, 12, 6]
+
+    aspl = netstats.raw_mets(G, partial(average_shortest_path_length, weight='weight'), components=components)
+    subgraphs = [G.subgraph(c) for c in nx.connected_components(G) if len(c) > 1]
+    pairs = [len(sg) * (len(sg) - 1) for sg in subgraphs]
+    expected = np.average([nx.average_shortest_path_length(sg, weight='weight') for sg in subgraphs], weights=pairs)
+    assert np.isclose(aspl, expected)
+    assert np.isclose(netstats.raw_mets(G, average_shortest_path_length),
+                      np.average([nx.average_shortest_path_length(sg) for sg in subgraphs], weights=pairs))
+
+    # Assortativity is computed over the whole of G, with weights rescaled to integers
+    H = G.copy()
+    for u, v, d in H.edges(data=True):
+        d['weight'] = int(np.round(100 * d['weight'], 1))
+    assert np.isclose(netstats.raw_mets(G, partial(degree_assortativity_coefficient, weight='weight')),
+                      degree_assortativity_coefficient(H, weight='weight'))
+    print("%s%s%s" % ('raw_mets (disconnected) --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    # G is left intact
+    assert G.number_of_nodes() == num_nodes
+    [H, pruned_nodes] = netstats.prune_disconnected(G)
+    assert G.number_of_nodes() == num_nodes
+    assert H.number_of_nodes() == 30
+    assert pruned_nodes == list(range(30, num_nodes))
+
+
 def test_subgraph_number_of_cliques_for_all():
     """
     Test cliques computation
@@ -267,6 +645,51 @@ def test_smallworldness():
     assert omega < 1
 
 
+@pytest.mark.parametrize("reference", ['random', 'lattice'])
+def test_rewire_degree_preserving(reference):
+    """
+    Test vectorized degree-preserving null model generation
+    """
+    in_mat = np.random.RandomState(42).rand(60, 60)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    in_mat[in_mat < 0.8] = 0
+
+    start_time = time.time()
+    rewired = netstats.rewire_degree_preserving(in_mat, niter=5, seed=1, reference=reference)
+    print("%s%s%s" % ('rewire_degree_preserving --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert np.allclose(rewired, rewired.T)
+    assert np.array_equal(np.sum(rewired != 0, axis=1), np.sum(in_mat != 0, axis=1))
+    assert np.allclose(np.sort(rewired[rewired > 0]), np.sort(in_mat[in_mat > 0]))
+    assert not np.array_equal(rewired != 0, in_mat != 0)
+    assert np.array_equal(rewired, netstats.rewire_degree_preserving(in_mat, niter=5, seed=1, reference=reference))
+
+
+@pytest.mark.parametrize("n_procs", [1, 2])
+def test_null_model_distribution(n_procs):
+    """
+    Test that null model distributions are deterministic across process counts and cached
+    """
+    in_mat = np.random.RandomState(42).rand(40, 40)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    in_mat[in_mat < 0.7] = 0
+    G = nx.from_numpy_array(in_mat)
+
+    netstats._NULL_MODEL_CACHE.clear()
+    null_dist = netstats.null_model_distribution(in_mat, niter=5, nrand=4, n_procs=n_procs)
+    assert len(null_dist['path_length']) == 4
+    assert netstats.null_model_distribution(in_mat, niter=5, nrand=4, n_procs=n_procs) is null_dist
+
+    netstats._NULL_MODEL_CACHE.clear()
+    assert np.allclose(null_dist['clustering'],
+                       netstats.null_model_distribution(in_mat, niter=5, nrand=4, n_procs=1)['clustering'])
+
+    assert np.isclose(netstats.average_clustering_mat(in_mat), nx.average_clustering(G, weight='weight'))
+    assert np.isclose(netstats.weighted_transitivity_mat(in_mat), netstats.weighted_transitivity(G))
+    assert np.isclose(netstats.average_shortest_path_length_mat(in_mat),
+                      nx.average_shortest_path_length(G, weight='weight'))
+
+
 def test_participation_coef_sign():
     """
     Test participation coefficient computation
@@ -285,6 +708,54 @@ def test_participation_coef_sign():
     assert len(Pneg) == ci_dim
 
 
+def test_community_coefs_batch():
+    """
+    Test indicator-matrix participation and diversity coefficients against the per-module formulas,
+    for single graphs and for stacks of graphs
+    """
+    from scipy import sparse
+
+    n = 30
+    W_stack = np.random.randn(4, n, n)
+    W_stack = (W_stack + np.swapaxes(W_stack, 1, 2)) / 2
+    W_stack[np.random.rand(4, n, n) > 0.5] = 0
+    W_stack[:, 0, :] = W_stack[:, :, 0] = 0
+    ci_stack = np.random.randint(1, 5, size=(4, n))
+
+    def reference(W, ci):
+        _, ci = np.unique(ci, return_inverse=True)
+        m = ci.max() + 1
+        W_pos = W * (W > 0)
+        Kc = np.array([W_pos[:, ci == i].sum(axis=1) for i in range(m)]).T
+        S = W_pos.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            P = np.nan_to_num(1 - np.sum(Kc ** 2, axis=1) / S ** 2)
+            pnm = np.nan_to_num(Kc / S[:, None])
+            pnm[pnm == 0] = 1
+            H = -np.sum(pnm * np.log(pnm), axis=1) / np.log(m)
+        return P, H
+
+    start_time = time.time()
+    Ppos_stack = netstats.participation_coef_sign(W_stack, ci_stack)[0]
+    Hpos_stack = netstats.diversity_coef_sign(W_stack, ci_stack)[0]
+    print("%s%s%s" % ('community coefficients (batch) --> finished: ',
+                      str(np.round(time.time() - start_time, 1)), 's'))
+    assert Ppos_stack.shape == Hpos_stack.shape == (4, n)
+
+    for W, ci, Ppos, Hpos in zip(W_stack, ci_stack, Ppos_stack, Hpos_stack):
+        P_ref, H_ref = reference(W, ci)
+        assert np.allclose(Ppos, P_ref)
+        assert np.allclose(Hpos, H_ref)
+        assert np.allclose(netstats.participation_coef_sign(W, ci)[0], P_ref)
+        assert np.allclose(netstats.participation_coef_sign(sparse.csr_matrix(W), ci)[0], P_ref)
+        assert np.allclose(netstats.diversity_coef_sign(W, ci)[0], H_ref)
+        assert np.allclose(netstats.participation_coef(np.abs(W), ci), reference(np.abs(W), ci)[0])
+
+    # A partition shared by every graph of the stack
+    assert np.allclose(netstats.participation_coef(np.abs(W_stack), ci_stack[0]),
+                       [netstats.participation_coef(np.abs(W), ci_stack[0]) for W in W_stack])
+
+
 @pytest.mark.parametrize("binarize", [True, False])
 def test_weighted_transitivity(binarize):
     """ Test weighted_transitivity computation
@@ -338,6 +809,54 @@ def test_clean_graphs(fmt, conn_model, prune, norm):
     assert len(clean.G) <= len(G)
 
 
+def test_sparse_graph(tmp_path):
+    """
+    Test that CleanGraphs holds graphs sparsely, with structure-sharing variants and lazy NetworkX adapters
+    """
+    from pynets.core import thresholding
+    in_mat = np.random.RandomState(42).rand(40, 40)
+    in_mat = np.triu(in_mat, 1) + np.triu(in_mat, 1).T
+    in_mat[in_mat < 0.8] = 0
+    est_path = str(tmp_path/"002_rsn-Default_est-cov_thrtype-PROP_thr-0.2.npy")
+    np.save(est_path, in_mat)
+
+    clean = netstats.CleanGraphs(0.2, 'cov', est_path, 0, 1)
+    assert clean.graph._G is None and clean.graph._dense is None
+    assert np.allclose(clean.in_mat, thresholding.autofix(in_mat))
+    assert clean.graph.number_of_edges() == nx.from_numpy_array(in_mat).number_of_edges()
+
+    graph_bin = clean.graph.binarized()
+    graph_len = clean.graph.lengths()
+    assert np.shares_memory(graph_bin.W.indices, clean.graph.W.indices)
+    assert np.shares_memory(graph_len.W.indptr, clean.graph.W.indptr)
+    assert np.allclose(graph_bin.toarray(), thresholding.binarize(clean.in_mat))
+    assert np.allclose(graph_len.toarray(), thresholding.weight_conversion(clean.in_mat, 'lengths'))
+    assert np.allclose(nx.to_numpy_array(clean.G), clean.in_mat)
+
+    # Connection-length graphs are computed once per transform
+    assert clean.graph.lengths() is graph_len
+    graph_len_neglog = clean.graph.lengths(transform='neglog')
+    assert graph_len_neglog is clean.graph.lengths(transform='neglog')
+    assert np.shares_memory(graph_len_neglog.W.indices, clean.graph.W.indices)
+    assert np.allclose(graph_len_neglog.W.data, -np.log(clean.graph.W.data))
+
+    clean.normalize_graph()
+    assert np.isclose(np.max(clean.in_mat), 1)
+
+    # The strongest edge has a length of zero under the 'neglog' transform, which is kept as an edge downstream
+    in_mat_len, G_len = clean.create_length_matrix(transform='neglog')
+    n_edges = clean.graph.number_of_edges()
+    assert np.count_nonzero(in_mat_len.data == 0) > 0
+    assert in_mat_len.nnz == clean.graph.W.nnz and G_len.number_of_edges() == n_edges
+    graphs = {}
+    graph_len = netstats._get_graph({'in_mat': clean.graph.W, 'in_mat_len': in_mat_len}, graphs, 'graph_len')
+    assert graph_len.number_of_edges() == n_edges
+    assert netstats._get_graph({}, graphs, 'G_len').number_of_edges() == n_edges
+    bc_exact = netstats.get_betweenness_centrality(G_len, [], [])[1]
+    bc_approx = netstats.get_betweenness_centrality(G_len, [], [], approximate=True, epsilon=1e-3)[1]
+    assert np.allclose(bc_exact, bc_approx[:len(bc_exact)])
+
+
 def test_save_netmets():
     """ Test save netmets functionality using dummy metrics
     """
@@ -353,6 +872,43 @@ def test_save_netmets():
     netstats.save_netmets(dir_path, est_path, metric_list_names, net_met_val_list_final)
 
 
+def test_netmets_store(tmp_path):
+    """ Test appending graph metrics to the columnar netmetrics store, and reading them back with filters
+    """
+    pytest.importorskip('pyarrow')
+    dir_path = tmp_path/'sub-002'/'ses-1'/'func'/'coords_power_2011'/'graphs'
+    dir_path.mkdir(parents=True)
+
+    metric_list_names = ['global_efficiency', '0_local_efficiency', '1_local_efficiency',
+                         'average_local_efficiency_nodewise']
+    out_paths = []
+    start_time = time.time()
+    for thr in [0.2, 0.3, 0.4]:
+        est_path = f"{dir_path}/002_modality-func_est-cov_nodetype-parc_thrtype-PROP_thr-{thr}.npy"
+        keys = netstats.netmets_keys('002', thr, est_path)
+        out_paths.append(netstats.save_netmets(str(dir_path), est_path, metric_list_names,
+                                               [thr, 1, 2 * thr, np.nan], keys=keys))
+    print("%s%s%s" % ('save_netmets (columnar) --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert keys == {'subject': '002', 'session': 'ses-1', 'modality': 'func', 'atlas': 'coords_power_2011',
+                    'model': '002_modality-func_est-cov_nodetype-parc_thrtype-PROP', 'thr': 0.4}
+    assert all(Path(i).parent == dir_path.parent/'netmetrics'/'netmetrics.parquet' for i in out_paths)
+
+    df = netstats.read_netmets(str(Path(out_paths[0]).parent))
+    assert list(df.columns) == [name for name, _ in netstats.NETMETS_SCHEMA]
+    assert len(df) == 12
+
+    df = netstats.read_netmets(out_paths, columns=['thr', 'value'], metric='global_efficiency', thr=[0.2, 0.4])
+    assert np.allclose(df.sort_values('thr')['value'], [0.2, 0.4])
+    df = netstats.read_netmets(out_paths, node=None)
+    assert set(df['metric']) == {'global_efficiency', 'average_local_efficiency_nodewise'}
+
+    df_wide = netstats.netmets_to_wide(netstats.read_netmets(out_paths))
+    assert list(df_wide.columns) == metric_list_names
+    assert np.allclose(df_wide['1_local_efficiency'], [0.4, 0.6, 0.8])
+    assert list(df_wide.index.get_level_values('thr')) == [0.2, 0.3, 0.4]
+
+
 @pytest.mark.parametrize("true_metric", [True, False])
 def test_iterate_nx_global_measures(true_metric):
     """ Test iterating over net metric list
@@ -377,9 +933,6 @@ def test_iterate_nx_global_measures(true_metric):
 @pytest.mark.parametrize("sim_size", [1, 5, 10])
 def test_community_resolution_selection(sim_num_comms, sim_size):
     """ Test community resolution selection
-
-    Note: It is impossible to enter or cover the second while loop in
-          netstats.community_resolution_selection.
     """
     G = nx.caveman_graph(sim_num_comms, sim_size)
     node_ci, ci, resolution, num_comms = netstats.community_resolution_selection(G)
@@ -389,6 +942,80 @@ def test_community_resolution_selection(sim_num_comms, sim_size):
     assert resolution is not None
 
 
+def test_community_resolution_selection_consensus():
+    """ Test resolution search with seeded restarts, their consensus, and memoization by graph hash
+    """
+    G = nx.planted_partition_graph(6, 15, 0.6, 0.01, seed=42)
+    for u, v in G.edges():
+        G[u][v]['weight'] = 1.0
+
+    start_time = time.time()
+    node_ci, ci, resolution, num_comms = netstats.community_resolution_selection(G, n_seeds=4, n_procs=2)
+    print("%s%s%s" % ('community_resolution_selection (4 restarts) --> finished: ',
+                      str(np.round(time.time() - start_time, 1)), 's'))
+    assert num_comms == len(np.unique(ci)) == 6
+    assert [node_ci[node] for node in G.nodes()] == list(ci)
+
+    # The same graph, with edges added in another order, reuses the memoized partition
+    H = nx.Graph()
+    H.add_nodes_from(G.nodes())
+    H.add_edges_from(reversed(list(G.edges(data=True))))
+    assert netstats._graph_hash(H) == netstats._graph_hash(G)
+    assert np.array_equal(netstats.community_resolution_selection(H, n_seeds=4, n_procs=2)[1], ci)
+
+    # Too many communities at the default resolution: the search must coarsen the partition
+    P = nx.path_graph(40)
+    num_comms = netstats.community_resolution_selection(P)[3]
+    assert 1 < num_comms <= P.number_of_edges() / 10
+
+
+def test_community_resolution_selection_persisted(tmp_path, monkeypatch):
+    """ Test that partitions persisted to a run directory are reused by other processes
+    """
+    G = nx.planted_partition_graph(4, 12, 0.7, 0.02, seed=7)
+    node_ci, ci, resolution, num_comms = netstats.community_resolution_selection(G, n_seeds=2,
+                                                                                 cache_dir=str(tmp_path))
+    assert len(list((tmp_path / 'communities').glob('louvain_*.npz'))) == 1
+
+    # Another process starts with an empty in-memory cache, and must not repeat the search
+    monkeypatch.setattr(netstats, '_COMMUNITY_CACHE', {})
+    monkeypatch.setattr(netstats, 'louvain_partitions', None)
+    node_ci_saved, ci_saved, resolution_saved, num_comms_saved = \
+        netstats.community_resolution_selection(G, n_seeds=2, cache_dir=str(tmp_path))
+    assert node_ci_saved == node_ci
+    assert np.array_equal(ci_saved, ci)
+    assert (resolution_saved, num_comms_saved) == (resolution, num_comms)
+
+
+def test_graph_communities_shared(tmp_path, monkeypatch):
+    """ Test that plotting reuses the partition of the graph as cleaned and analyzed by NetworkAnalysis
+    """
+    start_time = time.time()
+    in_mat = nx.to_numpy_array(nx.planted_partition_graph(4, 12, 0.7, 0.02, seed=7))
+    in_mat = np.random.RandomState(42).rand(*in_mat.shape) * in_mat
+    in_mat = np.triu(in_mat) + np.triu(in_mat).T
+    # Isolates are pruned before graph analysis
+    in_mat[:2] = in_mat[:, :2] = 0
+    est_path = str(tmp_path / '0021001_est-cov_thrtype-PROP_thr-0.2.npy')
+    np.save(est_path, in_mat)
+
+    graph, graph_len = netstats._clean_graph(0.2, 'cov', est_path, 1, 1, False)
+    metric_list_names, net_met_val_list_final = netstats._run_metric_tasks(graph, graph_len, [], [], {},
+                                                                           ['louvain_modularity'],
+                                                                           community_dir=str(tmp_path))
+    assert 'modularity' in metric_list_names
+    assert len(list((tmp_path / 'communities').glob('louvain_*.npz'))) == 1
+
+    # Plotting runs in another process, and must not partition the graph again
+    monkeypatch.setattr(netstats, '_COMMUNITY_CACHE', {})
+    monkeypatch.setattr(netstats, 'louvain_partitions', None)
+    ci = netstats.graph_communities(in_mat, 'cov', 1, 1, False, cache_dir=str(tmp_path))
+    assert len(ci) == in_mat.shape[0]
+    assert len(set(ci[:2])) == 2 and not set(ci[:2]) & set(ci[2:])
+    assert len(list((tmp_path / 'communities').glob('louvain_*.npz'))) == 1
+    print("%s%s%s" % ('graph_communities --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+
 #@pytest.mark.parametrize("metric", ['rich_club_coeff'])
 @pytest.mark.parametrize("metric", ['participation', 'diversity', 'local_efficiency',
                                     'comm_centrality', 'rich_club_coeff'])
@@ -423,16 +1050,26 @@ def test_get_metrics(metric):
         assert len(net_met_val_list_final) == len(netstats.local_efficiency(G))+1
     elif metric == 'comm_centrality':
         metric_list_names, net_met_val_list_final = \
-            netstats.get_comm_centrality(G, metric_list_names, net_met_val_list_final)
+            netstats.get_comm_centrality(in_mat, metric_list_names, net_met_val_list_final)
         assert len(metric_list_names) == len(nx.algorithms.communicability_betweenness_centrality(G))+1
         assert len(net_met_val_list_final) == len(nx.algorithms.communicability_betweenness_centrality(G))+1
     elif metric == 'rich_club_coeff':
         metric_list_names, net_met_val_list_final = \
-            netstats.get_rich_club_coeff(G, metric_list_names, net_met_val_list_final)
+            netstats.get_rich_club_coeff(in_mat, metric_list_names, net_met_val_list_final)
         assert len(metric_list_names) == len(nx.algorithms.rich_club_coefficient(G))+1
         assert len(net_met_val_list_final) == len(nx.algorithms.rich_club_coefficient(G))+1
 
 
+def test_auc_file_name():
+    """
+    Test that the AUC files of threshold sets are named alike for the netmetrics store and for csv files
+    """
+    stem = '0021001_modality-dwi_nodetype-parc_est-csa_thrtype-PROP'
+    auc_name = f"{stem}__net_mets_auc.csv"
+    assert netstats._auc_file_name(f"atlas/netmetrics/{stem}_thr-0.2_net_mets_neat.csv") == auc_name
+    assert netstats._auc_file_name(f"atlas/netmetrics/netmetrics.parquet/{stem}_thr-0.2.parquet") == auc_name
+
+
 @pytest.mark.parametrize("plot_switch", [True, False])
 @pytest.mark.parametrize("sql_out", [True, False])
 @pytest.mark.parametrize("nc_collect", [True, False])
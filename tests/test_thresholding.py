@@ -209,6 +209,223 @@ def test_edge_cases(thr):
     assert conn_mat_edge_one is not None
 
 
+@pytest.mark.parametrize("directed", [False, True])
+def test_density_thresholding(directed):
+    """
+    Test that density thresholding retains exactly the strongest edges for each target density
+    """
+    import time
+    x = np.random.RandomState(42).rand(20, 20)
+    if not directed:
+        x = np.triu(x, 1) + np.triu(x, 1).T
+    x[x < 0.2] = 0
+    mask = ~np.eye(20, dtype=bool) if directed else np.triu(np.ones((20, 20), dtype=bool), 1)
+    n_possible = np.sum(mask)
+    densities = [0.0, 0.1, 0.25, 0.5, 0.7, 1.0]
+
+    start_time = time.time()
+    x_thr_multi = thresholding.density_thresholding_multi(x, densities)
+    print("%s%s%s" % ('density_thresholding_multi --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    for density, x_thr_m in zip(densities, x_thr_multi):
+        x_thr = thresholding.density_thresholding(x, density)
+        assert np.array_equal(x_thr, x_thr_m)
+        if not directed:
+            assert np.array_equal(x_thr, x_thr.T)
+        n_edges = np.count_nonzero(x_thr[mask])
+        assert n_edges == min(int(np.floor(np.round(density * n_possible, 6))), np.count_nonzero(x[mask]))
+        # Retained edges are the strongest
+        kept = x_thr[mask] > 0
+        if 0 < n_edges < np.count_nonzero(x[mask]):
+            assert x[mask][kept].min() > x[mask][~kept].max()
+        assert np.array_equal(x_thr[x_thr > 0], x[x_thr > 0])
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_density_thresholding_ties(directed):
+    """
+    Test that density thresholding breaks ties between equal weights identically for single and multiple densities
+    """
+    import time
+    x = np.round(np.random.RandomState(42).rand(20, 20), 1)
+    if not directed:
+        x = np.triu(x, 1) + np.triu(x, 1).T
+    mask = ~np.eye(20, dtype=bool) if directed else np.triu(np.ones((20, 20), dtype=bool), 1)
+    densities = [0.1, 0.25, 0.5]
+
+    start_time = time.time()
+    x_thr_multi = thresholding.density_thresholding_multi(x, densities)
+    print("%s%s%s" % ('density_thresholding_multi --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    # Tied edges are retained in row-major order
+    weights = x[mask]
+    order = np.argsort(-weights, kind='stable')
+    for density, x_thr_m in zip(densities, x_thr_multi):
+        x_thr = thresholding.density_thresholding(x, density)
+        assert np.array_equal(x_thr, x_thr_m)
+        n_edges = np.count_nonzero(x_thr[mask])
+        expected = np.zeros(len(weights), dtype=bool)
+        expected[order[:n_edges]] = True
+        assert np.array_equal(x_thr[mask] > 0, expected & (weights > 0))
+
+
+@pytest.mark.parametrize("directed", [False, True])
+@pytest.mark.parametrize("cut_mode", ['or', 'and'])
+def test_disparity_backbone(directed, cut_mode):
+    """
+    Test that the closed-form disparity backbone agrees with the numerically integrated significance scores
+    """
+    import time
+    from scipy import integrate
+    x = np.random.RandomState(42).rand(30, 30)
+    x[x < 0.6] = 0
+    if not directed:
+        x = np.triu(x, 1) + np.triu(x, 1).T
+    np.fill_diagonal(x, 0)
+    G = nx.from_numpy_array(x, create_using=nx.DiGraph if directed else nx.Graph)
+
+    start_time = time.time()
+    backbone = thresholding.disparity_backbone(x, alpha_t=0.4, directed=directed, cut_mode=cut_mode)
+    print("%s%s%s" % ('disparity_backbone --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    B = thresholding.disparity_filter_alpha_cut(thresholding.disparity_filter(G), alpha_t=0.4, cut_mode=cut_mode)
+    assert set(zip(*backbone.nonzero())) == set(B.edges()) | ({(v, u) for u, v in B.edges()} if not directed
+                                                               else set())
+
+    rows, cols, alpha_out, _ = thresholding.disparity_alpha(x, directed=directed)
+    k = np.count_nonzero(x, axis=1)
+    for i, j, alpha in zip(rows, cols, alpha_out):
+        if k[i] > 1:
+            p_ij = x[i, j] / np.sum(x[i])
+            assert np.isclose(alpha, 1 - (k[i] - 1) * integrate.quad(lambda y: (1 - y) ** (k[i] - 2), 0, p_ij)[0])
+
+
+def test_local_thresholding_prop_multi():
+    """
+    Test that local thresholding adds successive nearest neighbour graphs onto the MST, for all thresholds at once
+    """
+    import time
+    x = np.random.RandomState(42).rand(25, 25)
+    x = np.triu(x, 1) + np.triu(x, 1).T
+    x[0, 1:] = x[1:, 0] = 0
+    n_possible = 25 * 24 // 2
+    thrs = [0.01, 0.1, 0.3, 0.6, 1.0]
+
+    start_time = time.time()
+    x_thr_multi = thresholding.local_thresholding_prop_multi(x, thrs)
+    print("%s%s%s" % ('local_thresholding_prop_multi --> finished: ', str(np.round(time.time() - start_time, 1)),
+                      's'))
+
+    # Maximum spanning tree of the largest component
+    mst = nx.maximum_spanning_tree(nx.from_numpy_array(x[1:, 1:]))
+    mst_edges = {(u + 1, v + 1) for u, v in mst.edges()} | {(v + 1, u + 1) for u, v in mst.edges()}
+    for thr, x_thr_m in zip(thrs, x_thr_multi):
+        x_thr = thresholding.local_thresholding_prop(x, thr)
+        assert np.array_equal(x_thr, x_thr_m)
+        assert np.array_equal(x_thr[x_thr != 0], x[x_thr != 0])
+        assert mst_edges <= set(zip(*np.nonzero(x_thr)))
+        assert np.count_nonzero(np.triu(x_thr)) == min(max(int(thr * n_possible), len(mst.edges())),
+                                                       np.count_nonzero(np.triu(x)))
+
+    # Edges beyond the MST are added from successive k-nearest neighbour graphs
+    x_thr = x_thr_multi[2]
+    added = set(zip(*np.nonzero(np.triu(x_thr)))) - mst_edges
+    k = max(min(np.sum(x[i] > x[i, j]), np.sum(x[j] > x[j, i])) + 1 for i, j in added)
+    assert all(x_thr[i, j] != 0 for i, j in thresholding.knn(x, k - 1).edges() if x[i, j] != 0)
+
+
+@pytest.mark.parametrize("min_span_tree,dens_thresh,disp_filt", [(False, False, False), (False, True, False),
+                                                                   (True, False, False), (False, False, True)])
+def test_perform_thresholding_multi(min_span_tree, dens_thresh, disp_filt):
+    """
+    Test that thresholding at several thresholds at once matches thresholding at each threshold
+    """
+    import time
+    x = np.random.RandomState(42).rand(20, 20)
+    x = np.triu(x, 1) + np.triu(x, 1).T
+    thrs = [0.1, 0.3, 0.5]
+
+    start_time = time.time()
+    thr_type, edge_thresholds, x_thr_multi = thresholding.perform_thresholding_multi(x, thrs, min_span_tree,
+                                                                                     dens_thresh, disp_filt)
+    print("%s%s%s" % ('perform_thresholding_multi --> finished: ', str(np.round(time.time() - start_time, 1)),
+                      's'))
+
+    assert x_thr_multi.shape == (len(thrs), 20, 20)
+    for thr, edge_threshold, x_thr_m in zip(thrs, edge_thresholds, x_thr_multi):
+        thr_type_single, edge_threshold_single, x_thr = thresholding.perform_thresholding(x, thr, min_span_tree,
+                                                                                          dens_thresh, disp_filt)
+        assert thr_type == thr_type_single
+        assert edge_threshold == edge_threshold_single
+        assert np.array_equal(x_thr, x_thr_m)
+
+
+@pytest.mark.parametrize("dens_thresh", [False, True])
+def test_thresh_func_batch(tmp_path, dens_thresh):
+    """
+    Test that batched thresholding returns one entry per thresholded graph for every output of thresh_func
+    """
+    import time
+    from pynets.core import utils
+    x = np.random.RandomState(42).rand(20, 20)
+    x = np.triu(x, 1) + np.triu(x, 1).T
+    thrs = ['0.1', '0.3', '0.5']
+    labels = [f"label_{i}" for i in range(20)]
+    coords = [(i, i, i) for i in range(20)]
+
+    start_time = time.time()
+    outs = thresholding.thresh_func_batch(dens_thresh, thrs, x, 'corr', None, '002', str(tmp_path), None, 'parc',
+                                          False, 0, False, True, 1, 'atlasA', None, labels, coords, 0, False, None,
+                                          'mean')
+    print("%s%s%s" % ('thresh_func_batch --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    conn_matrices_thr, edge_thresholds, est_paths, thrs_out = outs[:4]
+    assert thrs_out == thrs
+    assert all(len(out) == len(thrs) for out in outs)
+    assert all(out == [out[0]] * len(thrs) for out in outs[4:])
+    assert utils.stack_path(est_paths[0]) == utils.stack_path(est_paths[-1])
+    for thr, edge_threshold, est_path, conn_matrix_thr in zip(thrs, edge_thresholds, est_paths, conn_matrices_thr):
+        _, edge_threshold_single, x_thr = thresholding.perform_thresholding(x, float(thr), False, dens_thresh,
+                                                                            False)
+        assert f"_thr-{thr}.npy" in est_path
+        assert edge_threshold == edge_threshold_single
+        assert np.array_equal(conn_matrix_thr, x_thr)
+        assert np.array_equal(utils.load_mat_sparse(est_path).toarray(), x_thr)
+
+
+@pytest.mark.parametrize("transform", ['inverse', 'neglog', 'complement'])
+def test_length_matrix(transform):
+    """
+    Test that connection-length matrices feed scipy.sparse.csgraph with the lengths of every weighted edge
+    """
+    import time
+    from scipy.sparse import csgraph
+    x = np.random.RandomState(42).rand(20, 20)
+    x = np.triu(x, 1) + np.triu(x, 1).T
+    x[x < 0.5] = 0
+    x[0, 1] = x[1, 0] = 1
+    to_length = {'inverse': lambda w: 1 / w, 'neglog': lambda w: -np.log(w), 'complement': lambda w: 1 - w}[transform]
+
+    start_time = time.time()
+    L = thresholding.length_matrix(x, transform=transform)
+    print("%s%s%s" % ('length_matrix --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    # Zero lengths are kept as explicit (zero-length) edges
+    assert L.nnz == np.count_nonzero(x)
+    assert np.allclose(L.toarray()[x != 0], to_length(x[x != 0]))
+
+    G = nx.from_numpy_array(x)
+    nx.set_edge_attributes(G, {(u, v): to_length(w) for u, v, w in G.edges(data='weight')}, 'length')
+    D = csgraph.shortest_path(L, directed=False)
+    for u, lengths in nx.all_pairs_dijkstra_path_length(G, weight='length'):
+        for v, length in lengths.items():
+            assert np.isclose(D[u, v], length)
+
+    if transform != 'inverse':
+        with pytest.raises(ValueError):
+            thresholding.length_matrix(2 * x, transform=transform)
+
+
 @pytest.mark.parametrize("type,parc,all_zero,frag_g",
     [
         pytest.param('func', True, True, True, marks=pytest.mark.xfail),
@@ -224,3 +224,55 @@ def test_track_ensemble_particle():
     streams = f"{base_dir}/miscellaneous/003_streamlines_est-csd_nodetype-parc_samples-1000streams_tt-particle_dg-prob_ml-10.trk"
     save_tractogram(StatefulTractogram(streamlines, reference=dwi_img, space=Space.RASMM, origin=Origin.TRACKVIS),
                     streams, bbox_valid_check=False)
+
+
+@pytest.mark.parametrize("tiss_class", ['bin', 'act', 'cmc'])
+def test_track_ensemble_n_procs(tmp_path, tiss_class):
+    """
+    Test that parallel ensemble tractography reproduces serial tractography
+    """
+    import time
+    from pynets.dmri import track
+    from dipy.data import get_sphere
+    from dipy.reconst.shm import sf_to_sh
+
+    # Synthetic fiber orientation field running along the x-axis
+    sphere = get_sphere('repulsion724')
+    sf = np.exp(-20 * (1 - np.abs(sphere.vertices[:, 0]))) + 0.05
+    shape = (16, 12, 12)
+    mod_fit = np.tile(sf_to_sh(sf, sphere, 8), shape + (1,))
+    B0_mask = str(tmp_path/"B0_mask.nii.gz")
+    nib.save(nib.Nifti1Image(np.ones(shape, dtype='uint8'), np.eye(4)), B0_mask)
+
+    atlas_data = np.zeros(shape, dtype='uint16')
+    atlas_data[1:3] = 1
+    atlas_data[13:15] = 2
+    atlas_data[1:3, :6] = 3
+    parcels = [atlas_data == roi_val for roi_val in np.unique(atlas_data)[1:]]
+
+    if tiss_class == 'bin':
+        tissue_maps = {'tiss_class': tiss_class, 'mask': np.ones(shape, dtype='uint8')}
+    elif tiss_class == 'act':
+        tissue_maps = {'tiss_class': tiss_class, 'include_map': np.zeros(shape), 'exclude_map': np.zeros(shape)}
+    else:
+        tissue_maps = {'tiss_class': tiss_class, 'wm_map': np.ones(shape), 'gm_map': np.zeros(shape),
+                       'csf_map': np.zeros(shape), 'average_voxel_size': 1.0}
+
+    streamlines = {}
+    for n_procs in [1, 2]:
+        start_time = time.time()
+        streamlines[n_procs] = track.track_ensemble(300, atlas_data, parcels, mod_fit, tissue_maps, sphere, 'prob',
+                                                    [40, 30], [0.5, 0.7], 'local', 2, 2, 5, None, B0_mask,
+                                                    n_seeds_per_iter=100, n_procs=n_procs)
+        print("%s%s%s" % ('track_ensemble --> finished: ', str(np.round(time.time() - start_time, 1)), 's'))
+
+    assert len(streamlines[1]) >= 300
+    assert len(streamlines[1]) == len(streamlines[2])
+    assert all(np.array_equal(s1, s2) for s1, s2 in zip(streamlines[1], streamlines[2]))
+    assert all(len(s) >= 5 for s in streamlines[1])
+
+    # A prebuilt tissue classifier tracks serially, with the same result
+    serial = track.track_ensemble(300, atlas_data, parcels, mod_fit, track.tissue_classifier(tissue_maps), sphere,
+                                  'prob', [40, 30], [0.5, 0.7], 'local', 2, 2, 5, None, B0_mask,
+                                  n_seeds_per_iter=100, n_procs=2)
+    assert all(np.array_equal(s1, s2) for s1, s2 in zip(streamlines[1], serial))
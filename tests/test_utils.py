@@ -281,6 +281,34 @@ def test_save_mat(fmt):
 
 
 
+def test_save_mat_stack(tmp_path):
+    """
+    Test saving thresholded graphs as a single stack and loading each by its est_path
+    """
+    from scipy import sparse
+    conn_matrices = np.random.rand(3, 10, 10)
+    conn_matrices = conn_matrices + conn_matrices.transpose(0, 2, 1)
+    est_paths = [f"{str(tmp_path)}/002_modality-func_est-cov_nodetype-parc_thrtype-PROP_thr-{thr}.npy" for thr in
+                 [0.1, 0.2, 0.3]]
+
+    stack_path = utils.save_mat_stack(conn_matrices, est_paths)
+    assert stack_path == f"{str(tmp_path)}/002_modality-func_est-cov_nodetype-parc_thrtype-PROP_thr-stack.npy"
+    assert np.load(stack_path, mmap_mode='r').shape == (3, 10, 10)
+    assert not any(os.path.isfile(est_path) for est_path in est_paths)
+
+    for est_path, conn_matrix in zip(est_paths, conn_matrices):
+        assert np.array_equal(utils.load_mat_stack(est_path), conn_matrix)
+        assert np.array_equal(utils.load_mat_sparse(est_path).toarray(), conn_matrix)
+        assert sparse.issparse(utils.load_mat_sparse(est_path))
+        assert np.array_equal(utils.load_mat_npy(est_path), conn_matrix)
+        assert utils.mat_exists(est_path)
+    assert not utils.mat_exists(f"{str(tmp_path)}/002_modality-func_est-cov_nodetype-parc_thrtype-PROP_thr-0.4.npy")
+    assert utils.check_est_path_existence(est_paths) == (est_paths, [])
+
+    with pytest.raises(ValueError):
+        utils.save_mat_stack(conn_matrices[:2], [est_paths[0], f"{str(tmp_path)}/other_thr-0.2.npy"])
+
+
 @pytest.mark.parametrize("node_size", [6, None])
 @pytest.mark.parametrize("hpass", [100, None])
 @pytest.mark.parametrize("smooth", [6, None])